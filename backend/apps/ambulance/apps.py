@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class AmbulanceConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.ambulance'
+
+    def ready(self):
+        from apps.ambulance import signals  # noqa: F401
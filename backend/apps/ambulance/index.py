@@ -0,0 +1,213 @@
+import heapq
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+
+from apps.ambulance.utils import AmbulanceTypeEnum, StatusEnum
+from utils.spatial import GridIndex
+
+
+class AmbulanceIndex:
+    """
+    Process-wide spatial index of available ambulances, with one grid per
+    ambulance type so capability-restricted searches never touch units of
+    other types.
+
+    The index is loaded lazily from the database on first use and then kept
+    current by the model signals in `apps.ambulance.signals`. Writes made by
+    other processes are picked up when the snapshot is older than
+    `AMBULANCE_INDEX_TTL` seconds.
+
+    Busy ambulances are parked in a heap ordered by `busy_until` and become
+    candidates again as soon as that moment passes, whether or not the
+    release has been written back to the database yet.
+
+    A sharded dispatcher calls `restrict` so that only units inside its own
+    area are searchable; the rest of the fleet is tracked but never indexed.
+    """
+
+    def __init__(self, cell_size: float = 0.02):
+        self._lock = threading.RLock()
+        self._cell_size = cell_size
+        self._grids: Dict[str, GridIndex] = {}
+        self._positions = {}
+        self._types = {}
+        self._available = set()
+        self._busy_until = {}
+        self._expiries: List[Tuple[float, object]] = []
+        self._loaded_at: Optional[float] = None
+        self._area: Optional[Callable[[float, float], bool]] = None
+
+    @property
+    def restricted(self) -> bool:
+        return self._area is not None
+
+    def restrict(self, area: Optional[Callable[[float, float], bool]]) -> None:
+        """Only index ambulances at positions for which `area(lat, lon)` is true."""
+        with self._lock:
+            self._area = area
+            self._loaded_at = None
+
+    def _searchable(self, ambulance_id) -> bool:
+        position = self._positions.get(ambulance_id)
+        return position is not None and (self._area is None or self._area(*position))
+
+    @property
+    def ttl(self) -> float:
+        return settings.AMBULANCE_INDEX_TTL
+
+    def _ensure_loaded(self) -> None:
+        if self._loaded_at is None or time.monotonic() - self._loaded_at > self.ttl:
+            self.rebuild()
+        self._release_expired()
+
+    def rebuild(self) -> None:
+        from apps.ambulance.models import Ambulance
+
+        rows = Ambulance.objects.values_list(
+            "id", "ambulance_type", "status", "busy_until", "latitude", "longitude"
+        )
+        with self._lock:
+            self._grids.clear()
+            self._positions.clear()
+            self._types.clear()
+            self._available.clear()
+            self._busy_until.clear()
+            self._expiries.clear()
+            for ambulance_id, ambulance_type, status, busy_until, lat, lon in rows:
+                if lat is not None and lon is not None:
+                    self._positions[ambulance_id] = (float(lat), float(lon))
+                self._types[ambulance_id] = ambulance_type
+                self._apply_status(ambulance_id, status, busy_until)
+            self._loaded_at = time.monotonic()
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._loaded_at = None
+
+    def _grid(self, ambulance_id) -> GridIndex:
+        ambulance_type = self._types.get(ambulance_id, AmbulanceTypeEnum.BLS)
+        grid = self._grids.get(ambulance_type)
+        if grid is None:
+            grid = self._grids[ambulance_type] = GridIndex(cell_size=self._cell_size)
+        return grid
+
+    def _make_available(self, ambulance_id) -> None:
+        self._available.add(ambulance_id)
+        if self._searchable(ambulance_id):
+            self._grid(ambulance_id).insert(ambulance_id, *self._positions[ambulance_id])
+
+    def _apply_status(self, ambulance_id, status: str, busy_until=None) -> None:
+        self._busy_until.pop(ambulance_id, None)
+        if status == StatusEnum.AVAILABLE:
+            self._make_available(ambulance_id)
+            return
+
+        self._available.discard(ambulance_id)
+        self._grid(ambulance_id).remove(ambulance_id)
+        if status == StatusEnum.BUSY and busy_until is not None:
+            expiry = busy_until.timestamp()
+            self._busy_until[ambulance_id] = expiry
+            heapq.heappush(self._expiries, (expiry, ambulance_id))
+
+    def _release_expired(self) -> None:
+        now = time.time()
+        while self._expiries and self._expiries[0][0] <= now:
+            expiry, ambulance_id = heapq.heappop(self._expiries)
+            # Skip heap entries superseded by a later status change
+            if self._busy_until.get(ambulance_id) == expiry:
+                del self._busy_until[ambulance_id]
+                self._make_available(ambulance_id)
+
+    def set_position(self, ambulance_id, lat, lon) -> None:
+        with self._lock:
+            if self._loaded_at is None:
+                return
+            self._positions[ambulance_id] = (float(lat), float(lon))
+            if ambulance_id in self._available and self._searchable(ambulance_id):
+                self._grid(ambulance_id).insert(ambulance_id, lat, lon)
+            else:
+                self._grid(ambulance_id).remove(ambulance_id)
+
+    def set_status(self, ambulance_id, status: str, busy_until=None, ambulance_type=None) -> None:
+        with self._lock:
+            if self._loaded_at is None:
+                return
+            if ambulance_type is not None and self._types.get(ambulance_id) != ambulance_type:
+                self._grid(ambulance_id).remove(ambulance_id)
+                self._types[ambulance_id] = ambulance_type
+            self._apply_status(ambulance_id, status, busy_until)
+
+    def remove(self, ambulance_id) -> None:
+        with self._lock:
+            self._grid(ambulance_id).remove(ambulance_id)
+            self._available.discard(ambulance_id)
+            self._busy_until.pop(ambulance_id, None)
+            self._positions.pop(ambulance_id, None)
+            self._types.pop(ambulance_id, None)
+
+    def known(self, ambulance_id) -> bool:
+        """Whether the ambulance exists, as of the last snapshot and signals."""
+        with self._lock:
+            self._ensure_loaded()
+            return ambulance_id in self._types
+
+    def position(self, ambulance_id) -> Optional[Tuple[float, float]]:
+        with self._lock:
+            return self._positions.get(ambulance_id)
+
+    def unit(self, ambulance_id) -> Optional[Tuple[str, bool, Optional[Tuple[float, float]]]]:
+        """`(ambulance_type, available, position)` of a known ambulance, else None."""
+        with self._lock:
+            if ambulance_id not in self._types:
+                return None
+            return (
+                self._types[ambulance_id],
+                ambulance_id in self._available,
+                self._positions.get(ambulance_id),
+            )
+
+    def units(self) -> List[Tuple[object, str, bool, Optional[Tuple[float, float]]]]:
+        """`(id, ambulance_type, available, position)` of every known ambulance."""
+        with self._lock:
+            self._ensure_loaded()
+            return [
+                (pk, ambulance_type, pk in self._available, self._positions.get(pk))
+                for pk, ambulance_type in self._types.items()
+            ]
+
+    def _selected_grids(self, types: Optional[Iterable[str]]) -> List[GridIndex]:
+        if types is None:
+            return list(self._grids.values())
+        return [self._grids[t] for t in types if t in self._grids]
+
+    def nearest(
+        self, lat, lon, k: int = 1, types: Optional[Iterable[str]] = None, exclude=None
+    ) -> List[Tuple[float, object]]:
+        """
+        Return up to `k` `(distance_km, ambulance_id)` pairs, closest first,
+        optionally restricted to some ambulance types and skipping `exclude`.
+        """
+        predicate = (lambda key: key not in exclude) if exclude else None
+        with self._lock:
+            self._ensure_loaded()
+            found = []
+            for grid in self._selected_grids(types):
+                found.extend(grid.nearest(lat, lon, k=k, predicate=predicate))
+            return heapq.nsmallest(k, found, key=lambda pair: pair[0])
+
+    def within(
+        self, lat, lon, radius_km: float, types: Optional[Iterable[str]] = None
+    ) -> List[Tuple[float, object]]:
+        """Return `(distance_km, ambulance_id)` pairs inside `radius_km`, closest first."""
+        with self._lock:
+            self._ensure_loaded()
+            found = []
+            for grid in self._selected_grids(types):
+                found.extend(grid.within(lat, lon, radius_km))
+            return sorted(found, key=lambda pair: pair[0])
+
+
+ambulance_index: AmbulanceIndex = AmbulanceIndex()
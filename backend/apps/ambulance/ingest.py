@@ -0,0 +1,119 @@
+import atexit
+import logging
+import threading
+from collections import deque
+from datetime import datetime
+from typing import Deque, Dict, Iterable, Optional, Tuple
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from apps.ambulance.index import ambulance_index
+from apps.ambulance.v1.streams import publish_fleet_changes
+
+logger = logging.getLogger(__name__)
+
+
+class LocationBuffer:
+    """
+    Coalesces GPS fixes in memory and writes them to the database in bulk.
+
+    Only the newest fix per ambulance is kept for its current position, so
+    a unit reporting every second costs one row in each flush however many
+    pings it sent; every in-order fix is also appended to the unit's
+    compressed track history. The dispatch index is updated as fixes
+    arrive; the database catches up every `interval` seconds on a
+    background thread.
+
+    A fix older than the last one accepted for its unit, in this flush or
+    any earlier one, is rejected, so a late fix never moves a unit back.
+    While flushes fail, at most `max_track_points` fixes of history are
+    kept per unit, dropping the oldest.
+    """
+
+    def __init__(self, interval: float, max_track_points: int = 3600):
+        self.interval = interval
+        self.max_track_points = max_track_points
+        self._lock = threading.Lock()
+        self._fixes: Dict[object, Tuple[float, float, datetime]] = {}
+        self._tracks: Dict[object, Deque[Tuple[datetime, float, float]]] = {}
+        # Time of the newest fix accepted per unit; one entry per unit in the fleet
+        self._accepted: Dict[object, datetime] = {}
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def add(self, ambulance_id, lat: float, lon: float, recorded_at: datetime) -> bool:
+        """Buffer a fix. Returns False if a newer fix for the unit was already accepted."""
+        with self._lock:
+            accepted = self._accepted.get(ambulance_id)
+            if accepted is not None and accepted > recorded_at:
+                return False
+            self._accepted[ambulance_id] = recorded_at
+            self._fixes[ambulance_id] = (lat, lon, recorded_at)
+            track = self._tracks.get(ambulance_id)
+            if track is None:
+                track = self._tracks[ambulance_id] = deque(maxlen=self.max_track_points)
+            track.append((recorded_at, lat, lon))
+            if self._thread is None or not self._thread.is_alive():
+                self._wakeup.clear()
+                self._thread = threading.Thread(target=self._run, name="location-flush", daemon=True)
+                self._thread.start()
+        ambulance_index.set_position(ambulance_id, lat, lon)
+        publish_fleet_changes([ambulance_id])
+        return True
+
+    def add_many(self, fixes: Iterable[Tuple[object, float, float, datetime]]) -> int:
+        return sum(self.add(*fix) for fix in fixes)
+
+    def __len__(self) -> int:
+        return len(self._fixes)
+
+    def flush(self) -> int:
+        """Write every buffered fix now. Returns the number of ambulances updated."""
+        from apps.ambulance.v1.services import append_track_points, update_ambulance_positions
+
+        with self._lock:
+            fixes, self._fixes = self._fixes, {}
+            tracks, self._tracks = self._tracks, {}
+        if not fixes:
+            return 0
+        try:
+            updated = update_ambulance_positions(
+                {pk: (lat, lon) for pk, (lat, lon, _) in fixes.items()}
+            )
+        except Exception:
+            # Put the fixes back unless newer ones arrived meanwhile
+            with self._lock:
+                for pk, fix in fixes.items():
+                    self._fixes.setdefault(pk, fix)
+                for pk, points in tracks.items():
+                    points.extend(self._tracks.get(pk, ()))
+                    self._tracks[pk] = points
+            raise
+        try:
+            append_track_points(tracks)
+        except Exception:
+            # Positions are saved; losing one flush of history is acceptable
+            logger.exception("Appending ambulance tracks failed")
+        return updated
+
+    def _run(self) -> None:
+        while not self._wakeup.wait(self.interval):
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Flushing ambulance locations failed")
+            finally:
+                close_old_connections()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.flush()
+
+
+location_buffer: LocationBuffer = LocationBuffer(
+    interval=settings.LOCATION_FLUSH_INTERVAL_MS / 1000
+)
+atexit.register(location_buffer.flush)
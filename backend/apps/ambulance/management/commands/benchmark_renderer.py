@@ -0,0 +1,76 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from apps.ambulance.models import Ambulance
+from apps.ambulance.v1.serializers import AmbulanceSerializer
+from utils import renderers
+from utils.renderers import CustomResponseRenderer
+from utils.synthetic import SyntheticCity, create_city
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the response renderer with DRF's stdlib JSON renderer on a list "
+        "of serialized ambulances, and check that both write the same bytes. "
+        "The fleet is created in a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--ambulances", type=int, default=10_000)
+        parser.add_argument("--hospitals", type=int, default=500)
+        parser.add_argument("--repeat", type=int, default=10, help="Renders per renderer; the best is kept.")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            create_city(SyntheticCity(seed=options["seed"]), options["hospitals"], options["ambulances"])
+            queryset = Ambulance.objects.select_related(
+                "location", "created_by", "hospital__location", "hospital__created_by"
+            ).order_by("-date_created", "-id")
+            items = AmbulanceSerializer(queryset, many=True).data
+            transaction.set_rollback(True)
+
+        context = {"response": Response(status=200)}
+
+        def envelope():
+            return {
+                "status": 200,
+                "message": "Ambulances retrieved successfully.",
+                "data": items,
+                "pagination": {"next": None, "limit": len(items)},
+            }
+
+        def stdlib():
+            data = CustomResponseRenderer.good_response(envelope(), 200)
+            return JSONRenderer().render(data, "application/json", context)
+
+        def fast():
+            return CustomResponseRenderer().render(envelope(), "application/json", context)
+
+        expected, actual = stdlib(), fast()
+        if actual != expected:
+            raise CommandError("The renderers disagree; the fast path must write the same bytes.")
+
+        encoder = "orjson" if renderers.orjson is not None else "stdlib json (orjson is not installed)"
+        self.stdout.write(f"{len(items)} ambulances, {len(expected) / 1e6:.2f} MB per response, encoder: {encoder}")
+        timings = {}
+        for label, render in (("stdlib JSONRenderer", stdlib), ("CustomResponseRenderer", fast)):
+            timings[label] = self.best_of(render, options["repeat"])
+            self.stdout.write(
+                f"{label:>24}: {timings[label] * 1000:8.1f} ms, "
+                f"{len(items) / timings[label]:>10,.0f} items/s, {len(expected) / timings[label] / 1e6:7.1f} MB/s"
+            )
+        self.stdout.write(f"Speed-up: {timings['stdlib JSONRenderer'] / timings['CustomResponseRenderer']:.1f}x")
+
+    @staticmethod
+    def best_of(render, repeat):
+        best = float("inf")
+        for _ in range(repeat):
+            started = time.perf_counter()
+            render()
+            best = min(best, time.perf_counter() - started)
+        return best
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.ambulance.v1.services import release_expired_ambulances
+
+
+class Command(BaseCommand):
+    help = "Mark ambulances whose busy_until has passed as available again."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=0,
+            help="Repeat the sweep every N seconds instead of running once.",
+        )
+
+    def handle(self, *args, **options):
+        interval = options["interval"]
+        while True:
+            released = release_expired_ambulances()
+            if released:
+                self.stdout.write(f"Released {released} ambulances.")
+            if not interval:
+                break
+            time.sleep(interval)
@@ -0,0 +1,48 @@
+import asyncio
+import logging
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.ambulance.telemetry import FRAME_SIZE, TelemetryGateway
+
+
+class Command(BaseCommand):
+    help = "Run the binary TCP/UDP telemetry gateway for ambulance trackers."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="0.0.0.0")
+        parser.add_argument("--tcp-port", type=int, default=9100, help="0 disables TCP.")
+        parser.add_argument("--udp-port", type=int, default=9101, help="0 disables UDP.")
+        parser.add_argument("--max-connections", type=int, default=50_000)
+        parser.add_argument("--queue-size", type=int, default=50_000, help="Decoded fixes held in memory.")
+        parser.add_argument("--idle-timeout", type=float, default=120.0, help="Close silent TCP connections.")
+        parser.add_argument("--report-interval", type=float, default=60.0, help="Seconds between stats logs.")
+
+    def handle(self, *args, **options):
+        if not settings.TELEMETRY_SECRET:
+            raise CommandError("Set TELEMETRY_SECRET to run the telemetry gateway.")
+        logging.getLogger("apps.ambulance.telemetry").setLevel(logging.INFO)
+
+        gateway = TelemetryGateway(
+            max_connections=options["max_connections"],
+            queue_size=options["queue_size"],
+            idle_timeout=options["idle_timeout"],
+        )
+        self.stdout.write(
+            f"Telemetry gateway on {options['host']} "
+            f"(tcp {options['tcp_port'] or 'off'}, udp {options['udp_port'] or 'off'}, "
+            f"{FRAME_SIZE}-byte frames)."
+        )
+        try:
+            asyncio.run(
+                gateway.serve(
+                    options["host"],
+                    options["tcp_port"],
+                    options["udp_port"],
+                    report_interval=options["report_interval"],
+                )
+            )
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(f"Stopped. {gateway.stats}")
@@ -0,0 +1,78 @@
+import asyncio
+import math
+import random
+import socket
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.ambulance.models import Ambulance
+from apps.ambulance.telemetry import encode_frame, unit_key
+from utils.geo import KM_PER_DEGREE
+
+
+class Command(BaseCommand):
+    help = "Simulate ambulance trackers sending telemetry frames to the gateway."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=9100)
+        parser.add_argument("--udp", action="store_true", help="Send datagrams instead of TCP streams.")
+        parser.add_argument("--units", type=int, default=100, help="Ambulances to simulate.")
+        parser.add_argument("--interval", type=float, default=5.0, help="Seconds between fixes per unit.")
+        parser.add_argument("--duration", type=float, default=60.0, help="Seconds to run.")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        if not settings.TELEMETRY_SECRET:
+            raise CommandError("Set TELEMETRY_SECRET to the gateway's value.")
+        units = list(
+            Ambulance.objects.filter(latitude__isnull=False)
+            .values_list("id", "latitude", "longitude")[: options["units"]]
+        )
+        if not units:
+            raise CommandError("No ambulances with a position to simulate.")
+
+        sent = asyncio.run(self.simulate(units, options))
+        elapsed = options["duration"]
+        self.stdout.write(f"Sent {sent} frames from {len(units)} units ({sent / elapsed:.0f}/s).")
+
+    async def simulate(self, units, options):
+        rng = random.Random(options["seed"])
+        deadline = time.monotonic() + options["duration"]
+        counts = []
+
+        async def tracker(ambulance_id, lat, lon):
+            key = unit_key(ambulance_id)
+            heading = rng.uniform(0, 360)
+            if options["udp"]:
+                sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                send = lambda frame: sock.sendto(frame, (options["host"], options["port"]))
+                close = sock.close
+            else:
+                _, writer = await asyncio.open_connection(options["host"], options["port"])
+                send = writer.write
+                close = writer.close
+            # Stagger start times so fixes do not arrive in lockstep
+            await asyncio.sleep(rng.uniform(0, options["interval"]))
+            count = 0
+            try:
+                while time.monotonic() < deadline:
+                    # Drive at about 40 km/h, turning a little each fix
+                    speed = rng.uniform(8, 14)
+                    heading = (heading + rng.uniform(-20, 20)) % 360
+                    step_km = speed * options["interval"] / 1000
+                    lat += step_km * math.cos(math.radians(heading)) / KM_PER_DEGREE
+                    lon += step_km * math.sin(math.radians(heading)) / (
+                        KM_PER_DEGREE * math.cos(math.radians(lat))
+                    )
+                    send(encode_frame(ambulance_id, lat, lon, speed, heading, key=key))
+                    count += 1
+                    await asyncio.sleep(options["interval"])
+            finally:
+                close()
+                counts.append(count)
+
+        await asyncio.gather(*(tracker(*unit) for unit in units))
+        return sum(counts)
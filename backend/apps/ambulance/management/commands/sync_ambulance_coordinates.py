@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from apps.ambulance.index import ambulance_index
+from apps.ambulance.v1.services import sync_ambulance_coordinates
+
+
+class Command(BaseCommand):
+    help = "Backfill the denormalized latitude/longitude columns on Ambulance from AmbulanceLocation."
+
+    def handle(self, *args, **options):
+        updated = sync_ambulance_coordinates()
+        ambulance_index.invalidate()
+        self.stdout.write(self.style.SUCCESS(f"Synced coordinates for {updated} ambulances."))
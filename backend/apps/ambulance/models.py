@@ -1,8 +1,41 @@
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 from utils.mixins import Audit
 from apps.ambulance.utils import AmbulanceTypeEnum, StatusEnum
 from apps.hospital.models import Hospital
+from utils.geo import bounding_box
+
+
+class AmbulanceQuerySet(models.QuerySet):
+    def dispatchable(self, now=None):
+        """
+        Ambulances that can take a call: available ones, plus busy ones whose
+        `busy_until` has already passed but have not been released yet.
+        """
+        now = now or timezone.now()
+        return self.filter(
+            models.Q(status=StatusEnum.AVAILABLE)
+            | models.Q(status=StatusEnum.BUSY, busy_until__lte=now)
+        )
+
+    def expired(self, now=None):
+        """Busy ambulances whose `busy_until` has passed."""
+        now = now or timezone.now()
+        return self.filter(status=StatusEnum.BUSY, busy_until__lte=now)
+
+    def within_bounding_box(self, lat, lon, radius_km):
+        """
+        Ambulances whose denormalized position lies in the box enclosing a
+        circle of `radius_km` around the point. Cheap, index-backed
+        pre-filter to run before any distance math.
+        """
+        min_lat, max_lat, min_lon, max_lon = bounding_box(lat, lon, radius_km)
+        return self.filter(
+            latitude__range=(min_lat, max_lat),
+            longitude__range=(min_lon, max_lon),
+        )
+
 
 class Ambulance(Audit):
     status = models.CharField(
@@ -25,11 +58,57 @@ class Ambulance(Audit):
         related_name="ambulances_created"
     )
     busy_until = models.DateTimeField(null=True, blank=True)
-    
+
+    # Denormalized copy of the current location for the dispatch hot path
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+
+    objects = AmbulanceQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "latitude", "longitude"]),
+            models.Index(fields=["status", "busy_until"]),
+            models.Index(fields=["ambulance_type", "status"]),
+            models.Index(fields=["date_created", "id"]),
+            models.Index(fields=["last_updated"]),
+        ]
+
 
 class AmbulanceLocation(Audit):
     ambulance = models.OneToOneField(
         Ambulance, on_delete=models.CASCADE, related_name="location"
     )
-    latitude = models.CharField(max_length=255)
-    longitude = models.CharField(max_length=255)
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["latitude", "longitude"]),
+        ]
+
+
+
+class AmbulanceTrackSegment(Audit):
+    """
+    One hour of an ambulance's GPS track, stored as a compact blob of
+    delta-encoded points (see `utils.tracks`). New points are appended
+    after the last stored one, which is kept in `last_*` so appending
+    never needs to decode the blob.
+    """
+    ambulance = models.ForeignKey(
+        Ambulance, on_delete=models.CASCADE, related_name="track_segments"
+    )
+    starts_at = models.DateTimeField()
+    ends_at = models.DateTimeField()
+    points = models.BinaryField(default=bytes)
+    point_count = models.PositiveIntegerField(default=0)
+    # Last stored point, in the encoded units: ms since epoch and micro-degrees
+    last_timestamp = models.BigIntegerField()
+    last_latitude = models.IntegerField()
+    last_longitude = models.IntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["ambulance", "starts_at"], name="unique_track_segment_hour"),
+        ]
@@ -0,0 +1,49 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+
+from apps.ambulance.index import ambulance_index
+from apps.ambulance.models import Ambulance, AmbulanceLocation
+from apps.ambulance.v1.streams import publish_fleet_changes
+from utils.cache import ambulance_catalog
+
+# Sent with `ambulance_ids` whenever units become free to take a new call
+ambulance_released = Signal()
+
+
+@receiver(post_save, sender=Ambulance)
+def index_ambulance_status(sender, instance, **kwargs):
+    def update():
+        ambulance_index.set_status(
+            instance.pk, instance.status, instance.busy_until, instance.ambulance_type
+        )
+        publish_fleet_changes([instance.pk])
+
+    transaction.on_commit(update)
+
+
+@receiver(post_save, sender=AmbulanceLocation)
+def index_ambulance_location(sender, instance, **kwargs):
+    def update():
+        ambulance_index.set_position(instance.ambulance_id, instance.latitude, instance.longitude)
+        publish_fleet_changes([instance.ambulance_id])
+
+    transaction.on_commit(update)
+
+
+@receiver(post_delete, sender=Ambulance)
+def unindex_ambulance(sender, instance, **kwargs):
+    # Read now: delete() clears the instance's pk before the commit
+    ambulance_id = instance.pk
+
+    def update():
+        ambulance_index.remove(ambulance_id)
+        ambulance_catalog.invalidate([ambulance_id], lists=True)
+        publish_fleet_changes([ambulance_id])
+
+    transaction.on_commit(update)
+
+
+@receiver(ambulance_released)
+def publish_released_ambulances(sender, ambulance_ids, **kwargs):
+    transaction.on_commit(lambda: publish_fleet_changes(ambulance_ids))
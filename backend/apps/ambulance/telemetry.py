@@ -0,0 +1,237 @@
+"""
+Compact binary telemetry for ambulance trackers.
+
+Every fix is one fixed-width, big-endian frame:
+
+    version    B    1 byte   protocol version (1)
+    ambulance  16s  16 bytes ambulance UUID
+    timestamp  Q    8 bytes  milliseconds since the Unix epoch
+    latitude   i    4 bytes  degrees * 1e7
+    longitude  i    4 bytes  degrees * 1e7
+    speed      H    2 bytes  centimetres per second
+    heading    H    2 bytes  hundredths of a degree
+    tag        8s   8 bytes  truncated HMAC-SHA256 of the fields above
+
+Each unit signs its frames with its own key, derived from
+`TELEMETRY_SECRET` and the ambulance id, so the server needs no key table.
+Over TCP frames are simply sent back to back; over UDP each datagram
+carries one or more whole frames.
+"""
+import asyncio
+import hashlib
+import hmac
+import logging
+import struct
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timezone as dt_timezone
+from functools import lru_cache
+from typing import List, Optional
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from apps.ambulance.index import ambulance_index
+from apps.ambulance.ingest import location_buffer
+
+logger = logging.getLogger(__name__)
+
+VERSION = 1
+_BODY = struct.Struct("!B16sQiiHH")
+TAG_SIZE = 8
+FRAME_SIZE = _BODY.size + TAG_SIZE
+
+COORDINATE_SCALE = 1e7
+
+
+class FrameError(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class Fix:
+    ambulance_id: uuid.UUID
+    recorded_at: datetime
+    latitude: float
+    longitude: float
+    speed: float
+    heading: float
+
+
+@lru_cache(maxsize=65536)
+def unit_key(ambulance_id: uuid.UUID) -> bytes:
+    """Pre-shared key of one tracker, to be provisioned onto the device."""
+    secret = settings.TELEMETRY_SECRET.encode()
+    return hmac.new(secret, ambulance_id.bytes, hashlib.sha256).digest()
+
+
+def _tag(key: bytes, body: bytes) -> bytes:
+    return hmac.new(key, body, hashlib.sha256).digest()[:TAG_SIZE]
+
+
+def encode_frame(
+    ambulance_id: uuid.UUID,
+    latitude: float,
+    longitude: float,
+    speed: float = 0.0,
+    heading: float = 0.0,
+    timestamp: Optional[float] = None,
+    key: Optional[bytes] = None,
+) -> bytes:
+    timestamp = time.time() if timestamp is None else timestamp
+    body = _BODY.pack(
+        VERSION,
+        ambulance_id.bytes,
+        int(timestamp * 1000),
+        round(latitude * COORDINATE_SCALE),
+        round(longitude * COORDINATE_SCALE),
+        min(round(speed * 100), 0xFFFF),
+        round((heading % 360) * 100),
+    )
+    return body + _tag(key or unit_key(ambulance_id), body)
+
+
+def decode_frame(frame: bytes, max_skew: Optional[float] = None) -> Fix:
+    """Verify and decode one frame. Raises `FrameError` for anything invalid."""
+    if len(frame) != FRAME_SIZE:
+        raise FrameError("Bad frame size")
+    body, tag = frame[: _BODY.size], frame[_BODY.size:]
+    version, raw_id, millis, lat, lon, speed, heading = _BODY.unpack(body)
+    if version != VERSION:
+        raise FrameError("Unsupported version")
+
+    ambulance_id = uuid.UUID(bytes=raw_id)
+    if not hmac.compare_digest(tag, _tag(unit_key(ambulance_id), body)):
+        raise FrameError("Bad signature")
+
+    timestamp = millis / 1000
+    max_skew = settings.TELEMETRY_MAX_SKEW_SECONDS if max_skew is None else max_skew
+    if abs(time.time() - timestamp) > max_skew:
+        raise FrameError("Timestamp out of range")
+
+    latitude, longitude = lat / COORDINATE_SCALE, lon / COORDINATE_SCALE
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise FrameError("Coordinates out of range")
+
+    return Fix(
+        ambulance_id=ambulance_id,
+        recorded_at=datetime.fromtimestamp(timestamp, tz=dt_timezone.utc),
+        latitude=latitude,
+        longitude=longitude,
+        speed=speed / 100,
+        heading=heading / 100,
+    )
+
+
+class TelemetryGateway:
+    """
+    asyncio TCP/UDP server for tracker frames.
+
+    Decoded fixes go through a bounded queue to a consumer that hands them
+    in batches to the `LocationBuffer` used by the REST ingest endpoint, on
+    a worker thread so database work never blocks the event loop. Memory
+    stays bounded: the queue has a fixed size (TCP readers wait when it is
+    full, UDP datagrams are dropped), every connection reads exactly one
+    frame at a time, and idle or excess connections are closed.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = 50_000,
+        queue_size: int = 50_000,
+        batch_size: int = 5_000,
+        idle_timeout: float = 120.0,
+    ):
+        self.max_connections = max_connections
+        self.batch_size = batch_size
+        self.idle_timeout = idle_timeout
+        self.queue: "asyncio.Queue[Fix]" = None
+        self.queue_size = queue_size
+        self.connections = 0
+        self.stats = {"frames": 0, "rejected": 0, "dropped": 0, "unknown": 0, "stale": 0}
+
+    def _accept(self, frame: bytes) -> Optional[Fix]:
+        try:
+            fix = decode_frame(frame)
+        except FrameError:
+            self.stats["rejected"] += 1
+            return None
+        self.stats["frames"] += 1
+        return fix
+
+    async def handle_tcp(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        if self.connections >= self.max_connections:
+            writer.close()
+            return
+        self.connections += 1
+        try:
+            while True:
+                frame = await asyncio.wait_for(reader.readexactly(FRAME_SIZE), self.idle_timeout)
+                fix = self._accept(frame)
+                if fix is not None:
+                    await self.queue.put(fix)
+        except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            self.connections -= 1
+            writer.close()
+
+    def handle_datagram(self, data: bytes) -> None:
+        if len(data) % FRAME_SIZE:
+            self.stats["rejected"] += 1
+            return
+        for start in range(0, len(data), FRAME_SIZE):
+            fix = self._accept(data[start:start + FRAME_SIZE])
+            if fix is None:
+                continue
+            try:
+                self.queue.put_nowait(fix)
+            except asyncio.QueueFull:
+                self.stats["dropped"] += 1
+
+    async def consume(self) -> None:
+        while True:
+            batch: List[Fix] = [await self.queue.get()]
+            while len(batch) < self.batch_size and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            try:
+                await asyncio.to_thread(self._store, batch)
+            except Exception:
+                logger.exception("Storing telemetry batch failed")
+
+    def _store(self, batch: List[Fix]) -> None:
+        close_old_connections()
+        for fix in batch:
+            if not ambulance_index.known(fix.ambulance_id):
+                self.stats["unknown"] += 1
+            elif not location_buffer.add(fix.ambulance_id, fix.latitude, fix.longitude, fix.recorded_at):
+                self.stats["stale"] += 1
+
+    async def report(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            logger.info("Telemetry: %s connections, %s", self.connections, self.stats)
+
+    async def serve(
+        self, host: str, tcp_port: Optional[int], udp_port: Optional[int], report_interval: float = 60.0
+    ) -> None:
+        self.queue = asyncio.Queue(self.queue_size)
+        loop = asyncio.get_running_loop()
+        if tcp_port:
+            self._tcp_server = await asyncio.start_server(
+                self.handle_tcp, host, tcp_port, limit=FRAME_SIZE * 4, backlog=4096
+            )
+        if udp_port:
+            gateway = self
+
+            class Protocol(asyncio.DatagramProtocol):
+                def datagram_received(self, data, addr):
+                    gateway.handle_datagram(data)
+
+            self._udp_transport, _ = await loop.create_datagram_endpoint(
+                Protocol, local_addr=(host, udp_port)
+            )
+        if report_interval:
+            self._reporter = asyncio.create_task(self.report(report_interval))
+        await self.consume()
@@ -0,0 +1,807 @@
+import asyncio
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+
+import numpy as np
+from django.db import transaction
+from asgiref.sync import sync_to_async
+from django.test import AsyncClient, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone as django_timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.ambulance.index import ambulance_index
+from apps.ambulance.ingest import LocationBuffer
+from apps.ambulance.models import Ambulance, AmbulanceTrackSegment
+from apps.ambulance.signals import ambulance_released
+from apps.ambulance.utils import AmbulanceTypeEnum, StatusEnum
+from apps.ambulance.telemetry import (
+    FRAME_SIZE,
+    FrameError,
+    TelemetryGateway,
+    decode_frame,
+    encode_frame,
+    unit_key,
+)
+from apps.ambulance.v1.services import (
+    append_track_points,
+    claim_ambulance,
+    claim_ambulances,
+    release_expired_ambulances,
+    sync_ambulance_coordinates,
+    track_points,
+    update_ambulance_positions,
+)
+from apps.ambulance.v1.streams import fleet_changes_since, fleet_filter
+from apps.hospital.models import Hospital
+from apps.user.models import User
+from apps.user.utils import UserTypesEnum
+from utils.cache import ambulance_catalog, hospital_catalog
+from utils.geo import (
+    distance_matrix,
+    equirectangular_many,
+    haversine_distance,
+    haversine_many,
+    haversine_pairs,
+)
+from utils.renderers import CustomResponseRenderer
+from utils.spatial import GridIndex, PointSet
+from utils.synthetic import SyntheticCity, create_city
+from utils.testing import QueryBudgetMixin
+from utils.tracks import decode_points, encode_points
+from utils.varint import read_varints, unzigzag, write_varint, zigzag
+
+
+class AmbulanceQueryBudgetTests(QueryBudgetMixin, TestCase):
+    url = "/v1/ambulance/"
+    model = Ambulance
+    list_queries = 3
+    detail_queries = 3
+    cached_queries = 2
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(
+            username="admin", email="admin@example.com", password="x", role=UserTypesEnum.ADMIN
+        )
+
+    def fill(self, total):
+        missing = total - Ambulance.objects.count()
+        create_city(SyntheticCity(seed=total), max(missing // 50, 1), missing)
+        Hospital.objects.update(created_by=self.admin)
+        Ambulance.objects.update(created_by=self.admin)
+        ambulance_catalog.invalidate_all()
+        hospital_catalog.invalidate_all()
+
+    def check_detail(self, data):
+        self.assertEqual(data["hospital"]["createdBy"], str(self.admin))
+
+
+class AmbulanceCatalogCacheTests(TestCase):
+    def setUp(self):
+        admin = User.objects.create_user(
+            username="admin", email="admin@example.com", password="x", role=UserTypesEnum.ADMIN
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(admin)
+        self.hospitals, self.ambulances = create_city(SyntheticCity(seed=0), 2, 4)
+        ambulance_catalog.invalidate_all()
+        hospital_catalog.invalidate_all()
+
+    def listed(self):
+        return {item["id"]: item for item in self.client.get("/v1/ambulance/").json()["data"]}
+
+    def test_hospital_edits_reach_cached_ambulance_payloads(self):
+        ambulance = self.ambulances[0]
+        url = f"/v1/ambulance/{ambulance.pk}/"
+        self.assertEqual(self.client.get(url).json()["data"]["hospital"]["name"], ambulance.hospital.name)
+        # Warm the list page: its payloads are cached on the second read
+        self.listed()
+        self.listed()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(f"/v1/hospitals/{ambulance.hospital_id}/", {"name": "Renamed"}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get(url).json()["data"]["hospital"]["name"], "Renamed")
+        for item in self.listed().values():
+            renamed = item["hospital"]["id"] == str(ambulance.hospital_id)
+            self.assertEqual(item["hospital"]["name"] == "Renamed", renamed)
+
+    def test_ambulance_writes_invalidate_cached_payloads(self):
+        first, second = self.ambulances[:2]
+        self.client.get(f"/v1/ambulance/{first.pk}/")
+        self.listed()
+        self.listed()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(f"/v1/ambulance/{first.pk}/", {"status": StatusEnum.OFFLINE}, format="json")
+        self.assertEqual(self.client.get(f"/v1/ambulance/{first.pk}/").json()["data"]["status"], StatusEnum.OFFLINE)
+        self.assertEqual(self.listed()[str(first.pk)]["status"], StatusEnum.OFFLINE)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(f"/v1/ambulance/{second.pk}/")
+        self.assertEqual(self.client.get(f"/v1/ambulance/{second.pk}/").status_code, 404)
+        self.assertNotIn(str(second.pk), self.listed())
+
+
+class AmbulanceConditionalGetTests(TestCase):
+    def setUp(self):
+        admin = User.objects.create_user(
+            username="admin", email="admin@example.com", password="x", role=UserTypesEnum.ADMIN
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(admin)
+        _, (self.ambulance, _) = create_city(SyntheticCity(seed=0), 1, 2)
+        self.url = f"/v1/ambulance/{self.ambulance.pk}/"
+        ambulance_catalog.invalidate_all()
+        ambulance_index.invalidate()
+
+    def test_an_unchanged_ambulance_is_not_sent_again(self):
+        for url in ("/v1/ambulance/", self.url):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            repeat = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+            self.assertEqual(repeat.status_code, 304)
+            self.assertEqual(repeat.content, b"")
+            self.assertEqual(repeat["ETag"], response["ETag"])
+
+    def test_a_location_ingest_changes_the_etag(self):
+        etag = self.client.get(self.url)["ETag"]
+        listed = self.client.get("/v1/ambulance/")["ETag"]
+        # Flushed by hand; the background thread never wakes up on its own
+        buffer = LocationBuffer(interval=3600)
+        self.addCleanup(buffer.stop)
+        with mock.patch("apps.ambulance.v1.views.location_buffer", buffer):
+            response = self.client.post(
+                "/v1/ambulance/locations/",
+                {"ambulanceId": str(self.ambulance.pk), "latitude": 6.5, "longitude": 3.3},
+                format="json",
+            )
+        self.assertEqual(response.json()["data"]["accepted"], 1)
+        # Nothing is written until the buffer is flushed
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            buffer.flush()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertAlmostEqual(float(response.json()["data"]["location"]["latitude"]), 6.5)
+        self.assertEqual(self.client.get("/v1/ambulance/", HTTP_IF_NONE_MATCH=listed).status_code, 200)
+
+    def test_a_hospital_edit_changes_the_etag(self):
+        etag = self.client.get(self.url)["ETag"]
+        listed = self.client.get("/v1/ambulance/")["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(f"/v1/hospitals/{self.ambulance.hospital_id}/", {"name": "Renamed"}, format="json")
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["data"]["hospital"]["name"], "Renamed")
+        self.assertEqual(self.client.get("/v1/ambulance/", HTTP_IF_NONE_MATCH=listed).status_code, 200)
+
+
+class ResponseRendererTests(TestCase):
+    """The envelope renderer must write exactly what DRF's JSONRenderer would."""
+
+    def assertSameBytes(self, body, status=200):
+        context = {"response": Response(status=status)}
+        if status < 400:
+            envelope = CustomResponseRenderer.good_response(dict(body), status)
+        else:
+            envelope = CustomResponseRenderer.bad_response(dict(body), status)
+        expected = JSONRenderer().render(envelope, "application/json", context)
+        self.assertEqual(CustomResponseRenderer().render(dict(body), "application/json", context), expected)
+
+    def test_ambulance_list(self):
+        create_city(SyntheticCity(seed=1), 5, 200)
+        response = APIClient().get("/v1/ambulance/", {"limit": 100})
+        self.assertEqual(response.status_code, 200)
+        expected = JSONRenderer().render(response.json(), "application/json", {"response": response})
+        self.assertEqual(response.content, expected)
+
+    def test_awkward_values(self):
+        self.assertSameBytes({"message": "ok", "data": [0.1, 1e-07, 3e-05, 10.00001, 2**70, "line\u2028break", "é"]})
+        self.assertSameBytes({"message": None, "data": {1: "int key", "nested": {"id": "7091491e-7b00"}}})
+        self.assertSameBytes({"name": ["This field is required."]}, status=400)
+
+    def test_non_finite_floats_raise_like_drf(self):
+        context = {"response": Response(status=200)}
+        for value in (float("nan"), float("inf"), -float("inf")):
+            body = {"message": "ok", "data": [{"eta": None, "legs": (1.5, value)}]}
+            envelope = CustomResponseRenderer.good_response(dict(body), 200)
+            with self.assertRaises(ValueError):
+                JSONRenderer().render(envelope, "application/json", context)
+            with self.assertRaises(ValueError):
+                CustomResponseRenderer().render(dict(body), "application/json", context)
+        self.assertSameBytes({"message": "ok", "data": [{"eta": None, "legs": (1.5, 2.0)}]})
+
+
+class LocationBufferTests(TestCase):
+    start = datetime(2025, 1, 1, 8, 0, tzinfo=timezone.utc)
+
+    def setUp(self):
+        _, (self.ambulance,) = create_city(SyntheticCity(seed=0), 1, 1)
+        # Flushed by hand; the background thread never wakes up on its own
+        self.buffer = LocationBuffer(interval=3600, max_track_points=5)
+        self.addCleanup(self.buffer.stop)
+
+    def fix(self, seconds, lat):
+        return self.buffer.add(self.ambulance.pk, lat, 3.30, self.start + timedelta(seconds=seconds))
+
+    def position(self):
+        return Ambulance.objects.values_list("latitude", flat=True).get(pk=self.ambulance.pk)
+
+    def track(self):
+        return [lat for _, lat, _ in track_points(self.ambulance.pk, self.start, self.start + timedelta(hours=1))]
+
+    def test_fixes_are_coalesced_into_one_position_and_kept_as_history(self):
+        for second in range(3):
+            self.assertTrue(self.fix(second, 6.50 + second / 100))
+        self.assertEqual(len(self.buffer), 1)
+        self.assertEqual(self.buffer.flush(), 1)
+        self.assertAlmostEqual(self.position(), 6.52)
+        self.assertEqual(self.track(), [6.50, 6.51, 6.52])
+
+    def test_a_late_fix_is_rejected_after_a_flush(self):
+        self.fix(10, 6.60)
+        self.buffer.flush()
+        self.assertFalse(self.fix(5, 6.55))
+        self.assertEqual(self.buffer.flush(), 0)
+        self.assertAlmostEqual(self.position(), 6.60)
+        self.assertTrue(self.fix(10, 6.61))
+
+    def test_a_failed_flush_keeps_newer_fixes_and_bounded_history(self):
+        self.fix(0, 6.50)
+        with mock.patch(
+            "apps.ambulance.v1.services.update_ambulance_positions", side_effect=RuntimeError("down")
+        ):
+            for attempt in range(3):
+                with self.assertRaises(RuntimeError):
+                    self.buffer.flush()
+                self.fix(attempt * 2 + 1, 6.51 + attempt / 100)
+                self.fix(attempt * 2 + 2, 6.51 + attempt / 100)
+        self.assertEqual(len(self.buffer), 1)
+
+        self.assertEqual(self.buffer.flush(), 1)
+        self.assertAlmostEqual(self.position(), 6.53)
+        # Seven fixes were sent; only the newest five are kept
+        self.assertEqual(self.track(), [6.51, 6.52, 6.52, 6.53, 6.53])
+
+
+@override_settings(LOCATION_INGEST_KEY="device-key")
+class LocationIngestTests(TestCase):
+    url = "/v1/ambulance/locations/"
+
+    def setUp(self):
+        _, (self.ambulance,) = create_city(SyntheticCity(seed=0), 1, 1)
+        ambulance_index.invalidate()
+        # Flushed by hand; the background thread never wakes up on its own
+        self.buffer = LocationBuffer(interval=3600)
+        self.addCleanup(self.buffer.stop)
+        patcher = mock.patch("apps.ambulance.v1.views.location_buffer", self.buffer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = APIClient()
+
+    def fix(self, lat, recorded_at, ambulance_id=None):
+        return {
+            "ambulanceId": str(ambulance_id or self.ambulance.pk),
+            "latitude": lat,
+            "longitude": 3.3,
+            "recordedAt": recorded_at.isoformat(),
+        }
+
+    def test_fixes_are_counted_and_buffered(self):
+        now = django_timezone.now()
+        unknown = uuid.uuid4()
+        response = self.client.post(
+            self.url,
+            [self.fix(6.51, now), self.fix(6.50, now - timedelta(seconds=5)), self.fix(6.52, now, unknown)],
+            format="json",
+            HTTP_X_LOCATION_KEY="device-key",
+        )
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()["data"], {"accepted": 1, "stale": 1, "unknown": [str(unknown)]})
+
+        self.assertEqual(self.buffer.flush(), 1)
+        self.ambulance.refresh_from_db()
+        self.assertAlmostEqual(self.ambulance.latitude, 6.51)
+
+    def test_a_single_fix_is_accepted_from_an_admin(self):
+        admin = User.objects.create_user(
+            username="admin", email="admin@example.com", password="x", role=UserTypesEnum.ADMIN
+        )
+        self.client.force_authenticate(admin)
+        response = self.client.post(self.url, self.fix(6.51, django_timezone.now()), format="json")
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()["data"]["accepted"], 1)
+
+    def test_other_callers_are_refused(self):
+        patient = User.objects.create_user(
+            username="patient", email="patient@example.com", password="x", role=UserTypesEnum.PATIENT
+        )
+        fix = self.fix(6.51, django_timezone.now())
+        self.assertEqual(self.client.post(self.url, fix, format="json").status_code, 401)
+        self.assertEqual(
+            self.client.post(self.url, fix, format="json", HTTP_X_LOCATION_KEY="wrong").status_code, 401
+        )
+        self.client.force_authenticate(patient)
+        self.assertEqual(self.client.post(self.url, fix, format="json").status_code, 403)
+        with override_settings(LOCATION_INGEST_KEY=None):
+            self.client.force_authenticate(None)
+            self.assertEqual(
+                self.client.post(self.url, fix, format="json", HTTP_X_LOCATION_KEY="device-key").status_code, 401
+            )
+        self.assertEqual(len(self.buffer), 0)
+
+    def test_the_key_grants_nothing_else(self):
+        response = self.client.delete(f"/v1/ambulance/{self.ambulance.pk}/", HTTP_X_LOCATION_KEY="device-key")
+        self.assertEqual(response.status_code, 401)
+        self.assertTrue(Ambulance.objects.filter(pk=self.ambulance.pk).exists())
+
+
+class FleetStreamTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(
+            username="admin", email="admin@example.com", password="x", role=UserTypesEnum.ADMIN
+        )
+        _, (cls.moved, cls.claimed, cls.idle) = create_city(SyntheticCity(seed=0), 1, 3)
+
+    def setUp(self):
+        ambulance_index.invalidate()
+        self.cursor = django_timezone.now() - timedelta(minutes=1)
+        Ambulance.objects.update(last_updated=self.cursor - timedelta(minutes=5))
+
+    def write_elsewhere(self):
+        # Writes whose events would be published in another process
+        update_ambulance_positions({self.moved.pk: (6.61, 3.41)})
+        claim_ambulance(self.claimed.pk, timedelta(minutes=30))
+
+    def test_filter(self):
+        types = f"{AmbulanceTypeEnum.ALS},{AmbulanceTypeEnum.ICU}"
+        accept = fleet_filter({"bbox": "6.4,3.2,6.6,3.4", "types": types})
+        state = {
+            "id": "1", "ambulanceType": AmbulanceTypeEnum.ALS, "available": True, "latitude": 6.5, "longitude": 3.3
+        }
+        self.assertTrue(accept(state))
+        self.assertFalse(accept({**state, "ambulanceType": AmbulanceTypeEnum.BLS}))
+        self.assertFalse(accept({**state, "latitude": 6.7}))
+        self.assertTrue(accept({**state, "latitude": None, "longitude": None}))
+        self.assertTrue(accept({"id": "1", "removed": True}))
+        self.assertTrue(fleet_filter({})(state))
+        for params in ({"bbox": "6.4,3.2,6.6"}, {"bbox": "a,b,c,d"}, {"types": "Bus"}):
+            with self.subTest(params=params), self.assertRaises(ValueError):
+                fleet_filter(params)
+
+    def test_changes_since_the_cursor_are_read_from_the_database(self):
+        self.assertEqual(fleet_changes_since(self.cursor), ([], self.cursor))
+        self.write_elsewhere()
+        states, cursor = fleet_changes_since(self.cursor)
+        self.assertGreater(cursor, self.cursor)
+        states = {state["id"]: state for state in states}
+        self.assertEqual(set(states), {str(self.moved.pk), str(self.claimed.pk)})
+        moved, claimed = states[str(self.moved.pk)], states[str(self.claimed.pk)]
+        self.assertEqual((moved["latitude"], moved["longitude"]), (6.61, 3.41))
+        self.assertTrue(moved["available"])
+        self.assertFalse(claimed["available"])
+
+        # A unit whose busy_until has passed is reported available
+        Ambulance.objects.filter(pk=self.claimed.pk).update(
+            busy_until=django_timezone.now() - timedelta(seconds=1), last_updated=django_timezone.now()
+        )
+        states, _ = fleet_changes_since(cursor)
+        self.assertTrue(next(s for s in states if s["id"] == str(self.claimed.pk))["available"])
+
+    @override_settings(EVENT_STREAM_HEARTBEAT_SECONDS=0.05)
+    async def test_stream_catches_up_at_each_heartbeat(self):
+        response = await AsyncClient().get(
+            "/v1/ambulance/stream/",
+            {"types": self.claimed.ambulance_type},
+            headers={"Authorization": f"Bearer {AccessToken.for_user(self.admin)}"},
+        )
+        self.assertEqual(response.status_code, 200)
+        chunks = aiter(response.streaming_content)
+        self.assertTrue((await anext(chunks)).startswith(b"event: snapshot"))
+
+        await sync_to_async(self.write_elsewhere)()
+        for _ in range(20):
+            chunk = (await anext(chunks)).decode()
+            if str(self.claimed.pk) in chunk:
+                break
+        self.assertTrue(chunk.startswith("event: ambulance"))
+        self.assertIn(f'"id": "{self.claimed.pk}"', chunk)
+        self.assertIn('"available": false', chunk)
+        await chunks.aclose()
+
+
+class AmbulanceCoordinateTests(TestCase):
+    """The ambulance row carries a denormalized copy of its location."""
+
+    def setUp(self):
+        admin = User.objects.create_user(
+            username="admin", email="admin@example.com", password="x", role=UserTypesEnum.ADMIN
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(admin)
+        (self.hospital,), _ = create_city(SyntheticCity(seed=0), 1, 0)
+
+    def position(self, pk):
+        ambulance = Ambulance.objects.select_related("location").get(pk=pk)
+        return (ambulance.latitude, ambulance.longitude), (ambulance.location.latitude, ambulance.location.longitude)
+
+    def test_writes_keep_both_copies_in_sync(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                "/v1/ambulance/",
+                {
+                    "status": StatusEnum.AVAILABLE,
+                    "ambulanceType": AmbulanceTypeEnum.BLS,
+                    "hospitalId": str(self.hospital.pk),
+                    "location": {"latitude": "6.5244", "longitude": 3.3792},
+                },
+                format="json",
+            )
+        self.assertEqual(response.status_code, 201)
+        pk = response.json()["data"]["id"]
+        self.assertEqual(response.json()["data"]["location"], {"longitude": "3.3792", "latitude": "6.5244"})
+        self.assertEqual(self.position(pk), ((6.5244, 3.3792), (6.5244, 3.3792)))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(
+                f"/v1/ambulance/{pk}/", {"location": {"latitude": "6.6", "longitude": "3.4"}}, format="json"
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.position(pk), ((6.6, 3.4), (6.6, 3.4)))
+
+        response = self.client.patch(
+            f"/v1/ambulance/{pk}/", {"location": {"latitude": "95", "longitude": "3.4"}}, format="json"
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.position(pk), ((6.6, 3.4), (6.6, 3.4)))
+
+    def test_sync_backfills_the_denormalized_columns(self):
+        _, ambulances = create_city(SyntheticCity(seed=1), 1, 5)
+        Ambulance.objects.update(latitude=None, longitude=None)
+        self.assertEqual(sync_ambulance_coordinates(), 5)
+        for ambulance in ambulances:
+            row, location = self.position(ambulance.pk)
+            self.assertEqual(row, location)
+
+    def test_bounding_box_keeps_every_unit_within_the_radius(self):
+        _, ambulances = create_city(SyntheticCity(seed=2), 1, 200)
+        inside = {
+            a.pk for a in ambulances if haversine_distance(6.5244, 3.3792, a.latitude, a.longitude) <= 5
+        }
+        found = set(Ambulance.objects.within_bounding_box(6.5244, 3.3792, 5).values_list("pk", flat=True))
+        self.assertTrue(inside)
+        self.assertLessEqual(inside, found)
+        self.assertLess(len(found), len(ambulances))
+
+
+class AvailabilityTests(TestCase):
+    """A busy unit whose `busy_until` has passed counts as available."""
+
+    def setUp(self):
+        _, (self.available, self.lapsed, self.busy) = create_city(SyntheticCity(seed=0), 1, 3)
+        self.now = django_timezone.now()
+        Ambulance.objects.filter(pk=self.lapsed.pk).update(
+            status=StatusEnum.BUSY, busy_until=self.now - timedelta(minutes=1)
+        )
+        Ambulance.objects.filter(pk=self.busy.pk).update(
+            status=StatusEnum.BUSY, busy_until=self.now + timedelta(minutes=30)
+        )
+        ambulance_index.rebuild()
+
+    def ids(self, queryset):
+        return set(queryset.values_list("pk", flat=True))
+
+    def nearest_ids(self):
+        return {pk for _, pk in ambulance_index.nearest(6.5244, 3.3792, k=10)}
+
+    def test_querysets(self):
+        self.assertEqual(self.ids(Ambulance.objects.dispatchable()), {self.available.pk, self.lapsed.pk})
+        self.assertEqual(self.ids(Ambulance.objects.expired()), {self.lapsed.pk})
+        later = self.now + timedelta(hours=1)
+        self.assertEqual(self.ids(Ambulance.objects.expired(later)), {self.lapsed.pk, self.busy.pk})
+
+    def test_index_returns_units_once_their_busy_time_lapses(self):
+        self.assertEqual(self.nearest_ids(), {self.available.pk, self.lapsed.pk})
+        with mock.patch("apps.ambulance.index.time.time", return_value=time.time() + 3600):
+            self.assertEqual(self.nearest_ids(), {self.available.pk, self.lapsed.pk, self.busy.pk})
+
+    def test_a_newer_claim_supersedes_the_earlier_expiry(self):
+        ambulance_index.set_status(self.busy.pk, StatusEnum.BUSY, self.now + timedelta(hours=2))
+        with mock.patch("apps.ambulance.index.time.time", return_value=time.time() + 3600):
+            self.assertNotIn(self.busy.pk, self.nearest_ids())
+
+    def test_release_persists_expired_units_and_notifies(self):
+        released = mock.Mock()
+        ambulance_released.connect(released)
+        self.addCleanup(ambulance_released.disconnect, released)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(release_expired_ambulances(), 1)
+        self.assertEqual(released.call_args.kwargs["ambulance_ids"], [self.lapsed.pk])
+        self.lapsed.refresh_from_db()
+        self.assertEqual((self.lapsed.status, self.lapsed.busy_until), (StatusEnum.AVAILABLE, None))
+        self.assertEqual(Ambulance.objects.get(pk=self.busy.pk).status, StatusEnum.BUSY)
+
+        released.reset_mock()
+        self.assertEqual(release_expired_ambulances(), 0)
+        released.assert_not_called()
+
+
+class ClaimIndexTests(TestCase):
+    """The dispatch index only learns of a claim once it is committed."""
+
+    def setUp(self):
+        _, self.ambulances = create_city(SyntheticCity(seed=0), 1, 2)
+        ambulance_index.rebuild()
+
+    def available(self, ambulance):
+        return ambulance_index.unit(ambulance.pk)[1]
+
+    def test_rolled_back_claims_leave_units_available(self):
+        first, second = self.ambulances
+        with transaction.atomic():
+            self.assertTrue(claim_ambulance(first.pk, timedelta(minutes=30)))
+            self.assertEqual(claim_ambulances([second.pk], timedelta(minutes=30)), {second.pk})
+            transaction.set_rollback(True)
+        self.assertTrue(self.available(first))
+        self.assertTrue(self.available(second))
+
+    def test_committed_claims_mark_units_busy(self):
+        first, second = self.ambulances
+        with self.captureOnCommitCallbacks(execute=True):
+            claim_ambulance(first.pk, timedelta(minutes=30))
+            claim_ambulances([second.pk], timedelta(minutes=30))
+        self.assertFalse(self.available(first))
+        self.assertFalse(self.available(second))
+
+
+@override_settings(TELEMETRY_SECRET="test-secret", TELEMETRY_MAX_SKEW_SECONDS=300)
+class TelemetryFrameTests(SimpleTestCase):
+    def setUp(self):
+        unit_key.cache_clear()
+        self.ambulance_id = uuid.uuid4()
+        self.timestamp = round(time.time(), 3)
+
+    def frame(self, **kwargs):
+        fields = {"latitude": 6.5244123, "longitude": -3.3792456, "speed": 12.34, "heading": 271.5}
+        fields.update(kwargs)
+        return encode_frame(self.ambulance_id, timestamp=self.timestamp, **fields)
+
+    def assertRejected(self, frame, reason):
+        with self.assertRaisesMessage(FrameError, reason):
+            decode_frame(frame)
+
+    def test_round_trip(self):
+        frame = self.frame()
+        self.assertEqual(len(frame), FRAME_SIZE)
+        fix = decode_frame(frame)
+        self.assertEqual(fix.ambulance_id, self.ambulance_id)
+        self.assertEqual(fix.recorded_at.timestamp(), self.timestamp)
+        self.assertAlmostEqual(fix.latitude, 6.5244123, places=7)
+        self.assertAlmostEqual(fix.longitude, -3.3792456, places=7)
+        self.assertEqual((fix.speed, fix.heading), (12.34, 271.5))
+
+    def test_tampered_or_foreign_frames_are_rejected(self):
+        frame = bytearray(self.frame())
+        frame[20] ^= 1  # a timestamp byte
+        self.assertRejected(bytes(frame), "Bad signature")
+        frame = bytearray(self.frame())
+        frame[-1] ^= 1
+        self.assertRejected(bytes(frame), "Bad signature")
+        # Signed with another unit's key
+        self.assertRejected(self.frame(key=unit_key(uuid.uuid4())), "Bad signature")
+        # Signed with a key derived from another secret
+        with override_settings(TELEMETRY_SECRET="other-secret"):
+            unit_key.cache_clear()
+            frame = self.frame()
+        unit_key.cache_clear()
+        self.assertRejected(frame, "Bad signature")
+
+    def test_truncated_and_stale_frames_are_rejected(self):
+        frame = self.frame()
+        self.assertRejected(frame[:-1], "Bad frame size")
+        self.assertRejected(frame + b"\0", "Bad frame size")
+        self.assertRejected(b"", "Bad frame size")
+        self.timestamp -= 600
+        self.assertRejected(self.frame(), "Timestamp out of range")
+
+    def test_datagrams_must_hold_whole_frames(self):
+        gateway = TelemetryGateway()
+        gateway.queue = asyncio.Queue(10)
+        frame = self.frame()
+        gateway.handle_datagram(frame + frame[: FRAME_SIZE // 2])
+        self.assertEqual((gateway.stats["rejected"], gateway.queue.qsize()), (1, 0))
+        gateway.handle_datagram(frame + self.frame(latitude=6.6))
+        self.assertEqual((gateway.stats["frames"], gateway.queue.qsize()), (2, 2))
+
+
+class TrackCodecTests(SimpleTestCase):
+    def test_varints_round_trip(self):
+        values = [0, 1, -1, 63, -64, 64, 127, 128, -300, 2**31, -(2**40)]
+        self.assertEqual([unzigzag(zigzag(n)) for n in values], values)
+        out = bytearray()
+        for n in values:
+            write_varint(out, zigzag(n))
+        self.assertEqual([unzigzag(z) for z in read_varints(bytes(out))], values)
+        # Deltas within +-63 take one byte, the next ones two
+        for n, size in ((63, 1), (-64, 1), (64, 2), (-65, 2)):
+            out = bytearray()
+            write_varint(out, zigzag(n))
+            self.assertEqual(len(out), size)
+
+    def test_points_round_trip_in_appended_runs(self):
+        origin = (1_000, 0, 0)
+        points = [
+            (1_500, 65_244_000, -33_792_000),
+            (2_500, 65_243_990, -33_792_015),
+            (9_000, 65_250_000, -33_790_000),
+        ]
+        data, last, written = encode_points(points[:2], origin)
+        more, last, written_more = encode_points(points[2:], last)
+        self.assertEqual((written, written_more, last), (2, 1, points[-1]))
+        self.assertEqual(decode_points(data + more, origin), points)
+
+    def test_points_not_after_the_last_one_are_skipped(self):
+        origin = (1_000, 0, 0)
+        points = [(2_000, 5, 5), (2_000, 6, 6), (1_500, 7, 7), (3_000, 8, 8)]
+        data, last, written = encode_points(points, origin)
+        self.assertEqual(written, 2)
+        self.assertEqual(decode_points(data, origin), [(2_000, 5, 5), (3_000, 8, 8)])
+
+
+class TrackSegmentTests(TestCase):
+    start = datetime(2025, 1, 1, 7, 50, tzinfo=timezone.utc)
+
+    def setUp(self):
+        _, (self.ambulance,) = create_city(SyntheticCity(seed=0), 1, 1)
+
+    def at(self, minutes):
+        return self.start + timedelta(minutes=minutes)
+
+    def test_ranges_spanning_hours_read_only_the_overlapping_segments(self):
+        # A fix every ten minutes from 07:50 to 10:10, one exactly on 09:00
+        fixes = [(self.at(m), 6.5 + m / 1000, 3.3) for m in range(0, 150, 10)]
+        self.assertEqual(append_track_points({self.ambulance.pk: fixes}), len(fixes))
+        self.assertEqual(AmbulanceTrackSegment.objects.filter(ambulance=self.ambulance).count(), 4)
+
+        points = track_points(self.ambulance.pk, self.at(35), self.at(75))
+        self.assertEqual([t for t, _, _ in points], [self.at(m) for m in (40, 50, 60, 70)])
+        self.assertAlmostEqual(points[0][1], 6.54)
+        # Both ends are inclusive, and the fix on the hour is kept
+        points = track_points(self.ambulance.pk, self.at(70), self.at(70))
+        self.assertEqual([t for t, _, _ in points], [datetime(2025, 1, 1, 9, 0, tzinfo=timezone.utc)])
+
+    def test_late_points_are_dropped(self):
+        append_track_points({self.ambulance.pk: [(self.at(20), 6.5, 3.3)]})
+        self.assertEqual(append_track_points({self.ambulance.pk: [(self.at(15), 6.6, 3.3)]}), 0)
+        points = track_points(self.ambulance.pk, self.at(0), self.at(30))
+        self.assertEqual([t for t, _, _ in points], [self.at(20)])
+
+
+class GridIndexTests(SimpleTestCase):
+    """The grid must answer exactly what a scan of every point would."""
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        # A dense centre and a sparse fringe, as in a real city
+        lats = np.concatenate([rng.normal(6.52, 0.03, 1500), rng.uniform(6.0, 7.0, 500)])
+        lons = np.concatenate([rng.normal(3.37, 0.03, 1500), rng.uniform(2.9, 3.9, 500)])
+        self.points = {f"unit-{i}": (lat, lon) for i, (lat, lon) in enumerate(zip(lats, lons))}
+        self.grid = GridIndex(cell_size=0.02)
+        for key, (lat, lon) in self.points.items():
+            self.grid.insert(key, lat, lon)
+        self.queries = [(6.52, 3.37), (6.0, 2.9), (7.5, 4.5), (6.8, 3.1)]
+
+    def scan(self, lat, lon, keys=None):
+        keys = self.points if keys is None else keys
+        return sorted((haversine_distance(lat, lon, *self.points[key]), key) for key in keys)
+
+    def test_nearest_matches_a_full_scan(self):
+        for lat, lon in self.queries:
+            for k in (1, 5, 50):
+                with self.subTest(query=(lat, lon), k=k):
+                    found = self.grid.nearest(lat, lon, k=k)
+                    expected = self.scan(lat, lon)[:k]
+                    self.assertEqual([key for _, key in found], [key for _, key in expected])
+                    for (distance, _), (exact, _) in zip(found, expected):
+                        self.assertAlmostEqual(distance, exact, places=6)
+
+    def test_predicate_and_within(self):
+        even = [key for key in self.points if int(key.split("-")[1]) % 2 == 0]
+        found = self.grid.nearest(6.52, 3.37, k=10, predicate=lambda key: key in set(even))
+        self.assertEqual([key for _, key in found], [key for _, key in self.scan(6.52, 3.37, even)[:10]])
+
+        inside = self.grid.within(6.52, 3.37, 5.0)
+        expected = [key for distance, key in self.scan(6.52, 3.37) if distance <= 5.0]
+        self.assertEqual([key for _, key in inside], expected)
+
+    def test_moves_and_removals(self):
+        self.grid.insert("unit-0", 8.0, 5.0)
+        self.assertEqual(self.grid.nearest(8.0, 5.0)[0][1], "unit-0")
+        self.assertEqual(len(self.grid), len(self.points))
+        self.grid.remove("unit-0")
+        self.grid.remove("unit-0")
+        self.assertNotIn("unit-0", self.grid)
+        self.assertNotEqual(self.grid.nearest(8.0, 5.0)[0][1], "unit-0")
+        self.grid.clear()
+        self.assertEqual(self.grid.nearest(6.52, 3.37), [])
+
+
+class AmbulanceIndexTests(TestCase):
+    def setUp(self):
+        _, self.ambulances = create_city(SyntheticCity(seed=0), 2, 40)
+        ambulance_index.invalidate()
+
+    def nearest_ids(self, **kwargs):
+        return [pk for _, pk in ambulance_index.nearest(6.5244, 3.3792, k=100, **kwargs)]
+
+    def test_only_available_units_of_the_requested_types_are_found(self):
+        self.assertCountEqual(self.nearest_ids(), [a.pk for a in self.ambulances])
+        als = {a.pk for a in self.ambulances if a.ambulance_type == AmbulanceTypeEnum.ALS}
+        self.assertTrue(0 < len(als) < len(self.ambulances))
+        self.assertEqual(set(self.nearest_ids(types=[AmbulanceTypeEnum.ALS])), als)
+
+        ambulance = self.ambulances[0]
+        pk = ambulance.pk
+        with self.captureOnCommitCallbacks(execute=True):
+            ambulance.status = StatusEnum.OFFLINE
+            ambulance.save()
+        self.assertNotIn(pk, self.nearest_ids())
+        self.assertTrue(ambulance_index.known(pk))
+        with self.captureOnCommitCallbacks(execute=True):
+            ambulance.delete()
+        self.assertFalse(ambulance_index.known(pk))
+
+
+class HaversineKernelTests(SimpleTestCase):
+    """The NumPy kernels must agree with the scalar formula."""
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.lats = rng.uniform(-80, 80, 200)
+        self.lons = rng.uniform(-180, 180, 200)
+
+    def test_kernels_match_the_scalar_formula(self):
+        exact = [haversine_distance(6.5, 3.4, lat, lon) for lat, lon in zip(self.lats, self.lons)]
+        np.testing.assert_allclose(haversine_many(6.5, 3.4, self.lats, self.lons), exact, rtol=1e-12)
+
+        pairs = haversine_pairs(self.lats[:100], self.lons[:100], self.lats[100:], self.lons[100:])
+        expected = [
+            haversine_distance(a, b, c, d)
+            for a, b, c, d in zip(self.lats[:100], self.lons[:100], self.lats[100:], self.lons[100:])
+        ]
+        np.testing.assert_allclose(pairs, expected, rtol=1e-12)
+
+        matrix = distance_matrix(self.lats[:3], self.lons[:3], self.lats, self.lons)
+        self.assertEqual(matrix.shape, (3, 200))
+        for row, (lat, lon) in enumerate(zip(self.lats[:3], self.lons[:3])):
+            np.testing.assert_allclose(matrix[row], haversine_many(lat, lon, self.lats, self.lons), rtol=1e-12)
+
+    def test_edge_cases(self):
+        # Antipodes round a little over 1 inside the arcsine; no NaN
+        self.assertAlmostEqual(float(haversine_many(0, 0, [0], [180])[0]), np.pi * 6371.0, places=6)
+        self.assertEqual(float(haversine_many(6.5, 3.4, [6.5], [3.4])[0]), 0.0)
+        self.assertEqual(haversine_many(6.5, 3.4, [], []).shape, (0,))
+
+    def test_flat_earth_estimate_is_close_at_city_scale(self):
+        rng = np.random.default_rng(1)
+        lats, lons = rng.uniform(6.3, 6.7, 1000), rng.uniform(3.1, 3.6, 1000)
+        exact = haversine_many(6.5, 3.4, lats, lons)
+        np.testing.assert_allclose(equirectangular_many(6.5, 3.4, lats, lons), exact, rtol=0.01, atol=1e-3)
+
+    def test_prefiltered_nearest_matches_the_exact_one(self):
+        rng = np.random.default_rng(2)
+        points = PointSet(capacity=4)
+        for i, (lat, lon) in enumerate(zip(rng.uniform(6.3, 6.7, 5000), rng.uniform(3.1, 3.6, 5000))):
+            points.add(i, lat, lon)
+        self.assertEqual(points.nearest(6.5, 3.4, k=10, prefilter=True), points.nearest(6.5, 3.4, k=10))
@@ -3,6 +3,7 @@ from apps.ambulance.models import Ambulance, AmbulanceLocation
 from apps.hospital.models import Hospital
 from apps.ambulance.utils import StatusEnum, AmbulanceTypeEnum
 from apps.hospital.v1.serializers import HospitalSerializer
+from utils.fields import LatitudeField, LongitudeField
 from apps.ambulance.v1.services import (
     create_ambulance_with_location,
     update_ambulance_with_location,
@@ -10,14 +11,31 @@ from apps.ambulance.v1.services import (
 
 
 class AmbulanceLocationSerializer(serializers.ModelSerializer):
-    longitude = serializers.CharField()
-    latitude = serializers.CharField()
+    longitude = LongitudeField()
+    latitude = LatitudeField()
 
     class Meta:
         model = AmbulanceLocation
         fields = ["longitude", "latitude"]
 
 
+class LocationFixSerializer(serializers.Serializer):
+    ambulanceId = serializers.UUIDField(source="ambulance_id")
+    latitude = LatitudeField()
+    longitude = LongitudeField()
+    recordedAt = serializers.DateTimeField(source="recorded_at", required=False)
+
+
+class TrackQuerySerializer(serializers.Serializer):
+    start = serializers.DateTimeField()
+    end = serializers.DateTimeField()
+
+    def validate(self, attrs):
+        if attrs["start"] > attrs["end"]:
+            raise serializers.ValidationError("start must not be after end.")
+        return attrs
+
+
 class AmbulanceSerializer(serializers.ModelSerializer):
     location = AmbulanceLocationSerializer()
     hospital = HospitalSerializer(read_only=True)
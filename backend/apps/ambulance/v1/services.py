@@ -1,11 +1,22 @@
-from typing import Dict
-from apps.ambulance.models import Ambulance, AmbulanceLocation
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from django.db import transaction
+from django.db.models import Case, FloatField, OuterRef, Subquery, Value, When
+from django.utils import timezone
+from apps.ambulance.index import ambulance_index
+from apps.ambulance.models import Ambulance, AmbulanceLocation, AmbulanceTrackSegment
+from apps.ambulance.signals import ambulance_released
+from apps.ambulance.utils import StatusEnum
+from utils.cache import ambulance_catalog
+from utils.tracks import decode_points, encode_points, from_point, to_point
 
 
 def create_ambulance_with_location(validated_data: Dict) -> Ambulance:
     location_data = validated_data.pop("location")
-    ambulance = Ambulance.objects.create(**validated_data)
+    ambulance = Ambulance.objects.create(**validated_data, **location_data)
     AmbulanceLocation.objects.create(ambulance=ambulance, **location_data)
+    transaction.on_commit(lambda: ambulance_catalog.invalidate([ambulance.pk], lists=True))
     return ambulance
 
 
@@ -14,6 +25,10 @@ def update_ambulance_with_location(instance: Ambulance, validated_data: Dict) ->
 
     for attr, value in validated_data.items():
         setattr(instance, attr, value)
+    if location_data:
+        # Keep the denormalized position on the ambulance row in sync
+        for attr, value in location_data.items():
+            setattr(instance, attr, value)
     instance.save()
 
     if location_data:
@@ -21,4 +36,264 @@ def update_ambulance_with_location(instance: Ambulance, validated_data: Dict) ->
             ambulance=instance, defaults=location_data
         )
 
+    transaction.on_commit(lambda: ambulance_catalog.invalidate([instance.pk]))
     return instance
+
+
+def sync_ambulance_coordinates() -> int:
+    """
+    Copy every `AmbulanceLocation` onto its ambulance's denormalized
+    `latitude`/`longitude` columns in a single UPDATE. Returns rows updated.
+    """
+    locations = AmbulanceLocation.objects.filter(ambulance=OuterRef("pk"))
+    return Ambulance.objects.update(
+        latitude=Subquery(locations.values("latitude")[:1]),
+        longitude=Subquery(locations.values("longitude")[:1]),
+    )
+
+
+def update_ambulance_positions(positions: Dict, batch_size: int = 500) -> int:
+    """
+    Write the latest `(lat, lon)` of many ambulances, keyed by ambulance id,
+    with one CASE-based UPDATE per table and batch. Returns the number of
+    ambulances updated.
+    """
+    now = timezone.now()
+    ids = list(positions)
+    updated = 0
+    for start in range(0, len(ids), batch_size):
+        batch = ids[start:start + batch_size]
+        for model, key in ((Ambulance, "pk"), (AmbulanceLocation, "ambulance_id")):
+            columns = {
+                field: Case(
+                    *[When(**{key: pk}, then=Value(positions[pk][axis])) for pk in batch],
+                    output_field=FloatField(),
+                )
+                for axis, field in enumerate(("latitude", "longitude"))
+            }
+            count = model.objects.filter(**{f"{key}__in": batch}).update(**columns, last_updated=now)
+            if model is Ambulance:
+                updated += count
+    transaction.on_commit(lambda: ambulance_catalog.invalidate(ids))
+    return updated
+
+
+def _segment_start(moment: datetime) -> datetime:
+    return moment.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+def _segment_origin(starts_at: datetime) -> Tuple[int, int, int]:
+    # One millisecond before the hour, so a fix exactly on the hour is kept
+    return int(starts_at.timestamp() * 1000) - 1, 0, 0
+
+
+def _from_millis(millis: int) -> datetime:
+    return datetime.fromtimestamp(millis / 1000, tz=dt_timezone.utc)
+
+
+def append_track_points(tracks: Dict[object, List[Tuple[datetime, float, float]]]) -> int:
+    """
+    Append GPS fixes, given per ambulance as `(recorded_at, lat, lon)`, to
+    the hourly track segments. Points older than the last one stored for a
+    segment are dropped. Returns the number of points stored.
+    """
+    # Step 1: Group the points by segment
+    grouped = defaultdict(list)
+    for ambulance_id, fixes in tracks.items():
+        for recorded_at, lat, lon in fixes:
+            point = to_point(recorded_at.timestamp(), lat, lon)
+            grouped[(ambulance_id, _segment_start(recorded_at))].append(point)
+    if not grouped:
+        return 0
+
+    stored = 0
+    with transaction.atomic():
+        # Step 2: Lock the segments being extended, skipping deleted ambulances
+        ambulance_ids = set(
+            Ambulance.objects.filter(pk__in={pk for pk, _ in grouped}).values_list("pk", flat=True)
+        )
+        existing = {
+            (segment.ambulance_id, segment.starts_at): segment
+            for segment in AmbulanceTrackSegment.objects.select_for_update().filter(
+                ambulance_id__in=ambulance_ids,
+                starts_at__gte=min(starts_at for _, starts_at in grouped),
+                starts_at__lte=max(starts_at for _, starts_at in grouped),
+            )
+        }
+
+        # Step 3: Encode the new points after the last stored one
+        changed, created = [], []
+        for (ambulance_id, starts_at), points in grouped.items():
+            if ambulance_id not in ambulance_ids:
+                continue
+            points.sort()
+            segment = existing.get((ambulance_id, starts_at))
+            if segment is None:
+                origin = _segment_origin(starts_at)
+                segment = AmbulanceTrackSegment(
+                    ambulance_id=ambulance_id,
+                    starts_at=starts_at,
+                    last_timestamp=origin[0],
+                    last_latitude=origin[1],
+                    last_longitude=origin[2],
+                )
+            previous = (segment.last_timestamp, segment.last_latitude, segment.last_longitude)
+            data, last, written = encode_points(points, previous)
+            if not written:
+                continue
+            segment.points = bytes(segment.points) + data
+            segment.point_count += written
+            segment.last_timestamp, segment.last_latitude, segment.last_longitude = last
+            segment.ends_at = _from_millis(segment.last_timestamp)
+            (created if segment._state.adding else changed).append(segment)
+            stored += written
+
+        # Step 4: Write them back in bulk
+        AmbulanceTrackSegment.objects.bulk_create(created)
+        for segment in changed:
+            segment.last_updated = timezone.now()
+        AmbulanceTrackSegment.objects.bulk_update(
+            changed,
+            ["points", "point_count", "ends_at", "last_timestamp", "last_latitude", "last_longitude", "last_updated"],
+        )
+    return stored
+
+
+def track_points(ambulance_id, start: datetime, end: datetime) -> List[Tuple[datetime, float, float]]:
+    """
+    Where an ambulance was between `start` and `end`, as time-ordered
+    `(recorded_at, lat, lon)` points. Only the segments overlapping the
+    range are loaded and decoded.
+    """
+    segments = AmbulanceTrackSegment.objects.filter(
+        ambulance_id=ambulance_id, starts_at__lte=end, ends_at__gte=start
+    ).order_by("starts_at").values_list("starts_at", "points")
+
+    first, last = start.timestamp() * 1000, end.timestamp() * 1000
+    result = []
+    for starts_at, data in segments:
+        for point in decode_points(bytes(data), _segment_origin(starts_at)):
+            if first <= point[0] <= last:
+                _, lat, lon = from_point(point)
+                result.append((_from_millis(point[0]), lat, lon))
+    return result
+
+
+def release_expired_ambulances() -> int:
+    """
+    Persist the release of every ambulance whose `busy_until` has passed
+    with a single bulk UPDATE. Returns the number of ambulances released.
+
+    Dispatch already treats these units as available; the release is
+    persisted so that `ambulance_released` fires and waiting requests are
+    dispatched to them.
+    """
+    now = timezone.now()
+    expired = list(Ambulance.objects.expired(now).values_list("pk", flat=True))
+    if not expired:
+        return 0
+    released = Ambulance.objects.expired(now).filter(pk__in=expired).update(
+        status=StatusEnum.AVAILABLE, busy_until=None, last_updated=now
+    )
+
+    def update():
+        for ambulance_id in expired:
+            ambulance_index.set_status(ambulance_id, StatusEnum.AVAILABLE)
+        ambulance_catalog.invalidate(expired)
+
+    transaction.on_commit(update)
+    ambulance_released.send(sender=Ambulance, ambulance_ids=expired)
+    return released
+
+
+def release_ambulance(ambulance_id, claimed_by: Optional[datetime] = None) -> bool:
+    """
+    Free a busy ambulance before its `busy_until`, e.g. once its emergency
+    is resolved. Returns whether the unit was busy.
+
+    With `claimed_by`, the time the caller's assignment was made, the unit
+    is only freed if it has not been claimed again since: once its
+    `busy_until` lapses it can be re-claimed for another request, and a
+    late release must not free it from under that one. The check is part
+    of the UPDATE, so it cannot race with a new claim.
+    """
+    now = timezone.now()
+    busy = Ambulance.objects.filter(pk=ambulance_id, status=StatusEnum.BUSY)
+    if claimed_by is not None:
+        busy = busy.filter(last_assigned__lte=claimed_by)
+    released = busy.update(status=StatusEnum.AVAILABLE, busy_until=None, last_updated=now)
+    if released:
+
+        def update():
+            ambulance_index.set_status(ambulance_id, StatusEnum.AVAILABLE)
+            ambulance_catalog.invalidate([ambulance_id])
+
+        transaction.on_commit(update)
+        ambulance_released.send(sender=Ambulance, ambulance_ids=[ambulance_id])
+    return bool(released)
+
+
+def claim_ambulance(ambulance_id, busy_for: timedelta) -> bool:
+    """
+    Atomically mark an ambulance busy if, and only if, it can still take a
+    call. The conditional UPDATE makes concurrent claims on the same unit
+    race-free without locking anything else: exactly one caller sees a row
+    updated. Returns whether the claim succeeded.
+    """
+    now = timezone.now()
+    busy_until = now + busy_for
+    claimed = Ambulance.objects.dispatchable(now).filter(pk=ambulance_id).update(
+        status=StatusEnum.BUSY,
+        busy_until=busy_until,
+        last_assigned=now,
+        last_updated=now,
+    )
+
+    # `update()` bypasses model signals, so tell the index directly, once
+    # the claim is committed: a rolled-back claim must not hide the unit.
+    # Until then a concurrent claim on it simply fails. On a lost race the
+    # unit is dropped at once, until the next index rebuild.
+    if claimed:
+
+        def update():
+            ambulance_index.set_status(ambulance_id, StatusEnum.BUSY, busy_until)
+            ambulance_catalog.invalidate([ambulance_id])
+
+        transaction.on_commit(update)
+    else:
+        ambulance_index.set_status(ambulance_id, StatusEnum.BUSY)
+    return bool(claimed)
+
+
+def claim_ambulances(ambulance_ids: Iterable, busy_for: timedelta) -> Set:
+    """
+    Batch form of `claim_ambulance`: one conditional UPDATE over all the
+    ids, then one SELECT to learn which rows this call actually won. Run it
+    inside a transaction so the read sees exactly the rows just written.
+    """
+    ambulance_ids = list(ambulance_ids)
+    now = timezone.now()
+    busy_until = now + busy_for
+    Ambulance.objects.dispatchable(now).filter(pk__in=ambulance_ids).update(
+        status=StatusEnum.BUSY,
+        busy_until=busy_until,
+        last_assigned=now,
+        last_updated=now,
+    )
+    claimed = set(
+        Ambulance.objects.filter(
+            pk__in=ambulance_ids, status=StatusEnum.BUSY, last_assigned=now
+        ).values_list("pk", flat=True)
+    )
+
+    for ambulance_id in ambulance_ids:
+        if ambulance_id not in claimed:
+            ambulance_index.set_status(ambulance_id, StatusEnum.BUSY)
+
+    def update():
+        for ambulance_id in claimed:
+            ambulance_index.set_status(ambulance_id, StatusEnum.BUSY, busy_until)
+        ambulance_catalog.invalidate(claimed)
+
+    transaction.on_commit(update)
+    return claimed
@@ -0,0 +1,144 @@
+from datetime import datetime, timedelta
+from typing import Callable, Iterable, List, Optional, Tuple
+
+from asgiref.sync import sync_to_async
+from django.utils import timezone
+
+from apps.ambulance.index import ambulance_index
+from apps.ambulance.models import Ambulance
+from apps.ambulance.utils import AmbulanceTypeEnum, StatusEnum
+from apps.user.utils import UserTypesEnum
+from utils.events import event_bus, event_stream, stream_error, stream_user
+
+FLEET_TOPIC = "fleet"
+
+# How far before its cursor the catch-up re-reads, so a write committed
+# shortly after its `last_updated` was stamped is still seen
+CATCH_UP_OVERLAP = timedelta(seconds=2)
+
+
+def ambulance_topic(ambulance_id) -> str:
+    return f"ambulance:{ambulance_id}"
+
+
+def unit_state(ambulance_id) -> Optional[dict]:
+    unit = ambulance_index.unit(ambulance_id)
+    if unit is None:
+        return None
+    ambulance_type, available, position = unit
+    latitude, longitude = position or (None, None)
+    return {
+        "id": str(ambulance_id),
+        "ambulanceType": ambulance_type,
+        "available": available,
+        "latitude": latitude,
+        "longitude": longitude,
+    }
+
+
+def publish_fleet_changes(ambulance_ids: Iterable) -> None:
+    """
+    Push the current state of some ambulances to fleet subscribers and to
+    the subscribers of each unit's own topic. Only subscribers in this
+    process are reached; fleet streams pick up writes made elsewhere with
+    `fleet_changes_since`.
+    """
+    fleet = event_bus.has_subscribers(FLEET_TOPIC)
+    for ambulance_id in ambulance_ids:
+        topics = [FLEET_TOPIC] if fleet else []
+        if event_bus.has_subscribers(ambulance_topic(ambulance_id)):
+            topics.append(ambulance_topic(ambulance_id))
+        if not topics:
+            continue
+        state = unit_state(ambulance_id) or {"id": str(ambulance_id), "removed": True}
+        for topic in topics:
+            event_bus.publish(topic, "ambulance", state, key=ambulance_id)
+
+
+def fleet_changes_since(cursor: datetime) -> Tuple[List[dict], datetime]:
+    """
+    States of the ambulances written since `cursor`, read from the database,
+    and the cursor for the next call. This is how a fleet stream sees
+    writes made in other processes (dispatch workers, the telemetry
+    gateway), whose events never reach its bus. Units written close to the
+    cursor may be sent twice, which is harmless as each event is a full
+    state. Deletions are not seen.
+    """
+    now = timezone.now()
+    rows = (
+        Ambulance.objects.filter(last_updated__gt=cursor - CATCH_UP_OVERLAP)
+        .order_by("last_updated")
+        .values_list("id", "ambulance_type", "status", "busy_until", "latitude", "longitude", "last_updated")
+    )
+    states = []
+    for pk, ambulance_type, status, busy_until, latitude, longitude, last_updated in rows:
+        expired = status == StatusEnum.BUSY and busy_until is not None and busy_until <= now
+        states.append({
+            "id": str(pk),
+            "ambulanceType": ambulance_type,
+            "available": status == StatusEnum.AVAILABLE or expired,
+            "latitude": latitude,
+            "longitude": longitude,
+        })
+        cursor = max(cursor, last_updated)
+    return states, cursor
+
+
+def fleet_filter(params) -> Callable[[dict], bool]:
+    """
+    Build a subscriber filter from `bbox=minLat,minLon,maxLat,maxLon` and
+    `types=BLS,ALS` query parameters. Raises ValueError on bad input.
+    """
+    bbox = None
+    if params.get("bbox"):
+        bbox = [float(v) for v in params["bbox"].split(",")]
+        if len(bbox) != 4:
+            raise ValueError("bbox must be minLat,minLon,maxLat,maxLon.")
+    types = None
+    if params.get("types"):
+        types = set(params["types"].split(","))
+        if not types <= set(AmbulanceTypeEnum.options_list()):
+            raise ValueError("Unknown ambulance type.")
+
+    def accept(state: dict) -> bool:
+        # Removal events carry only the id and pass every filter
+        if types is not None and state.get("ambulanceType") not in types | {None}:
+            return False
+        if bbox is not None and state.get("latitude") is not None:
+            min_lat, min_lon, max_lat, max_lon = bbox
+            return min_lat <= state["latitude"] <= max_lat and min_lon <= state["longitude"] <= max_lon
+        return True
+
+    return accept
+
+
+async def fleet_stream(request):
+    """
+    Server-sent events for dispatch dashboards (admin only): a `snapshot`
+    of the fleet, then an `ambulance` event whenever a unit moves or
+    changes availability, optionally filtered by area and type. Changes
+    made in other processes are caught at each heartbeat.
+    """
+    user = await stream_user(request)
+    if user is None:
+        return stream_error(401, "Authentication credentials were not provided.")
+    if user.role != UserTypesEnum.ADMIN:
+        return stream_error(403, "You do not have permission to perform this action.")
+    try:
+        accept = fleet_filter(request.GET)
+    except ValueError as exc:
+        return stream_error(400, str(exc))
+
+    # The snapshot comes from the index, which may be up to its TTL behind
+    # the database, so the first catch-up starts that far back
+    cursor = timezone.now() - timedelta(seconds=ambulance_index.ttl)
+    subscription = event_bus.subscribe([FLEET_TOPIC], accept=accept)
+    units = await sync_to_async(ambulance_index.units)()
+    snapshot = [state for state in map(unit_state, (pk for pk, *_ in units)) if state and accept(state)]
+
+    async def on_idle():
+        nonlocal cursor
+        states, cursor = await sync_to_async(fleet_changes_since)(cursor)
+        return [("ambulance", state) for state in states if accept(state)]
+
+    return event_stream(subscription, initial=[("snapshot", {"ambulances": snapshot})], on_idle=on_idle)
@@ -1,7 +1,12 @@
+from django.urls import path
 from rest_framework.routers import DefaultRouter
+from apps.ambulance.v1.streams import fleet_stream
 from apps.ambulance.v1.views import AmbulanceViewSet
 
 router = DefaultRouter()
 router.register(r"ambulance", AmbulanceViewSet, basename="hospital")
 
-urlpatterns = router.urls
+urlpatterns = [
+    # Before the router, whose detail route would otherwise match "stream"
+    path("ambulance/stream/", fleet_stream, name="ambulance-stream"),
+] + router.urls
@@ -1,46 +1,74 @@
+import uuid
+
 from rest_framework import status, viewsets
+from rest_framework.decorators import action
 from rest_framework.permissions import AllowAny
 from rest_framework.exceptions import NotFound
 from django.db import transaction
+from django.utils import timezone
 
+from apps.ambulance.index import ambulance_index
+from apps.ambulance.ingest import location_buffer
 from apps.ambulance.models import Ambulance
-from apps.ambulance.v1.serializers import AmbulanceSerializer
-from utils.permissions import IsAdmin
+from apps.ambulance.signals import ambulance_released
+from apps.ambulance.utils import StatusEnum
+from apps.ambulance.v1.serializers import AmbulanceSerializer, LocationFixSerializer, TrackQuerySerializer
+from apps.ambulance.v1.services import track_points
+from apps.hospital.models import Hospital
+from utils.cache import ambulance_catalog
+from utils.conditional import ConditionalGetMixin
+from utils.permissions import IsAdmin, IsLocationReporter
 from utils.responses import api_response
 
 
-class AmbulanceViewSet(viewsets.ModelViewSet):
-    queryset = Ambulance.objects.select_related("hospital", "created_by").all()
+class AmbulanceViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
+    # Everything AmbulanceSerializer nests, joined into the one query
+    queryset = Ambulance.objects.select_related(
+        "location", "created_by", "hospital__location", "hospital__created_by"
+    )
     serializer_class = AmbulanceSerializer
+    etag_dependencies = (Hospital,)
 
     def get_permissions(self):
-        if self.request.method == "GET":
+        if self.request.method == "GET" and self.action not in ("track", "cache_stats"):
             return [AllowAny()]
+        if self.action == "ingest_locations":
+            return [IsLocationReporter()]
         return [IsAdmin()]
 
     def perform_create(self, serializer):
         serializer.save(created_by=self.request.user)
 
+    def serialize(self, ambulances):
+        return self.get_serializer(ambulances, many=True).data
+
+    def load(self, ids):
+        return {item["id"]: item for item in self.serialize(self.get_queryset().filter(pk__in=ids))}
+
     def list(self, request, *args, **kwargs):
         queryset = self.filter_queryset(self.get_queryset())
-        serializer = self.get_serializer(queryset, many=True)
-        message = "No Ambulance found" if len(queryset) < 1 else "Ambulances retrieved successfully."
-        return api_response(
-            status=status.HTTP_200_OK,
-            message=message,
-            data=serializer.data or None,
-        )
+        not_modified = self.not_modified(request, queryset)
+        if not_modified is not None:
+            return not_modified
+        page = ambulance_catalog.page(request, queryset, self.paginator, self, self.serialize)
+        message = "No Ambulance found" if not page else "Ambulances retrieved successfully."
+        return self.paginator.get_paginated_response(page or None, message=message)
 
     def retrieve(self, request, *args, **kwargs):
         try:
-            instance = self.get_object()
-        except Ambulance.DoesNotExist:
+            pk = uuid.UUID(str(kwargs["pk"]))
+        except ValueError:
+            raise NotFound("Ambulance not found.")
+        not_modified = self.not_modified(request, self.get_queryset().filter(pk=pk))
+        if not_modified is not None:
+            return not_modified
+        ambulance = ambulance_catalog.get_many([pk], self.load).get(str(pk))
+        if ambulance is None:
             raise NotFound("Ambulance not found.")
-        serializer = self.get_serializer(instance)
         return api_response(
             status=status.HTTP_200_OK,
             message="Ambulance retrieved successfully.",
-            data=serializer.data,
+            data=ambulance,
         )
 
     def create(self, request, *args, **kwargs):
@@ -57,10 +85,14 @@ class AmbulanceViewSet(viewsets.ModelViewSet):
     def update(self, request, *args, **kwargs):
         partial = kwargs.pop("partial", False)
         instance = self.get_object()
+        was_available = instance.status == StatusEnum.AVAILABLE
         serializer = self.get_serializer(instance, data=request.data, partial=partial)
         serializer.is_valid(raise_exception=True)
         with transaction.atomic():
             self.perform_update(serializer)
+            # Let waiting emergencies take a unit an admin has just freed
+            if not was_available and serializer.instance.status == StatusEnum.AVAILABLE:
+                ambulance_released.send(sender=Ambulance, ambulance_ids=[instance.pk])
         return api_response(
             status=status.HTTP_200_OK,
             message="Ambulance updated successfully.",
@@ -76,3 +108,60 @@ class AmbulanceViewSet(viewsets.ModelViewSet):
             message="Ambulance deleted successfully.",
             data=None,
         )
+
+    @action(detail=False, methods=["post"], url_path="locations")
+    def ingest_locations(self, request):
+        """
+        Accept one GPS fix or a list of them. Fixes are coalesced in memory
+        and written in bulk, so this never touches the database per ping.
+        """
+        many = isinstance(request.data, list)
+        serializer = LocationFixSerializer(data=request.data, many=many)
+        serializer.is_valid(raise_exception=True)
+        fixes = serializer.validated_data if many else [serializer.validated_data]
+
+        now = timezone.now()
+        accepted, stale, unknown = 0, 0, []
+        for fix in fixes:
+            ambulance_id = fix["ambulance_id"]
+            if not ambulance_index.known(ambulance_id):
+                unknown.append(str(ambulance_id))
+            elif location_buffer.add(
+                ambulance_id, fix["latitude"], fix["longitude"], fix.get("recorded_at", now)
+            ):
+                accepted += 1
+            else:
+                stale += 1
+        return api_response(
+            status=status.HTTP_202_ACCEPTED,
+            message="Locations received.",
+            data={"accepted": accepted, "stale": stale, "unknown": unknown},
+        )
+
+    @action(detail=True, methods=["get"], url_path="track")
+    def track(self, request, pk=None):
+        """Where the ambulance was between `start` and `end` (ISO 8601)."""
+        ambulance = self.get_object()
+        query = TrackQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        points = track_points(ambulance.pk, query.validated_data["start"], query.validated_data["end"])
+        return api_response(
+            status=status.HTTP_200_OK,
+            message="Track retrieved successfully." if points else "No track points in this range.",
+            data={
+                "ambulanceId": str(ambulance.pk),
+                "points": [
+                    {"recordedAt": recorded_at, "latitude": lat, "longitude": lon}
+                    for recorded_at, lat, lon in points
+                ],
+            },
+        )
+
+    @action(detail=False, methods=["get"], url_path="cache-stats")
+    def cache_stats(self, request):
+        """Hit and miss counters of this process's ambulance payload cache."""
+        return api_response(
+            status=status.HTTP_200_OK,
+            message="Ambulance cache statistics retrieved successfully.",
+            data=ambulance_catalog.stats(),
+        )
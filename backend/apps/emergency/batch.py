@@ -0,0 +1,72 @@
+import threading
+import time
+from concurrent.futures import Future
+from typing import List, Optional, Tuple
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from apps.emergency.models import EmergencyRequest
+from apps.emergency.scheduler import DispatchQueue
+from apps.emergency.v1.services import NoAmbulanceAvailable, assign_ambulances_in_batch
+
+
+class BatchDispatcher:
+    """
+    Collects emergencies that arrive within `window` seconds of the first
+    one and assigns them together with `assign_ambulances_in_batch`. Pending
+    requests wait in a `DispatchQueue`, so each batch is handed over most
+    urgent first.
+
+    `submit` returns a future that resolves to the assigned ambulance id, or
+    fails with `NoAmbulanceAvailable`, once the batch has been committed.
+    """
+
+    def __init__(self, window: float, queue: Optional[DispatchQueue] = None):
+        self.window = window
+        self.queue = queue if queue is not None else DispatchQueue()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def submit(self, emergency: EmergencyRequest) -> Future:
+        future = Future()
+        with self._lock:
+            self.queue.push((emergency, future), emergency.severity)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="batch-dispatcher", daemon=True
+                )
+                self._thread.start()
+        self._wakeup.set()
+        return future
+
+    def _run(self) -> None:
+        while True:
+            self._wakeup.wait()
+            time.sleep(self.window)
+            with self._lock:
+                batch = self.queue.pop_all()
+                self._wakeup.clear()
+            if batch:
+                self._dispatch(batch)
+
+    def _dispatch(self, batch: List[Tuple[EmergencyRequest, Future]]) -> None:
+        try:
+            results = assign_ambulances_in_batch([emergency for emergency, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        finally:
+            close_old_connections()
+
+        for emergency, future in batch:
+            ambulance_id = results.get(emergency.pk)
+            if ambulance_id is None:
+                future.set_exception(NoAmbulanceAvailable())
+            else:
+                future.set_result(ambulance_id)
+
+
+batch_dispatcher: BatchDispatcher = BatchDispatcher(window=settings.DISPATCH_BATCH_WINDOW_MS / 1000)
@@ -0,0 +1,110 @@
+import re
+import xml.etree.ElementTree as ET
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from utils.geo import haversine_pairs
+from utils.routing import RoadGraph
+
+# Default speeds in km/h by OSM highway class, used when a way has no maxspeed
+HIGHWAY_SPEEDS = {
+    "motorway": 100,
+    "motorway_link": 60,
+    "trunk": 80,
+    "trunk_link": 50,
+    "primary": 60,
+    "primary_link": 40,
+    "secondary": 50,
+    "secondary_link": 35,
+    "tertiary": 40,
+    "tertiary_link": 30,
+    "unclassified": 30,
+    "residential": 25,
+    "living_street": 10,
+    "service": 15,
+}
+
+ONEWAY_HIGHWAYS = {"motorway", "motorway_link"}
+
+
+def parse_maxspeed(value):
+    match = re.match(r"\s*(\d+(?:\.\d+)?)\s*(mph)?", value or "")
+    if not match:
+        return None
+    speed = float(match.group(1))
+    return speed * 1.609 if match.group(2) else speed
+
+
+class Command(BaseCommand):
+    help = "Convert an OpenStreetMap XML extract into a compact road graph (.npz) for ETA ranking."
+
+    def add_arguments(self, parser):
+        parser.add_argument("osm_file", help="Path to an .osm XML extract.")
+        parser.add_argument("output", help="Where to write the .npz road graph.")
+
+    def handle(self, *args, **options):
+        coordinates = {}
+        ways = []
+        try:
+            for _, element in ET.iterparse(options["osm_file"], events=("end",)):
+                if element.tag == "node":
+                    coordinates[element.get("id")] = (
+                        float(element.get("lat")),
+                        float(element.get("lon")),
+                    )
+                elif element.tag == "way":
+                    tags = {tag.get("k"): tag.get("v") for tag in element.iter("tag")}
+                    highway = tags.get("highway")
+                    if highway in HIGHWAY_SPEEDS:
+                        refs = [nd.get("ref") for nd in element.iter("nd")]
+                        speed = parse_maxspeed(tags.get("maxspeed")) or HIGHWAY_SPEEDS[highway]
+                        oneway = tags.get("oneway")
+                        if oneway is None and (
+                            highway in ONEWAY_HIGHWAYS or tags.get("junction") == "roundabout"
+                        ):
+                            oneway = "yes"
+                        ways.append((refs, speed, oneway))
+                if element.tag in ("node", "way", "relation"):
+                    element.clear()
+        except (OSError, ET.ParseError) as e:
+            raise CommandError(f"Could not read {options['osm_file']}: {e}")
+
+        node_ids = {}
+        sources, targets, speeds = [], [], []
+        for refs, speed, oneway in ways:
+            refs = [ref for ref in refs if ref in coordinates]
+            for a, b in zip(refs, refs[1:]):
+                a = node_ids.setdefault(a, len(node_ids))
+                b = node_ids.setdefault(b, len(node_ids))
+                if oneway != "-1":
+                    sources.append(a), targets.append(b), speeds.append(speed)
+                if oneway not in ("yes", "true", "1"):
+                    sources.append(b), targets.append(a), speeds.append(speed)
+
+        if not sources:
+            raise CommandError("No routable ways found in the extract.")
+
+        lats = np.empty(len(node_ids))
+        lons = np.empty(len(node_ids))
+        for ref, node in node_ids.items():
+            lats[node], lons[node] = coordinates[ref]
+
+        sources = np.asarray(sources, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int32)
+        speeds_mps = np.asarray(speeds, dtype=np.float64) / 3.6
+        metres = haversine_pairs(lats[sources], lons[sources], lats[targets], lons[targets]) * 1000
+        seconds = metres / speeds_mps
+
+        order = np.argsort(sources, kind="stable")
+        indptr = np.concatenate(([0], np.cumsum(np.bincount(sources, minlength=len(node_ids)))))
+
+        graph = RoadGraph(
+            lats, lons, indptr, targets[order], seconds[order], max_speed_mps=speeds_mps.max()
+        )
+        graph.save(options["output"])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Wrote {len(node_ids)} nodes and {len(sources)} edges to {options['output']}."
+            )
+        )
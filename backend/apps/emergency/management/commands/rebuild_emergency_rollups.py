@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from apps.emergency.v1.services import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = "Recompute the hourly response-time rollups from the emergency requests."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=10_000, help="Rows read and written per batch.")
+
+    def handle(self, *args, **options):
+        rollups = rebuild_rollups(options["batch_size"])
+        self.stdout.write(f"Rebuilt {rollups} rollups.")
@@ -0,0 +1,94 @@
+import multiprocessing
+import signal
+import threading
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from apps.emergency.workers import DispatchWorker, ReleaseTimer, shard_plan
+
+
+def _run_worker(batch_size: int, poll_interval: float, shard=None) -> None:
+    worker = DispatchWorker(batch_size=batch_size, poll_interval=poll_interval, shard=shard)
+    signal.signal(signal.SIGTERM, lambda *_: worker.stop())
+    worker.run()
+
+
+class Command(BaseCommand):
+    help = (
+        "Run dispatch workers that assign ambulances to queued emergency requests, "
+        "plus the timer that frees units when their busy_until passes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help=(
+                "Worker processes to start, each owning a geographic shard of the "
+                "dispatch regions (0 runs only the release timer)."
+            ),
+        )
+        parser.add_argument("--batch-size", type=int, default=32, help="Jobs leased per batch.")
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=0.2,
+            help="Seconds to wait before polling again when the queue is empty.",
+        )
+        parser.add_argument(
+            "--no-release-timer",
+            action="store_true",
+            help="Do not run the release timer in this process.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size, poll_interval = options["batch_size"], options["poll_interval"]
+        workers = options["workers"]
+
+        processes = []
+        if workers > 1:
+            # One plan for all the workers, so every region has exactly one owner
+            plan = shard_plan(workers)
+            # Children must open their own database connections
+            connections.close_all()
+            context = multiprocessing.get_context("fork")
+            # Each worker owns a geographic shard of the dispatch regions
+            processes = [
+                context.Process(
+                    target=_run_worker, args=(batch_size, poll_interval, (i, plan)), daemon=True
+                )
+                for i in range(workers)
+            ]
+            for process in processes:
+                process.start()
+            self.stdout.write(f"Started {len(processes)} dispatch workers.")
+
+        # Start threads only after forking
+        timer = timer_thread = None
+        if not options["no_release_timer"]:
+            timer = ReleaseTimer()
+            timer_thread = threading.Thread(target=timer.run, name="release-timer", daemon=True)
+            timer_thread.start()
+            self.stdout.write("Started release timer.")
+
+        try:
+            if workers == 1:
+                self.stdout.write("Starting dispatch worker.")
+                _run_worker(batch_size, poll_interval)
+            elif processes:
+                for process in processes:
+                    process.join()
+            elif timer is not None:
+                signal.signal(signal.SIGTERM, lambda *_: timer.stop())
+                while timer_thread.is_alive():
+                    timer_thread.join(1)
+        except KeyboardInterrupt:
+            for process in processes:
+                process.terminate()
+            for process in processes:
+                process.join()
+        finally:
+            if timer is not None:
+                timer.stop()
@@ -0,0 +1,183 @@
+import argparse
+import time
+from contextlib import contextmanager
+from datetime import timedelta, timezone as dt_timezone
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from apps.ambulance.index import ambulance_index
+from apps.emergency.models import EmergencyRequest, EmergencyRequestLocation
+from apps.emergency.utils import DispatchStatus, SeverityLevel
+from apps.emergency.v1.services import rebuild_rollups
+from apps.hospital.index import hospital_index
+from apps.user.models import User
+from apps.user.utils import UserTypesEnum
+from utils.cache import ambulance_catalog, hospital_catalog
+from utils.synthetic import SyntheticCity, create_city
+
+# Share of each severity among generated emergencies
+SEVERITY_MIX = {
+    SeverityLevel.LOW: 0.35,
+    SeverityLevel.MEDIUM: 0.35,
+    SeverityLevel.HIGH: 0.2,
+    SeverityLevel.CRITICAL: 0.1,
+}
+
+
+def moment(value):
+    """An ISO 8601 time for `--until`; naive times are taken as UTC."""
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise argparse.ArgumentTypeError(f"expected an ISO 8601 time such as 2025-01-01T00:00:00Z, got {value!r}")
+    return parsed if timezone.is_aware(parsed) else parsed.replace(tzinfo=dt_timezone.utc)
+
+
+@contextmanager
+def explicit_timestamps(model):
+    """Let bulk_create keep the `date_created`/`last_updated` values we set."""
+    fields = [model._meta.get_field("date_created"), model._meta.get_field("last_updated")]
+    saved = [(f.auto_now, f.auto_now_add) for f in fields]
+    for f in fields:
+        f.auto_now = f.auto_now_add = False
+    try:
+        yield
+    finally:
+        for f, (auto_now, auto_now_add) in zip(fields, saved):
+            f.auto_now, f.auto_now_add = auto_now, auto_now_add
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the database with a deterministic, production-sized synthetic data "
+        "set (users, hospitals, ambulances and emergency requests with locations)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=100_000)
+        parser.add_argument("--admins", type=int, default=10)
+        parser.add_argument("--hospitals", type=int, default=10_000)
+        parser.add_argument("--ambulances", type=int, default=20_000)
+        parser.add_argument("--emergencies", type=int, default=1_000_000)
+        parser.add_argument("--days", type=int, default=365, help="Spread emergencies over this many past days.")
+        parser.add_argument(
+            "--until",
+            type=moment,
+            help="Spread emergencies before this ISO 8601 time instead of now, so every run writes the same rows.",
+        )
+        parser.add_argument("--password", default="password", help="Password for every generated user.")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--batch-size", type=int, default=10_000, help="Rows per transaction.")
+
+    def handle(self, *args, **options):
+        city = SyntheticCity(seed=options["seed"])
+        batch_size = options["batch_size"]
+        users = self.timed("users", lambda: self.create_users(city, options, batch_size))
+        _, ambulances = self.timed(
+            "hospitals and ambulances",
+            lambda: create_city(city, options["hospitals"], options["ambulances"], batch_size),
+        )
+        self.timed(
+            "emergencies",
+            lambda: self.create_emergencies(city, options, users, ambulances, batch_size),
+        )
+        self.timed("response rollups", lambda: rebuild_rollups(batch_size))
+        ambulance_index.invalidate()
+        hospital_index.invalidate()
+        ambulance_catalog.invalidate_all()
+        hospital_catalog.invalidate_all()
+
+    def timed(self, label, create):
+        started = time.perf_counter()
+        result = create()
+        self.stdout.write(f"Created {label} in {time.perf_counter() - started:.1f}s.")
+        return result
+
+    def create_users(self, city, options, batch_size):
+        # Hash once; every user shares the same password
+        password = make_password(options["password"])
+        seed = options["seed"]
+        total = options["users"] + options["admins"]
+        ids = []
+        for start in range(0, total, batch_size):
+            ids_chunk = city.uuids(min(batch_size, total - start))
+            rows = [
+                User(
+                    id=pk,
+                    username=f"seed{seed}-user{i}",
+                    email=f"seed{seed}-user{i}@example.com",
+                    first_name="User",
+                    last_name=str(i),
+                    password=password,
+                    role=UserTypesEnum.ADMIN if i < options["admins"] else UserTypesEnum.PATIENT,
+                    is_admin=i < options["admins"],
+                )
+                for pk, i in zip(ids_chunk, range(start, total))
+            ]
+            with transaction.atomic():
+                User.objects.bulk_create(rows, batch_size=batch_size)
+            ids.extend(u.pk for u in rows if u.role == UserTypesEnum.PATIENT)
+        return ids
+
+    def create_emergencies(self, city, options, users, ambulances, batch_size):
+        now = options["until"] or timezone.now()
+        span = options["days"] * 86400
+        severities = list(SEVERITY_MIX)
+        ambulance_ids = [a.pk for a in ambulances]
+        total = options["emergencies"]
+
+        with explicit_timestamps(EmergencyRequest), explicit_timestamps(EmergencyRequestLocation):
+            for start in range(0, total, batch_size):
+                n = min(batch_size, total - start)
+                lats, lons = city.points(n)
+                ages = city.rng.uniform(0, span, n)
+                severity = city.rng.choice(len(severities), n, p=list(SEVERITY_MIX.values()))
+                callers = city.rng.integers(0, len(users), n) if users else [None] * n
+                units = city.rng.integers(0, len(ambulance_ids), n) if ambulance_ids else [None] * n
+                # Every historical call was served; most have been closed
+                resolved = city.rng.random(n) < 0.95
+                emergency_ids, location_ids = city.uuids(n), city.uuids(n)
+                # Seconds from the request to assignment, arrival and resolution
+                dispatch_times = city.rng.gamma(2.0, 15.0, n)
+                response_times = dispatch_times + city.rng.gamma(2.0, 240.0, n)
+                resolution_times = response_times + city.rng.gamma(2.0, 900.0, n)
+
+                requests, locations = [], []
+                for j in range(n):
+                    created = now - timedelta(seconds=float(ages[j]))
+                    served = units[j] is not None
+                    # Calls too recent to have reached a stage are left before it
+                    arrived = served and response_times[j] <= ages[j]
+                    closed = arrived and bool(resolved[j]) and resolution_times[j] <= ages[j]
+                    emergency = EmergencyRequest(
+                        id=emergency_ids[j],
+                        user_id=users[callers[j]] if users else None,
+                        ambulance_id=ambulance_ids[units[j]] if served else None,
+                        severity=severities[severity[j]],
+                        dispatch_status=DispatchStatus.ASSIGNED if served else DispatchStatus.WAITING,
+                        is_resolved=closed,
+                        response_time_seconds=int(response_times[j]) if arrived else None,
+                        assigned_at=created + timedelta(seconds=float(dispatch_times[j])) if served else None,
+                        arrived_at=created + timedelta(seconds=float(response_times[j])) if arrived else None,
+                        resolved_at=created + timedelta(seconds=float(resolution_times[j])) if closed else None,
+                        date_created=created,
+                        last_updated=created,
+                    )
+                    requests.append(emergency)
+                    locations.append(
+                        EmergencyRequestLocation(
+                            id=location_ids[j],
+                            emergency=emergency,
+                            latitude=float(lats[j]),
+                            longitude=float(lons[j]),
+                            date_created=created,
+                            last_updated=created,
+                        )
+                    )
+                with transaction.atomic():
+                    EmergencyRequest.objects.bulk_create(requests, batch_size=batch_size)
+                    EmergencyRequestLocation.objects.bulk_create(locations, batch_size=batch_size)
+                self.stdout.write(f"  {start + n}/{total} emergencies")
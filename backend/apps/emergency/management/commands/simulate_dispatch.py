@@ -0,0 +1,231 @@
+import json
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import numpy as np
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection, connections
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from apps.ambulance.index import ambulance_index
+from apps.emergency.models import DispatchJob, EmergencyRequest
+from apps.emergency.utils import DispatchJobStatus, SeverityLevel
+from apps.emergency.workers import DispatchWorker, shard_plan
+from apps.hospital.index import hospital_index
+from apps.user.models import User
+from apps.user.utils import UserTypesEnum
+from utils.cache import ambulance_catalog, hospital_catalog
+from utils.geo import haversine_pairs
+from utils.synthetic import SyntheticCity, create_city
+
+# Share of each severity among simulated calls
+SEVERITY_MIX = {
+    SeverityLevel.LOW: 0.35,
+    SeverityLevel.MEDIUM: 0.35,
+    SeverityLevel.HIGH: 0.2,
+    SeverityLevel.CRITICAL: 0.1,
+}
+
+
+def summarize(values, digits=3):
+    if not len(values):
+        return None
+    values = np.asarray(values, dtype=np.float64)
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        "mean": round(float(values.mean()), digits),
+        "p50": round(float(p50), digits),
+        "p95": round(float(p95), digits),
+        "p99": round(float(p99), digits),
+        "max": round(float(values.max()), digits),
+    }
+
+
+@contextmanager
+def throwaway_database():
+    """Run the block against a fresh test database, dropped afterwards."""
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        close_old_connections()
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay a Poisson stream of emergencies against a synthetic city through "
+        "the real API and report throughput, latency, queries and assignment "
+        "distances as JSON. Runs against a throwaway test database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--hospitals", type=int, default=50)
+        parser.add_argument("--ambulances", type=int, default=500)
+        parser.add_argument("--patients", type=int, default=200)
+        parser.add_argument("--requests", type=int, default=1000, help="Emergencies to send.")
+        parser.add_argument("--rate", type=float, default=50.0, help="Mean arrivals per second.")
+        parser.add_argument("--concurrency", type=int, default=8, help="Client threads.")
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=0,
+            help=(
+                "Dispatch asynchronously through this many sharded worker processes "
+                "instead of inside the request (0 keeps synchronous dispatch)."
+            ),
+        )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", help="Write the JSON report to this file instead of stdout.")
+
+    def handle(self, *args, **options):
+        with throwaway_database():
+            report = self.simulate(options)
+
+        output = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                f.write(output + "\n")
+        else:
+            self.stdout.write(output)
+
+    def simulate(self, options):
+        # Step 1: Build the city and the patients making calls
+        city = SyntheticCity(seed=options["seed"])
+        create_city(city, options["hospitals"], options["ambulances"])
+        ambulance_index.invalidate()
+        hospital_index.invalidate()
+        ambulance_catalog.invalidate_all()
+        hospital_catalog.invalidate_all()
+
+        password = make_password(None)
+        patients = [
+            User(username=f"patient{i}", email=f"patient{i}@example.com", password=password, role=UserTypesEnum.PATIENT)
+            for i in range(options["patients"])
+        ]
+        User.objects.bulk_create(patients)
+        tokens = [str(RefreshToken.for_user(p).access_token) for p in patients]
+
+        # Step 2: Draw the arrival schedule and the calls
+        n = options["requests"]
+        arrivals = np.cumsum(city.rng.exponential(1.0 / options["rate"], n))
+        lats, lons = city.points(n)
+        severities = city.rng.choice(list(SEVERITY_MIX), n, p=list(SEVERITY_MIX.values()))
+        callers = city.rng.integers(0, len(tokens), n)
+
+        # Step 3: Replay the calls through the real view stack
+        local = threading.local()
+        results = [None] * n
+
+        def send(i):
+            if not hasattr(local, "client"):
+                local.client = Client()
+            delay = arrivals[i] - (time.perf_counter() - started)
+            if delay > 0:
+                time.sleep(delay)
+            payload = {
+                "severity": str(severities[i]),
+                "location": {"latitude": float(lats[i]), "longitude": float(lons[i])},
+            }
+            with CaptureQueriesContext(connection) as queries:
+                sent = time.perf_counter()
+                response = local.client.post(
+                    "/v1/emergency-requests/",
+                    data=json.dumps(payload),
+                    content_type="application/json",
+                    HTTP_AUTHORIZATION=f"Bearer {tokens[callers[i]]}",
+                )
+                latency = time.perf_counter() - sent
+            results[i] = (response.status_code, latency, len(queries))
+
+        started = time.perf_counter()
+        with override_settings(DISPATCH_ASYNC=bool(options["workers"])):
+            with ThreadPoolExecutor(max_workers=options["concurrency"]) as pool:
+                list(pool.map(send, range(n)))
+        elapsed = time.perf_counter() - started
+
+        report = {
+            "config": {
+                key: options[key]
+                for key in ("hospitals", "ambulances", "patients", "requests", "rate", "concurrency", "workers", "seed")
+            },
+            "durationSeconds": round(elapsed, 3),
+            "throughputPerSecond": round(n / elapsed, 2),
+        }
+
+        # Step 4: With workers, dispatch the queued calls only now, so the
+        # measured rate is that of the workers and not of the client threads
+        if options["workers"]:
+            workers_started = time.perf_counter()
+            drained = self.drain(self.start_workers(options["workers"]))
+            done = DispatchJob.objects.filter(status=DispatchJobStatus.DONE).count()
+            report["dispatch"] = {
+                "jobs": done,
+                "drainSeconds": round(drained - workers_started, 3),
+                "jobsPerSecond": round(done / max(drained - workers_started, 1e-9), 2),
+            }
+
+        # Step 5: Summarize
+        statuses = {}
+        for code, *_ in results:
+            statuses[str(code)] = statuses.get(str(code), 0) + 1
+        assigned = np.array(
+            EmergencyRequest.objects.filter(ambulance__isnull=False).values_list(
+                "location__latitude", "location__longitude", "ambulance__latitude", "ambulance__longitude"
+            ),
+            dtype=np.float64,
+        ).reshape(-1, 4)
+        report.update(
+            {
+                "statusCodes": statuses,
+                "assigned": len(assigned),
+                "latencyMs": summarize([r[1] * 1000 for r in results]),
+                "queriesPerRequest": summarize([r[2] for r in results], digits=2),
+                "assignmentDistanceKm": summarize(haversine_pairs(*assigned.T)),
+            }
+        )
+        return report
+
+    def start_workers(self, count):
+        if not count:
+            return []
+        plan = shard_plan(count) if count > 1 else None
+        # Children must open their own database connections
+        connections.close_all()
+        context = multiprocessing.get_context("fork")
+        workers = [
+            context.Process(
+                target=_run_worker, args=((i, plan) if plan else None,), daemon=True
+            )
+            for i in range(count)
+        ]
+        for worker in workers:
+            worker.start()
+        return workers
+
+    def drain(self, workers, timeout: float = 300.0) -> float:
+        """Wait for the job queue to empty, stop the workers, return when it emptied."""
+        deadline = time.perf_counter() + timeout
+        open_jobs = DispatchJob.objects.filter(
+            status__in=[DispatchJobStatus.PENDING, DispatchJobStatus.RUNNING]
+        )
+        while open_jobs.exists() and time.perf_counter() < deadline:
+            time.sleep(0.05)
+        drained = time.perf_counter()
+        for worker in workers:
+            worker.terminate()
+        for worker in workers:
+            worker.join()
+        return drained
+
+
+def _run_worker(shard) -> None:
+    DispatchWorker(batch_size=32, poll_interval=0.01, shard=shard).run()
@@ -1,9 +1,10 @@
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 from utils.mixins import Audit
 from apps.ambulance.models import Ambulance
 from apps.hospital.models import Hospital
-from apps.emergency.utils import SeverityLevel
+from apps.emergency.utils import DispatchJobStatus, DispatchStatus, SeverityLevel
 
 class EmergencyRequest(Audit):
     user = models.ForeignKey(
@@ -14,11 +15,29 @@ class EmergencyRequest(Audit):
         related_name="emergency_requests"
     )
     ambulance = models.ForeignKey(Ambulance, on_delete=models.SET_NULL, null=True, blank=True, related_name='assigned_requests')
+    # Hospital the ambulance takes the patient to, chosen at assignment
+    destination_hospital = models.ForeignKey(
+        Hospital, on_delete=models.SET_NULL, null=True, blank=True, related_name="incoming_requests"
+    )
     severity = models.CharField(max_length=10, choices=SeverityLevel.options(), default=SeverityLevel.MEDIUM)
 
+    dispatch_status = models.CharField(
+        max_length=20, choices=DispatchStatus.options(), default=DispatchStatus.PENDING
+    )
+
     is_resolved = models.BooleanField(default=False)
+    # Seconds from the request to the ambulance's arrival
     response_time_seconds = models.PositiveIntegerField(null=True, blank=True)
 
+    assigned_at = models.DateTimeField(null=True, blank=True)
+    arrived_at = models.DateTimeField(null=True, blank=True)
+    resolved_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["date_created", "id"]),
+        ]
+
     def __str__(self):
         return f"Request by {self.user.username} at {self.created_at.strftime('%Y-%m-%d %H:%M:%S')}"
 
@@ -27,5 +46,68 @@ class EmergencyRequestLocation(Audit):
     emergency = models.OneToOneField(
         EmergencyRequest, on_delete=models.CASCADE, related_name="location"
     )
-    latitude = models.CharField(max_length=255)
-    longitude = models.CharField(max_length=255)
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["latitude", "longitude"]),
+        ]
+
+
+class DispatchJob(Audit):
+    """
+    Durable work item for the dispatch workers. A job is leased to one
+    worker at a time; if the lease runs out before the job is finished it
+    becomes claimable again, so every job is processed at least once.
+    """
+    emergency = models.OneToOneField(
+        EmergencyRequest, on_delete=models.CASCADE, related_name="dispatch_job"
+    )
+    status = models.CharField(
+        max_length=20, choices=DispatchJobStatus.options(), default=DispatchJobStatus.PENDING
+    )
+    # Dispatch region of the patient (see `utils.regions`), used for sharding
+    region = models.BigIntegerField(null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    available_at = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=255, null=True, blank=True)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "available_at"]),
+            models.Index(fields=["status", "locked_until"]),
+        ]
+
+
+class EmergencyRollup(Audit):
+    """
+    Hourly aggregate of emergencies by severity and by the hospital of the
+    assigned ambulance, updated on every state transition. Each metric in
+    `ResponseMetric` (durations from request creation) keeps a count, a sum
+    and a mergeable quantile sketch (`utils.sketch`), so any range of
+    buckets can be combined without reading `EmergencyRequest`.
+    """
+    # Hour in which the emergencies were requested
+    bucket_start = models.DateTimeField()
+    severity = models.CharField(max_length=10, choices=SeverityLevel.options())
+    hospital = models.ForeignKey(Hospital, on_delete=models.CASCADE, related_name="rollups")
+
+    dispatch_count = models.PositiveIntegerField(default=0)
+    dispatch_seconds = models.FloatField(default=0)
+    dispatch_sketch = models.BinaryField(default=bytes)
+    response_count = models.PositiveIntegerField(default=0)
+    response_seconds = models.FloatField(default=0)
+    response_sketch = models.BinaryField(default=bytes)
+    resolution_count = models.PositiveIntegerField(default=0)
+    resolution_seconds = models.FloatField(default=0)
+    resolution_sketch = models.BinaryField(default=bytes)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["bucket_start", "severity", "hospital"], name="unique_emergency_rollup"
+            ),
+        ]
@@ -0,0 +1,38 @@
+import heapq
+import itertools
+import threading
+import time
+from typing import Any, List, Optional
+
+from apps.emergency.utils import SeverityLevel
+
+
+class DispatchQueue:
+    """
+    Priority queue of emergencies waiting for an ambulance.
+
+    Items are ordered by severity first and by time spent waiting second,
+    so a critical call always leaves the queue ahead of any lower-severity
+    one. The queue is local to its process; figures that must agree across
+    workers come from `dispatch_queue_stats`.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._heap: List[tuple] = []
+        self._sequence = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def push(self, item: Any, severity: str, enqueued_at: Optional[float] = None) -> None:
+        severity = SeverityLevel(severity)
+        enqueued_at = time.monotonic() if enqueued_at is None else enqueued_at
+        with self._lock:
+            heapq.heappush(self._heap, (severity.priority, enqueued_at, next(self._sequence), item))
+
+    def pop_all(self) -> List[Any]:
+        """Drain the queue, most urgent item first."""
+        with self._lock:
+            entries = [heapq.heappop(self._heap) for _ in range(len(self._heap))]
+        return [entry[-1] for entry in entries]
@@ -0,0 +1,30 @@
+from django.db import transaction
+from django.dispatch import Signal, receiver
+
+from apps.ambulance.signals import ambulance_released
+from apps.emergency.utils import DispatchStatus
+
+# Sent with `assignments`, a mapping of emergency id to ambulance id
+emergency_assigned = Signal()
+
+
+@receiver(ambulance_released)
+def redispatch_waiting_requests(sender, ambulance_ids, **kwargs):
+    from apps.emergency.v1.services import dispatch_waiting_requests
+
+    transaction.on_commit(lambda: dispatch_waiting_requests(limit=len(ambulance_ids)))
+
+
+@receiver(emergency_assigned)
+def publish_assignments(sender, assignments, **kwargs):
+    from apps.ambulance.v1.streams import publish_fleet_changes
+    from apps.emergency.v1.streams import emergency_state, publish_emergency_states
+
+    def publish():
+        publish_fleet_changes(assignments.values())
+        publish_emergency_states(
+            emergency_state(pk, DispatchStatus.ASSIGNED, ambulance_id, False)
+            for pk, ambulance_id in assignments.items()
+        )
+
+    transaction.on_commit(publish)
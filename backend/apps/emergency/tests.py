@@ -1,3 +1,1189 @@
-from django.test import TestCase
+import contextlib
+import csv
+import heapq
+import io
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import Counter
+from itertools import permutations
+from unittest import mock
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+import numpy as np
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import AsyncClient, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.ambulance.index import ambulance_index
+from apps.ambulance.models import Ambulance
+from apps.ambulance.utils import AmbulanceTypeEnum, StatusEnum
+from apps.ambulance.v1.services import create_ambulance_with_location, release_expired_ambulances
+from apps.ambulance.v1.streams import ambulance_topic, publish_fleet_changes
+from apps.emergency.models import DispatchJob, EmergencyRequest, EmergencyRequestLocation, EmergencyRollup
+from apps.emergency.utils import DISPATCH_TIERS, DispatchJobStatus, DispatchStatus, ResponseMetric
+from apps.emergency.v1.streams import AssignedUnitFollower, emergency_state, publish_emergency_states
+from apps.emergency.v1.services import (
+    NoAmbulanceAvailable,
+    assign_ambulances_in_batch,
+    assign_nearest_ambulance,
+    claim_dispatch_jobs,
+    dispatch_emergency,
+    enqueue_dispatch,
+    rank_by_eta,
+    rebuild_rollups,
+    record_arrival,
+    resolve_emergency,
+    run_dispatch_jobs,
+    update_rollups,
+)
+from apps.emergency.workers import DispatchWorker, ReleaseTimer
+from apps.hospital.index import hospital_index
+from apps.hospital.models import Hospital, HospitalLocation
+from apps.user.models import User
+from apps.user.utils import UserTypesEnum
+from utils.assignment import min_cost_assignment
+from utils.events import event_bus
+from utils.geo import haversine_distance
+from utils.regions import ShardPlan, region_of
+from utils.routing import EtaEngine, RoadGraph
+from utils.sketch import RELATIVE_ACCURACY, QuantileSketch
+from utils.synthetic import SyntheticCity, create_city
+from utils.testing import QueryBudgetMixin
+
+logger = logging.getLogger(__name__)
+
+
+class ConcurrentAssignmentTests(TransactionTestCase):
+    ambulances = 100
+    requests = 300
+    threads = 16
+
+    def setUp(self):
+        hospital = Hospital.objects.create(name="General", contact_number="0", address="Lagos")
+        for i in range(self.ambulances):
+            create_ambulance_with_location(
+                {
+                    "hospital": hospital,
+                    "location": {"latitude": 6.50 + i * 0.001, "longitude": 3.30},
+                }
+            )
+        self.emergencies = []
+        for _ in range(self.requests):
+            emergency = EmergencyRequest.objects.create()
+            EmergencyRequestLocation.objects.create(
+                emergency=emergency, latitude=6.50, longitude=3.30
+            )
+            self.emergencies.append(emergency)
+        ambulance_index.invalidate()
+
+    def test_no_ambulance_is_double_assigned(self):
+        pending = list(self.emergencies)
+        lock = threading.Lock()
+        failures = []
+
+        def worker():
+            try:
+                while True:
+                    with lock:
+                        if not pending:
+                            return
+                        emergency = pending.pop()
+                    try:
+                        assign_nearest_ambulance(emergency)
+                    except Exception as e:
+                        failures.append(str(e))
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=worker) for _ in range(self.threads)]
+        started = time.perf_counter()
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        logger.info(
+            "%d dispatches on %d threads in %.3fs (%.0f claims/s)",
+            self.requests, self.threads, elapsed, self.requests / elapsed,
+        )
+
+        assigned = Counter(
+            EmergencyRequest.objects.filter(ambulance__isnull=False).values_list(
+                "ambulance_id", flat=True
+            )
+        )
+        self.assertEqual(len(assigned), self.ambulances)
+        self.assertEqual(max(assigned.values()), 1)
+        self.assertEqual(failures, ["No available ambulances"] * (self.requests - self.ambulances))
+
+
+class EmergencyQueryBudgetTests(QueryBudgetMixin, TestCase):
+    url = "/v1/emergency-requests/"
+    model = EmergencyRequest
+    list_queries = 1
+    detail_queries = 1
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(
+            username="admin", email="admin@example.com", password="x", role=UserTypesEnum.ADMIN
+        )
+        cls.hospitals, cls.ambulances = create_city(SyntheticCity(seed=0), 10, 50)
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.admin)
+
+    def fill(self, total):
+        start = EmergencyRequest.objects.count()
+        EmergencyRequest.objects.bulk_create(
+            [
+                EmergencyRequest(
+                    user=self.admin,
+                    ambulance=self.ambulances[i % len(self.ambulances)],
+                    destination_hospital=self.hospitals[i % len(self.hospitals)],
+                )
+                for i in range(start, total)
+            ]
+        )
+
+
+class EmergencyExportTests(TestCase):
+    """The export streams every matching row, joined, in one query."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(
+            username="admin", email="admin@example.com", password="x", role=UserTypesEnum.ADMIN
+        )
+        cls.patient = User.objects.create_user(username="patient", email="patient@example.com", password="x")
+        _, ambulances = create_city(SyntheticCity(seed=0), 2, 5)
+        now = timezone.now()
+        cls.emergencies = []
+        for i in range(30):
+            emergency = EmergencyRequest.objects.create(
+                user=cls.patient,
+                severity="high" if i % 3 == 0 else "low",
+                ambulance=ambulances[i % len(ambulances)] if i % 2 else None,
+            )
+            EmergencyRequestLocation.objects.create(emergency=emergency, latitude=6.5 + i / 1000, longitude=3.4)
+            cls.emergencies.append(emergency)
+        # Spread the requests over the past 30 hours, oldest first
+        for i, emergency in enumerate(cls.emergencies):
+            emergency.date_created = now - timedelta(hours=30 - i)
+        EmergencyRequest.objects.bulk_update(cls.emergencies, ["date_created"])
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def export(self, **params):
+        response = self.client.get("/v1/emergency-requests/export/", params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b"".join(response.streaming_content).decode()
+
+    def test_ndjson(self):
+        with self.settings(EMERGENCY_EXPORT_CHUNK_SIZE=7), self.assertNumQueries(1):
+            lines = self.export().splitlines()
+        rows = [json.loads(line) for line in lines]
+        self.assertEqual([row["id"] for row in rows], [str(e.pk) for e in self.emergencies])
+        self.assertEqual(rows[1]["latitude"], 6.501)
+        self.assertEqual(rows[1]["ambulanceType"], self.emergencies[1].ambulance.ambulance_type)
+        self.assertIsNone(rows[0]["ambulance"])
+        self.assertTrue(rows[0]["createdAt"].endswith("Z"))
+
+    def test_csv_with_filters(self):
+        start = self.emergencies[10].date_created
+        end = self.emergencies[20].date_created
+        with self.settings(EMERGENCY_EXPORT_CHUNK_SIZE=2):
+            text = self.export(exportFormat="csv", severity="high", start=start.isoformat(), end=end.isoformat())
+        rows = list(csv.DictReader(io.StringIO(text)))
+        self.assertEqual([row["id"] for row in rows], [str(self.emergencies[i].pk) for i in (12, 15, 18)])
+        self.assertEqual(rows[0]["ambulance"], "")
+        self.assertEqual(rows[1]["ambulanceHospital"], str(self.emergencies[15].ambulance.hospital_id))
+        self.assertEqual(rows[0]["isResolved"], "false")
+
+    def test_empty_csv_has_a_header(self):
+        text = self.export(exportFormat="csv", severity="critical")
+        self.assertEqual(text.splitlines(), [text.splitlines()[0]])
+        self.assertTrue(text.startswith("id,createdAt,severity"))
+
+    def test_admin_only(self):
+        self.client.force_authenticate(self.patient)
+        response = self.client.get("/v1/emergency-requests/export/")
+        self.assertEqual(response.status_code, 403)
+
+    async def test_async_body_under_asgi(self):
+        response = await AsyncClient().get(
+            "/v1/emergency-requests/export/", headers={"Authorization": f"Bearer {AccessToken.for_user(self.admin)}"}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_async)
+        lines = b"".join([chunk async for chunk in response.streaming_content]).splitlines()
+        self.assertEqual(len(lines), len(self.emergencies))
+
+
+class ShardPlanTests(SimpleTestCase):
+    """Shards must split the fleet evenly and only index a thin ring beyond their area."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        lats, lons = SyntheticCity(seed=0).points(5000)
+        cls.points = list(zip(lats.tolist(), lons.tolist()))
+
+    def test_balanced_ownership_and_bounded_halo(self):
+        for shards in (2, 4, 8, 16):
+            plan = ShardPlan.from_points(self.points, shards, size=0.02)
+            owners = Counter(plan.shard_of(region_of(lat, lon, 0.02)) for lat, lon in self.points)
+            with self.subTest(shards=shards):
+                for shard in range(shards):
+                    owned = owners[shard] / len(self.points)
+                    self.assertGreater(owned, 0.7 / shards)
+                    self.assertLess(owned, 1.3 / shards)
+                    covered = sum(plan.covers(lat, lon, shard) for lat, lon in self.points) / len(self.points)
+                    # Units indexed beyond the shard's own area
+                    self.assertLess(covered - owned, 0.35)
+
+    def test_every_region_has_one_owner(self):
+        plan = ShardPlan.from_points(self.points, 4, size=0.02)
+        regions = [plan.regions(shard) for shard in range(4)]
+        self.assertTrue(all(regions))
+        self.assertEqual(sum(map(len, regions)), len(plan.owners))
+        # Outside the fleet's bounding box everything belongs to shard 0
+        self.assertEqual(plan.shard_of(region_of(40.0, -74.0, 0.02)), 0)
+
+
+class ShardedClaimTests(TestCase):
+    def test_each_job_is_leased_by_exactly_one_shard(self):
+        city = SyntheticCity(seed=0)
+        lats, lons = city.points(200)
+        plan = ShardPlan.from_points(zip(lats.tolist(), lons.tolist()), 4)
+        emergencies = EmergencyRequest.objects.bulk_create([EmergencyRequest() for _ in range(202)])
+        regions = [region_of(lat, lon) for lat, lon in zip(lats, lons)]
+        # One job without a region and one far outside the plan
+        regions += [None, region_of(40.0, -74.0)]
+        DispatchJob.objects.bulk_create(
+            [DispatchJob(emergency=e, region=r) for e, r in zip(emergencies, regions)]
+        )
+
+        leased = Counter()
+        for shard in range(4):
+            jobs = claim_dispatch_jobs(f"worker-{shard}", 1000, shard=(shard, plan))
+            self.assertTrue(jobs)
+            for job in jobs:
+                leased[job.pk] += 1
+                self.assertEqual(plan.shard_of(job.region) if job.region else 0, shard)
+        self.assertEqual(len(leased), len(emergencies))
+        self.assertEqual(set(leased.values()), {1})
+
+
+class ResolveEmergencyTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        _, (cls.ambulance,) = create_city(SyntheticCity(seed=0), 1, 1)
+
+    def setUp(self):
+        ambulance_index.invalidate()
+
+    def request(self):
+        emergency = EmergencyRequest.objects.create(severity="low")
+        EmergencyRequestLocation.objects.create(emergency=emergency, latitude=6.5244, longitude=3.3792)
+        return emergency
+
+    def status(self):
+        return Ambulance.objects.get(pk=self.ambulance.pk).status
+
+    def test_resolving_frees_the_unit(self):
+        emergency = self.request()
+        assign_nearest_ambulance(emergency)
+        self.assertEqual(self.status(), StatusEnum.BUSY)
+        resolve_emergency(emergency)
+        self.assertEqual(self.status(), StatusEnum.AVAILABLE)
+
+    def test_late_resolve_does_not_free_a_reclaimed_unit(self):
+        first = self.request()
+        self.assertEqual(assign_nearest_ambulance(first).pk, self.ambulance.pk)
+        # The unit's busy_until lapses and another request claims it
+        lapsed = timezone.now() - timedelta(minutes=1)
+        Ambulance.objects.filter(pk=self.ambulance.pk).update(busy_until=lapsed)
+        ambulance_index.set_status(self.ambulance.pk, StatusEnum.BUSY, lapsed)
+        second = self.request()
+        self.assertEqual(assign_nearest_ambulance(second).pk, self.ambulance.pk)
+
+        first.refresh_from_db()
+        resolve_emergency(first)
+        self.assertEqual(self.status(), StatusEnum.BUSY)
+
+        second.refresh_from_db()
+        resolve_emergency(second)
+        self.assertEqual(self.status(), StatusEnum.AVAILABLE)
+
+
+class DispatchFleetTestCase(TestCase):
+    """Units of chosen types placed north of a patient at a fixed point."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.hospital = Hospital.objects.create(name="General", contact_number="0", address="Lagos")
+
+    def setUp(self):
+        ambulance_index.invalidate()
+
+    def unit(self, ambulance_type, km):
+        # About `km` kilometres north of the patient
+        return create_ambulance_with_location(
+            {
+                "hospital": self.hospital,
+                "ambulance_type": ambulance_type,
+                "location": {"latitude": 6.50 + km / 111.2, "longitude": 3.30},
+            }
+        )
+
+    def request(self, severity, km=0):
+        emergency = EmergencyRequest.objects.create(severity=severity)
+        EmergencyRequestLocation.objects.create(emergency=emergency, latitude=6.50 + km / 111.2, longitude=3.30)
+        return emergency
+
+
+class DispatchTierTests(DispatchFleetTestCase):
+    def test_every_type_is_reachable_from_every_severity(self):
+        for severity, tiers in DISPATCH_TIERS.items():
+            with self.subTest(severity=severity):
+                types = [t for tier in tiers for t in tier]
+                self.assertCountEqual(types, list(AmbulanceTypeEnum))
+
+    def test_critical_prefers_an_advanced_unit_over_a_closer_basic_one(self):
+        self.unit(AmbulanceTypeEnum.BLS, 1)
+        icu = self.unit(AmbulanceTypeEnum.ICU, 5)
+        self.assertEqual(assign_nearest_ambulance(self.request("critical")).pk, icu.pk)
+
+    def test_medium_prefers_a_basic_unit_over_a_closer_advanced_one(self):
+        self.unit(AmbulanceTypeEnum.ALS, 1)
+        bls = self.unit(AmbulanceTypeEnum.BLS, 5)
+        self.assertEqual(assign_nearest_ambulance(self.request("medium")).pk, bls.pk)
+
+    def test_later_tiers_are_used_once_earlier_ones_are_taken(self):
+        als = self.unit(AmbulanceTypeEnum.ALS, 1)
+        bls = self.unit(AmbulanceTypeEnum.BLS, 2)
+        pta = self.unit(AmbulanceTypeEnum.PTA, 3)
+        dispatched = [assign_nearest_ambulance(self.request("high")).pk for _ in range(3)]
+        self.assertEqual(dispatched, [als.pk, bls.pk, pta.pk])
+
+    def test_air_and_water_units_are_dispatched_when_nothing_else_is_free(self):
+        for severity in ("critical", "low"):
+            with self.subTest(severity=severity):
+                Ambulance.objects.all().delete()
+                ambulance_index.invalidate()
+                air = self.unit(AmbulanceTypeEnum.AIR, 10)
+                self.assertEqual(assign_nearest_ambulance(self.request(severity)).pk, air.pk)
+
+
+class PreemptionTests(DispatchFleetTestCase):
+    def test_urgent_request_takes_the_unit_of_a_less_urgent_one(self):
+        bls = self.unit(AmbulanceTypeEnum.BLS, 1)
+        low = self.request("low")
+        assign_nearest_ambulance(low)
+
+        critical = self.request("critical")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(assign_nearest_ambulance(critical).pk, bls.pk)
+        low.refresh_from_db()
+        self.assertIsNone(low.ambulance_id)
+        self.assertIsNone(low.assigned_at)
+        self.assertEqual(low.dispatch_status, DispatchStatus.WAITING)
+
+        # The pre-empted request's late resolve leaves the unit with the new one
+        resolve_emergency(low)
+        self.assertEqual(Ambulance.objects.get(pk=bls.pk).status, StatusEnum.BUSY)
+
+    def test_requests_of_equal_severity_and_arrived_units_are_not_preempted(self):
+        self.unit(AmbulanceTypeEnum.ALS, 1)
+        self.unit(AmbulanceTypeEnum.BLS, 2)
+        high = self.request("high")
+        low = self.request("low")
+        assign_nearest_ambulance(high)
+        assign_nearest_ambulance(low)
+        record_arrival(low)
+
+        with self.assertRaises(NoAmbulanceAvailable):
+            assign_nearest_ambulance(self.request("high"))
+        self.assertEqual(
+            EmergencyRequest.objects.filter(ambulance__isnull=False).count(), 2
+        )
+
+    @override_settings(DISPATCH_PREEMPTION=False)
+    def test_preemption_can_be_turned_off(self):
+        self.unit(AmbulanceTypeEnum.BLS, 1)
+        assign_nearest_ambulance(self.request("low"))
+        with self.assertRaises(NoAmbulanceAvailable):
+            assign_nearest_ambulance(self.request("critical"))
+
+
+class DestinationTests(DispatchFleetTestCase):
+    """Dispatch sends the unit to the hospital nearest the patient."""
+
+    def setUp(self):
+        super().setUp()
+        hospital_index.invalidate()
+        self.unit(AmbulanceTypeEnum.ALS, 1)
+        self.unit(AmbulanceTypeEnum.ALS, 2)
+        self.near, self.far = self.destination(0.5), self.destination(4)
+
+    def destination(self, km):
+        hospital = Hospital.objects.create(name=f"H{km}", contact_number="0", address="Lagos")
+        HospitalLocation.objects.create(hospital=hospital, latitude=6.50 - km / 111.2, longitude=3.30)
+        return hospital
+
+    def test_greedy_and_batch_paths_pick_the_nearest_hospital(self):
+        greedy = self.request("high")
+        assign_nearest_ambulance(greedy)
+        self.assertEqual(greedy.destination_hospital_id, self.near.pk)
+
+        batched = self.request("high")
+        assign_ambulances_in_batch([batched])
+        batched.refresh_from_db()
+        self.assertEqual(batched.destination_hospital_id, self.near.pk)
+
+    def test_a_hospital_deleted_since_the_index_loaded_leaves_the_destination_empty(self):
+        hospital_index.rebuild()
+        # Deleted without running the on-commit hooks, so the index still has it
+        self.near.delete()
+        for assign in (assign_nearest_ambulance, lambda e: assign_ambulances_in_batch([e])):
+            emergency = self.request("high")
+            assign(emergency)
+            emergency.refresh_from_db()
+            self.assertIsNotNone(emergency.ambulance_id)
+            self.assertIsNone(emergency.destination_hospital_id)
+
+
+@override_settings(DISPATCH_PREEMPTION=False)
+class WaitingRequestTests(DispatchFleetTestCase):
+    """Whichever way a unit frees up, the most urgent waiting request takes it."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.admin = User.objects.create_user(
+            username="admin", email="admin@example.com", password="x", role=UserTypesEnum.ADMIN
+        )
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        self.bls = self.unit(AmbulanceTypeEnum.BLS, 1)
+        self.busy = self.request("low")
+        assign_nearest_ambulance(self.busy)
+        # Oldest first, so only severity can put the critical one ahead
+        self.low, self.high, self.critical = (self.wait(severity) for severity in ("low", "high", "critical"))
+
+    def wait(self, severity):
+        emergency = self.request(severity)
+        with self.assertRaises(NoAmbulanceAvailable):
+            dispatch_emergency(emergency)
+        return emergency
+
+    def assertTakenBy(self, emergency):
+        emergency.refresh_from_db()
+        self.assertEqual(emergency.ambulance_id, self.bls.pk)
+        self.assertEqual(emergency.dispatch_status, DispatchStatus.ASSIGNED)
+        for other in {self.low, self.high, self.critical} - {emergency}:
+            other.refresh_from_db()
+            if not other.is_resolved:
+                self.assertIsNone(other.ambulance_id)
+
+    def test_an_admin_marking_a_unit_available(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(
+                f"/v1/ambulance/{self.bls.pk}/", {"status": StatusEnum.AVAILABLE}, format="json"
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertTakenBy(self.critical)
+
+    def test_resolving_the_units_emergency(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(
+                f"/v1/emergency-requests/{self.busy.pk}/", {"isResolved": True}, format="json"
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertTakenBy(self.critical)
+
+    def test_busy_until_passing(self):
+        Ambulance.objects.filter(pk=self.bls.pk).update(busy_until=timezone.now() - timedelta(seconds=1))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(release_expired_ambulances(), 1)
+        self.assertTakenBy(self.critical)
+
+    def test_requests_are_served_most_urgent_first(self):
+        for expected in (self.critical, self.high, self.low):
+            resolved = EmergencyRequest.objects.get(ambulance=self.bls, is_resolved=False)
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.patch(f"/v1/emergency-requests/{resolved.pk}/", {"isResolved": True}, format="json")
+            self.assertTakenBy(expected)
+
+    def test_release_timer_catches_up_on_start_up(self):
+        # Freed while no timer was running, so nothing re-dispatched it; the
+        # new process starts with a fresh index
+        Ambulance.objects.filter(pk=self.bls.pk).update(status=StatusEnum.AVAILABLE, busy_until=None)
+        ambulance_index.invalidate()
+        timer = ReleaseTimer()
+        with (
+            mock.patch("apps.emergency.workers.close_old_connections"),
+            mock.patch.object(timer._wakeup, "wait", side_effect=lambda delay: timer.stop()),
+            self.captureOnCommitCallbacks(execute=True),
+        ):
+            timer.run()
+        self.assertTakenBy(self.critical)
+
+    def test_release_timer_releases_at_busy_until(self):
+        Ambulance.objects.filter(pk=self.bls.pk).update(busy_until=timezone.now() + timedelta(minutes=5))
+        timer = ReleaseTimer(max_sleep=600)
+        delays = []
+
+        def wait(delay):
+            # Fast-forward to the expiry the timer slept until
+            delays.append(delay)
+            Ambulance.objects.filter(pk=self.bls.pk).update(busy_until=timezone.now() - timedelta(seconds=1))
+            if len(delays) == 2:
+                timer.stop()
+
+        with (
+            mock.patch("apps.emergency.workers.close_old_connections"),
+            mock.patch.object(timer._wakeup, "wait", side_effect=wait),
+            self.captureOnCommitCallbacks(execute=True),
+        ):
+            timer.run()
+        self.assertAlmostEqual(delays[0], 300, delta=5)
+        self.assertEqual(Ambulance.objects.get(pk=self.bls.pk).status, StatusEnum.BUSY)
+        self.assertTakenBy(self.critical)
+
+
+class MinCostAssignmentTests(SimpleTestCase):
+    def brute_force(self, cost):
+        rows, columns = cost.shape
+        if rows <= columns:
+            return min(sum(cost[r, c] for r, c in enumerate(p)) for p in permutations(range(columns), rows))
+        return min(sum(cost[r, c] for c, r in enumerate(p)) for p in permutations(range(rows), columns))
+
+    def test_matches_brute_force_on_square_and_rectangular_costs(self):
+        rng = np.random.default_rng(0)
+        for shape in ((1, 1), (4, 4), (3, 6), (6, 3), (5, 5)):
+            for _ in range(10):
+                cost = rng.uniform(0, 10, shape)
+                with self.subTest(shape=shape):
+                    pairs = min_cost_assignment(cost)
+                    self.assertEqual(len(pairs), min(shape))
+                    self.assertEqual(len({r for r, _ in pairs}), len(pairs))
+                    self.assertEqual(len({c for _, c in pairs}), len(pairs))
+                    self.assertAlmostEqual(sum(cost[r, c] for r, c in pairs), self.brute_force(cost))
+
+    def test_empty_cost(self):
+        self.assertEqual(min_cost_assignment(np.zeros((0, 3))), [])
+
+
+class BatchAssignmentTests(DispatchFleetTestCase):
+    def assign(self, emergencies):
+        with self.captureOnCommitCallbacks(execute=True):
+            return assign_ambulances_in_batch(emergencies)
+
+    def test_total_distance_beats_greedy_order(self):
+        north = self.unit(AmbulanceTypeEnum.ALS, 1)
+        south = self.unit(AmbulanceTypeEnum.ALS, -1.5)
+        first, second = self.request("high"), self.request("high", km=1.9)
+        # Greedily, `first` takes the unit 1 km away and `second` drives 3.4 km
+        self.assertEqual(self.assign([first, second]), {first.pk: south.pk, second.pk: north.pk})
+        first.refresh_from_db()
+        self.assertEqual((first.ambulance_id, first.dispatch_status), (south.pk, DispatchStatus.ASSIGNED))
+        self.assertEqual(Ambulance.objects.get(pk=north.pk).status, StatusEnum.BUSY)
+
+    def test_urgent_requests_are_matched_first(self):
+        als = self.unit(AmbulanceTypeEnum.ALS, 1)
+        low, critical = self.request("low"), self.request("critical", km=5)
+        self.assertEqual(self.assign([low, critical]), {low.pk: None, critical.pk: als.pk})
+
+    def test_requests_assigned_meanwhile_are_left_alone(self):
+        first, second = self.unit(AmbulanceTypeEnum.ALS, 1), self.unit(AmbulanceTypeEnum.ALS, 2)
+        emergency = self.request("high")
+        EmergencyRequest.objects.filter(pk=emergency.pk).update(ambulance=second)
+        self.assertEqual(self.assign([emergency]), {emergency.pk: second.pk})
+        self.assertEqual(Ambulance.objects.get(pk=first.pk).status, StatusEnum.AVAILABLE)
+
+
+def road_graph(lats, lons, edges, max_speed_mps):
+    """A `RoadGraph` from `(source, target, seconds)` edges."""
+    edges = sorted(edges)
+    sources = np.array([a for a, _, _ in edges], dtype=np.int64)
+    indptr = np.concatenate(([0], np.cumsum(np.bincount(sources, minlength=len(lats)))))
+    return RoadGraph(lats, lons, indptr, [b for _, b, _ in edges], [t for _, _, t in edges], max_speed_mps)
+
+
+class RoadGraphTests(SimpleTestCase):
+    def setUp(self):
+        # A random street network whose edges are never faster than 20 m/s
+        rng = np.random.default_rng(0)
+        self.lats, self.lons = rng.uniform(6.45, 6.55, 80), rng.uniform(3.30, 3.40, 80)
+        edges = []
+        for a in range(80):
+            for b in rng.choice(80, 3, replace=False):
+                if a != b:
+                    metres = haversine_distance(self.lats[a], self.lons[a], self.lats[b], self.lons[b]) * 1000
+                    edges.append((a, int(b), metres / rng.uniform(5, 20)))
+        self.edges = edges
+        self.graph = road_graph(self.lats, self.lons, edges, max_speed_mps=20)
+
+    def dijkstra(self, source, target):
+        adjacency = {}
+        for a, b, seconds in self.edges:
+            adjacency.setdefault(a, []).append((b, seconds))
+        best, frontier = {source: 0.0}, [(0.0, source)]
+        while frontier:
+            cost, node = heapq.heappop(frontier)
+            if node == target:
+                return cost
+            if cost > best[node]:
+                continue
+            for neighbour, seconds in adjacency.get(node, ()):
+                if cost + seconds < best.get(neighbour, float("inf")):
+                    best[neighbour] = cost + seconds
+                    heapq.heappush(frontier, (cost + seconds, neighbour))
+        return None
+
+    def test_a_star_matches_dijkstra(self):
+        for source in range(0, 80, 7):
+            for target in range(0, 80, 5):
+                with self.subTest(source=source, target=target):
+                    expected = self.dijkstra(source, target)
+                    actual = self.graph.travel_time(source, target)
+                    if expected is None:
+                        self.assertIsNone(actual)
+                    else:
+                        self.assertAlmostEqual(actual, expected, places=1)
+
+    def test_unreachable_nodes_and_round_trip(self):
+        graph = road_graph([6.5, 6.6, 6.7], [3.3, 3.3, 3.3], [(0, 1, 60.0)], max_speed_mps=30)
+        self.assertEqual(graph.travel_time(0, 1), 60.0)
+        self.assertIsNone(graph.travel_time(1, 0))
+        self.assertIsNone(graph.travel_time(0, 2))
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "graph.npz")
+            self.graph.save(path)
+            loaded = RoadGraph.load(path)
+        self.assertEqual(loaded.max_speed_mps, 20)
+        self.assertEqual(loaded.travel_time(3, 40), self.graph.travel_time(3, 40))
+
+    def test_engine_caches_by_cell(self):
+        engine = EtaEngine(self.graph, cell_size=0.005)
+        first = engine.eta(6.50, 3.35, 6.46, 3.31)
+        self.assertEqual(engine.eta(6.5001, 3.3501, 6.4601, 3.3101), first)
+        self.assertEqual((engine.hits, engine.misses), (1, 1))
+
+
+class EtaRankingTests(DispatchFleetTestCase):
+    """With a road graph, the unit that arrives first wins over the closest one."""
+
+    def setUp(self):
+        super().setUp()
+        self.across_river = self.unit(AmbulanceTypeEnum.ALS, 1)
+        self.on_the_road = self.unit(AmbulanceTypeEnum.ALS, -2)
+        self.stranded = self.unit(AmbulanceTypeEnum.ALS, 0.5)
+        # Nodes: patient, the three units, and a bridge far upstream
+        graph = road_graph(
+            [6.50, 6.50 + 1 / 111.2, 6.50 - 2 / 111.2, 6.50 + 0.5 / 111.2, 6.55],
+            [3.30, 3.30, 3.30, 3.30, 3.35],
+            [(1, 4, 600.0), (4, 0, 600.0), (2, 0, 150.0)],
+            max_speed_mps=30,
+        )
+        patcher = mock.patch(
+            "apps.emergency.v1.services.get_eta_engine", return_value=EtaEngine(graph, cell_size=0.001)
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_candidates_are_ordered_by_travel_time_then_unrouted(self):
+        nearest = ambulance_index.nearest(6.50, 3.30, k=3)
+        self.assertEqual([pk for _, pk in nearest], [self.stranded.pk, self.across_river.pk, self.on_the_road.pk])
+        ranked = rank_by_eta(6.50, 3.30, nearest)
+        self.assertEqual([pk for _, pk in ranked], [self.on_the_road.pk, self.across_river.pk, self.stranded.pk])
+
+    def test_dispatch_sends_the_fastest_unit(self):
+        self.assertEqual(assign_nearest_ambulance(self.request("high")).pk, self.on_the_road.pk)
+
+
+class DispatchQueueStatsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(
+            username="admin", email="admin@example.com", password="x", role=UserTypesEnum.ADMIN
+        )
+        _, (cls.ambulance,) = create_city(SyntheticCity(seed=0), 1, 1)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def assigned(self, waited):
+        emergency = EmergencyRequest.objects.create(severity="high")
+        now = timezone.now()
+        EmergencyRequest.objects.filter(pk=emergency.pk).update(
+            date_created=now - waited,
+            ambulance=self.ambulance,
+            dispatch_status=DispatchStatus.ASSIGNED,
+            assigned_at=now,
+        )
+
+    def test_statistics_are_read_from_the_database(self):
+        # Rows as any dispatch process would leave them
+        EmergencyRequest.objects.create(severity="critical", dispatch_status=DispatchStatus.WAITING)
+        EmergencyRequest.objects.create(severity="critical")
+        EmergencyRequest.objects.create(severity="low", dispatch_status=DispatchStatus.WAITING, is_resolved=True)
+        self.assigned(timedelta(seconds=4))
+        self.assigned(timedelta(seconds=10))
+        # Outside the statistics window
+        self.assigned(timedelta(hours=2))
+
+        response = self.client.get("/v1/emergency-requests/queue/")
+        self.assertEqual(response.status_code, 200)
+        stats = response.json()["data"]
+        self.assertEqual(list(stats), ["critical", "high", "medium", "low"])
+        self.assertEqual(stats["critical"]["depth"], 2)
+        self.assertEqual(stats["critical"]["waiting"], 1)
+        self.assertEqual(stats["critical"]["dispatched"], 0)
+        self.assertEqual(stats["high"]["depth"], 0)
+        self.assertEqual(stats["high"]["dispatched"], 2)
+        self.assertAlmostEqual(stats["high"]["meanWaitSeconds"], 7.0, places=1)
+        self.assertAlmostEqual(stats["high"]["maxWaitSeconds"], 10.0, places=1)
+        self.assertEqual(stats["low"]["depth"], 0)
+
+
+class EmergencyStreamTests(SimpleTestCase):
+    """An emergency's stream only hears from the unit assigned to it."""
+
+    def drain(self, subscription):
+        return [(event, data.get("emergencyId") or data["id"]) for event, data in subscription._drain()]
+
+    async def test_stream_follows_the_assigned_unit(self):
+        first, second = "unit-1", "unit-2"
+        follower = AssignedUnitFollower(emergency_state("e-1", DispatchStatus.PENDING, None, False))
+        subscription = event_bus.subscribe(follower.topics(), accept=follower)
+        follower.attach(subscription)
+        self.addCleanup(event_bus.unsubscribe, subscription)
+
+        publish_fleet_changes([first])
+        self.assertFalse(event_bus.has_subscribers(ambulance_topic(first)))
+        self.assertEqual(self.drain(subscription), [])
+
+        publish_emergency_states([emergency_state("e-1", DispatchStatus.ASSIGNED, first, False)])
+        publish_fleet_changes([first, second])
+        self.assertEqual(self.drain(subscription), [("emergency", "e-1"), ("ambulance", first)])
+
+        # Re-assigned: the old unit's topic is dropped
+        publish_emergency_states([emergency_state("e-1", DispatchStatus.ASSIGNED, second, False)])
+        self.assertFalse(event_bus.has_subscribers(ambulance_topic(first)))
+        publish_fleet_changes([first, second])
+        self.assertEqual(self.drain(subscription), [("emergency", "e-1"), ("ambulance", second)])
+
+        event_bus.unsubscribe(subscription)
+        self.assertFalse(event_bus.has_subscribers(ambulance_topic(second)))
+
+
+class DispatchJobTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.patient = User.objects.create_user(
+            username="patient", email="patient@example.com", password="x", role=UserTypesEnum.PATIENT
+        )
+        create_city(SyntheticCity(seed=0), 1, 3)
+
+    def setUp(self):
+        ambulance_index.invalidate()
+
+    def queued(self):
+        emergency = EmergencyRequest.objects.create(severity="high")
+        EmergencyRequestLocation.objects.create(emergency=emergency, latitude=6.5244, longitude=3.3792)
+        return emergency, enqueue_dispatch(emergency)
+
+    def job(self, job):
+        return DispatchJob.objects.get(pk=job.pk)
+
+    @override_settings(DISPATCH_ASYNC=True)
+    def test_post_answers_202_and_a_worker_assigns_the_request(self):
+        client = APIClient()
+        client.force_authenticate(self.patient)
+        response = client.post(
+            "/v1/emergency-requests/",
+            {"severity": "high", "location": {"latitude": 6.5244, "longitude": 3.3792}},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 202)
+        data = response.json()["data"]
+        self.assertEqual(data["dispatchStatus"], DispatchStatus.PENDING)
+        self.assertIsNone(data["ambulance"])
+        job = DispatchJob.objects.get(emergency_id=data["id"])
+        self.assertIsNotNone(job.region)
+
+        self.assertEqual(DispatchWorker(name="worker-1").run_once(), 1)
+        self.assertEqual(self.job(job).status, DispatchJobStatus.DONE)
+        data = client.get(f"/v1/emergency-requests/{data['id']}/").json()["data"]
+        self.assertEqual(data["dispatchStatus"], DispatchStatus.ASSIGNED)
+        self.assertIsNotNone(data["ambulance"])
+
+    def test_a_lapsed_lease_is_handed_to_another_worker(self):
+        emergency, job = self.queued()
+        (leased,) = claim_dispatch_jobs("worker-1", 10)
+        self.assertEqual(claim_dispatch_jobs("worker-2", 10), [])
+
+        DispatchJob.objects.filter(pk=job.pk).update(locked_until=timezone.now() - timedelta(seconds=1))
+        (released,) = claim_dispatch_jobs("worker-2", 10)
+        self.assertEqual((released.locked_by, released.attempts), ("worker-2", 2))
+
+        # The first worker's late result does not settle the job it lost
+        run_dispatch_jobs([leased])
+        self.assertEqual(self.job(job).status, DispatchJobStatus.RUNNING)
+        run_dispatch_jobs([released])
+        self.assertEqual(self.job(job).status, DispatchJobStatus.DONE)
+        # Assigned once, by whichever worker got there first
+        self.assertEqual(EmergencyRequest.objects.filter(ambulance__isnull=False).count(), 1)
+
+    @override_settings(DISPATCH_JOB_MAX_ATTEMPTS=2)
+    def test_failed_batches_are_retried_with_backoff_then_failed(self):
+        emergency, job = self.queued()
+        worker = DispatchWorker(name="worker-1")
+        failing = mock.patch(
+            "apps.emergency.v1.services.assign_ambulances_in_batch", side_effect=RuntimeError("down")
+        )
+        with failing, self.assertLogs("apps.emergency.workers", "ERROR") as logs:
+            self.assertEqual(worker.run_once(), 1)
+            retried = self.job(job)
+            self.assertEqual(retried.status, DispatchJobStatus.PENDING)
+            self.assertEqual((retried.attempts, retried.last_error), (1, "down"))
+            self.assertGreater(retried.available_at, timezone.now())
+            self.assertEqual(worker.run_once(), 0)
+
+            DispatchJob.objects.filter(pk=job.pk).update(available_at=timezone.now())
+            self.assertEqual(worker.run_once(), 1)
+        self.assertEqual(len(logs.records), 2)
+        failed = self.job(job)
+        self.assertEqual((failed.status, failed.attempts), (DispatchJobStatus.FAILED, 2))
+        emergency.refresh_from_db()
+        self.assertEqual(emergency.dispatch_status, DispatchStatus.WAITING)
+        self.assertEqual(claim_dispatch_jobs("worker-1", 10), [])
+
+    def resolve(self, emergency):
+        EmergencyRequest.objects.filter(pk=emergency.pk).update(is_resolved=True)
+        resolved = EmergencyRequest.objects.get(pk=emergency.pk)
+        resolve_emergency(resolved)
+        return resolved
+
+    def test_a_request_resolved_while_queued_gets_no_unit(self):
+        emergency, job = self.queued()
+        resolved = self.resolve(emergency)
+        self.assertEqual(self.job(job).status, DispatchJobStatus.DONE)
+        self.assertEqual(claim_dispatch_jobs("worker-1", 10), [])
+
+        # A worker that leased the job before the request was resolved
+        emergency, job = self.queued()
+        (leased,) = claim_dispatch_jobs("worker-1", 10)
+        self.resolve(emergency)
+        self.assertEqual(run_dispatch_jobs([leased]), {emergency.pk: None})
+        self.assertEqual(self.job(job).status, DispatchJobStatus.DONE)
+        emergency.refresh_from_db()
+        self.assertIsNone(emergency.ambulance_id)
+        self.assertEqual(emergency.dispatch_status, DispatchStatus.PENDING)
+        self.assertFalse(Ambulance.objects.filter(status=StatusEnum.BUSY).exists())
+
+        # Nor does the greedy path attach one to a stale copy of the request
+        self.assertIsNone(assign_nearest_ambulance(leased.emergency))
+        self.assertIsNone(assign_ambulances_in_batch([resolved])[resolved.pk])
+        self.assertFalse(Ambulance.objects.filter(status=StatusEnum.BUSY).exists())
+
+
+class QuantileSketchTests(SimpleTestCase):
+    def sketch(self, values):
+        sketch = QuantileSketch()
+        sketch.add_many(values)
+        return sketch
+
+    def test_quantiles_are_within_the_relative_accuracy(self):
+        # Response times in seconds: long-tailed, with some instant ones
+        values = np.random.default_rng(0).lognormal(5, 1, 20_000).tolist() + [0.0] * 100
+        sketch = self.sketch(values)
+        self.assertEqual(sketch.count, len(values))
+        ordered = sorted(values)
+        for q in (0.0, 0.001, 0.1, 0.5, 0.9, 0.99, 0.999, 1.0):
+            with self.subTest(q=q):
+                exact = ordered[int(q * (len(ordered) - 1))]
+                self.assertLessEqual(abs(sketch.quantile(q) - exact), RELATIVE_ACCURACY * exact)
+        self.assertIsNone(QuantileSketch().quantile(0.5))
+
+    def test_merging_is_associative_and_matches_one_sketch(self):
+        rng = np.random.default_rng(1)
+        parts = [rng.exponential(60, 500).tolist() + [0.0] for _ in range(3)]
+        a, b, c = (self.sketch(part) for part in parts)
+        # (a + b) + c
+        left = self.sketch([])
+        left.merge(a)
+        left.merge(b)
+        left.merge(c)
+        # a + (b + c)
+        tail = self.sketch([])
+        tail.merge(b)
+        tail.merge(c)
+        right = self.sketch([])
+        right.merge(a)
+        right.merge(tail)
+        whole = self.sketch(parts[0] + parts[1] + parts[2])
+        self.assertEqual((left.zeros, left.bins), (whole.zeros, whole.bins))
+        self.assertEqual((right.zeros, right.bins), (whole.zeros, whole.bins))
+
+    def test_bytes_round_trip(self):
+        sketch = self.sketch([0.0, 0.0005, 0.002, 1.0, 1.0, 59.9, 3600.0, 86_400.0])
+        restored = QuantileSketch.from_bytes(sketch.to_bytes())
+        self.assertEqual((restored.zeros, restored.bins), (sketch.zeros, sketch.bins))
+        self.assertEqual(restored.to_bytes(), sketch.to_bytes())
+        # Empty and missing columns read back as empty sketches
+        self.assertEqual(QuantileSketch.from_bytes(QuantileSketch().to_bytes()).count, 0)
+        self.assertEqual(QuantileSketch.from_bytes(None).count, 0)
+        self.assertEqual(QuantileSketch.from_bytes(memoryview(sketch.to_bytes())).bins, sketch.bins)
+
+
+class ResponseRollupTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(
+            username="admin", email="admin@example.com", password="x", role=UserTypesEnum.ADMIN
+        )
+        create_city(SyntheticCity(seed=0), 2, 6)
+
+    def setUp(self):
+        ambulance_index.invalidate()
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def request(self, severity, minutes_ago):
+        emergency = EmergencyRequest.objects.create(severity=severity)
+        EmergencyRequestLocation.objects.create(emergency=emergency, latitude=6.5244, longitude=3.3792)
+        EmergencyRequest.objects.filter(pk=emergency.pk).update(
+            date_created=timezone.now() - timedelta(minutes=minutes_ago)
+        )
+        return EmergencyRequest.objects.get(pk=emergency.pk)
+
+    def rollups(self):
+        return {
+            (r.bucket_start, r.severity, r.hospital_id): {
+                metric: (
+                    getattr(r, f"{metric}_count"),
+                    getattr(r, f"{metric}_seconds"),
+                    bytes(getattr(r, f"{metric}_sketch")),
+                )
+                for metric in ResponseMetric
+            }
+            for r in EmergencyRollup.objects.all()
+        }
+
+    def counts(self):
+        rollup = EmergencyRollup.objects.get()
+        return [getattr(rollup, f"{metric}_count") for metric in ResponseMetric]
+
+    def test_rollups_follow_assign_arrive_and_resolve(self):
+        emergency = self.request("high", 10)
+        assign_nearest_ambulance(emergency)
+        emergency.refresh_from_db()
+        self.assertEqual(self.counts(), [1, 0, 0])
+        rollup = EmergencyRollup.objects.get()
+        self.assertEqual((rollup.severity, rollup.hospital_id), ("high", emergency.ambulance.hospital_id))
+        self.assertEqual(rollup.bucket_start, emergency.date_created.replace(minute=0, second=0, microsecond=0))
+        self.assertAlmostEqual(rollup.dispatch_seconds, 600, delta=5)
+
+        arrival = f"/v1/emergency-requests/{emergency.pk}/arrival/"
+        response = self.client.post(arrival)
+        self.assertEqual(response.status_code, 200)
+        self.assertAlmostEqual(response.json()["data"]["responseTimeSeconds"], 600, delta=5)
+        self.assertEqual(self.client.post(arrival).status_code, 409)
+        self.assertEqual(self.counts(), [1, 1, 0])
+
+        response = self.client.patch(f"/v1/emergency-requests/{emergency.pk}/", {"isResolved": True}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.counts(), [1, 1, 1])
+        # A repeated resolve is not counted again
+        resolve_emergency(emergency)
+        self.assertEqual(self.counts(), [1, 1, 1])
+
+        unassigned = self.request("low", 0)
+        self.assertEqual(self.client.post(f"/v1/emergency-requests/{unassigned.pk}/arrival/").status_code, 400)
+
+    def test_rebuild_matches_the_incremental_rollups(self):
+        emergencies = [
+            self.request(severity, minutes)
+            for severity, minutes in (("high", 200), ("high", 190), ("low", 130), ("critical", 70), ("low", 5))
+        ]
+        for i, emergency in enumerate(emergencies):
+            assign_nearest_ambulance(emergency)
+            emergency.refresh_from_db()
+            if i % 2 == 0:
+                record_arrival(emergency)
+            if i % 3 == 0:
+                resolve_emergency(emergency)
+        incremental = self.rollups()
+        self.assertGreater(len(incremental), 1)
+
+        self.assertEqual(rebuild_rollups(batch_size=2), len(incremental))
+        rebuilt = self.rollups()
+        self.assertEqual(set(rebuilt), set(incremental))
+        for key, metrics in incremental.items():
+            for metric, (count, seconds, sketch) in metrics.items():
+                with self.subTest(key=key, metric=metric):
+                    self.assertEqual(rebuilt[key][metric][0], count)
+                    self.assertAlmostEqual(rebuilt[key][metric][1], seconds, places=3)
+                    self.assertEqual(rebuilt[key][metric][2], sketch)
+
+
+class ResponseAnalyticsTests(TestCase):
+    start = datetime(2025, 1, 1, 8, 0, tzinfo=dt_timezone.utc)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(
+            username="admin", email="admin@example.com", password="x", role=UserTypesEnum.ADMIN
+        )
+        cls.h1, cls.h2 = (
+            Hospital.objects.create(name=name, contact_number="0", address="Lagos") for name in ("H1", "H2")
+        )
+        hour = timedelta(hours=1)
+        update_rollups(ResponseMetric.DISPATCH, {
+            (cls.start, "high", cls.h1.pk): [10.0, 20.0],
+            (cls.start, "low", cls.h2.pk): [30.0],
+            (cls.start + hour, "high", cls.h2.pk): [40.0],
+            (cls.start + 24 * hour, "high", cls.h1.pk): [50.0],
+        })
+        update_rollups(ResponseMetric.RESPONSE, {(cls.start, "high", cls.h1.pk): [300.0]})
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def analytics(self, start=None, end=None, **params):
+        start = start or self.start + timedelta(minutes=30)
+        end = end or self.start + timedelta(days=1)
+        response = self.client.get(
+            "/v1/emergency-requests/analytics/", {"start": start.isoformat(), "end": end.isoformat(), **params}
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.json()["data"]
+
+    def test_groups_by_severity_within_the_window(self):
+        # The start falls inside the first hour, which is included; the
+        # bucket starting exactly at `end` is not
+        high, low = self.analytics()
+        self.assertEqual((high["group"], low["group"]), ("high", "low"))
+        self.assertEqual(high["dispatch"]["count"], 3)
+        self.assertEqual(high["dispatch"]["meanSeconds"], 23.3)
+        self.assertAlmostEqual(high["dispatch"]["p50Seconds"], 20, delta=20 * RELATIVE_ACCURACY + 0.1)
+        self.assertEqual(high["response"]["count"], 1)
+        self.assertEqual(low["dispatch"]["count"], 1)
+        self.assertEqual(low["response"]["count"], 0)
+        self.assertEqual({value for key, value in low["response"].items() if key != "count"}, {None})
+
+        (high, _) = self.analytics(end=self.start + timedelta(days=1, seconds=1))
+        self.assertEqual(high["dispatch"]["count"], 4)
+        (high,) = self.analytics(start=self.start + timedelta(hours=1))
+        self.assertEqual(high["dispatch"]["count"], 1)
+
+    def test_groups_by_hospital_hour_and_day(self):
+        by_hospital = {row["group"]: row["dispatch"]["count"] for row in self.analytics(groupBy="hospital")}
+        self.assertEqual(by_hospital, {str(self.h1.pk): 2, str(self.h2.pk): 2})
+        by_hour = [row["dispatch"]["count"] for row in self.analytics(groupBy="hour")]
+        self.assertEqual(by_hour, [3, 1])
+        by_day = self.analytics(groupBy="day", end=self.start + timedelta(days=2))
+        self.assertEqual([row["dispatch"]["count"] for row in by_day], [4, 1])
+
+    def test_filters_and_validation(self):
+        (row,) = self.analytics(severity="high", hospital=str(self.h2.pk))
+        self.assertEqual(row["dispatch"]["count"], 1)
+        response = self.client.get(
+            "/v1/emergency-requests/analytics/",
+            {"start": self.start.isoformat(), "end": (self.start - timedelta(hours=1)).isoformat()},
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get("/v1/emergency-requests/analytics/").status_code, 400)
+        self.client.force_authenticate(None)
+        response = self.client.get("/v1/emergency-requests/analytics/", {"start": "2025-01-01", "end": "2025-01-02"})
+        self.assertEqual(response.status_code, 401)
+
+
+class SeedDataTests(TestCase):
+    args = ["--users", "6", "--admins", "1", "--hospitals", "2", "--ambulances", "4", "--emergencies", "60"]
+
+    def seed(self, *extra):
+        call_command("seed_data", *self.args, "--batch-size", "25", *extra, stdout=io.StringIO())
+        emergencies = list(
+            EmergencyRequest.objects.order_by("pk").values_list(
+                "pk", "user_id", "ambulance_id", "severity", "is_resolved", "date_created",
+                "assigned_at", "arrived_at", "resolved_at", "location__latitude", "location__longitude",
+            )
+        )
+        rollups = list(
+            EmergencyRollup.objects.order_by("bucket_start", "severity", "hospital_id").values_list(
+                "bucket_start", "severity", "hospital_id", "dispatch_count", "response_count", "resolution_count"
+            )
+        )
+        for model in (EmergencyRequest, Ambulance, Hospital, User):
+            model.objects.all().delete()
+        return emergencies, rollups
+
+    def test_a_fixed_until_makes_runs_identical(self):
+        until = "2025-01-01T00:00:00Z"
+        first = self.seed("--until", until)
+        self.assertEqual(len(first[0]), 60)
+        self.assertTrue(first[1])
+        self.assertEqual(self.seed("--until", until), first)
+
+        emergencies, _ = first
+        created = [row[5] for row in emergencies]
+        self.assertLessEqual(max(created), datetime(2025, 1, 1, tzinfo=dt_timezone.utc))
+        self.assertGreaterEqual(min(created), datetime(2024, 1, 2, tzinfo=dt_timezone.utc))
+
+    def test_runs_without_until_only_share_their_rows(self):
+        first, second = self.seed(), self.seed()
+        self.assertEqual([row[:5] for row in first[0]], [row[:5] for row in second[0]])
+        self.assertNotEqual([row[5] for row in first[0]], [row[5] for row in second[0]])
+
+    def test_an_invalid_until_is_refused(self):
+        with self.assertRaises(CommandError):
+            call_command("seed_data", "--until", "yesterday")
+
+
+class SimulateDispatchTests(TransactionTestCase):
+    def test_the_report_covers_every_measurement(self):
+        out = io.StringIO()
+        # Already inside the test database, which the command must not replace
+        with mock.patch(
+            "apps.emergency.management.commands.simulate_dispatch.throwaway_database", contextlib.nullcontext
+        ):
+            call_command(
+                "simulate_dispatch", "--hospitals", "2", "--ambulances", "10", "--patients", "3",
+                "--requests", "6", "--rate", "1000", "--concurrency", "2", stdout=out,
+            )
+        report = json.loads(out.getvalue())
+        self.assertEqual(
+            set(report),
+            {
+                "config", "durationSeconds", "throughputPerSecond", "statusCodes",
+                "assigned", "latencyMs", "queriesPerRequest", "assignmentDistanceKm",
+            },
+        )
+        self.assertEqual(report["config"]["requests"], 6)
+        self.assertEqual(sum(report["statusCodes"].values()), 6)
+        self.assertEqual(report["assigned"], 6)
+        for summary in ("latencyMs", "queriesPerRequest", "assignmentDistanceKm"):
+            self.assertEqual(set(report[summary]), {"mean", "p50", "p95", "p99", "max"})
 
-# Create your tests here.
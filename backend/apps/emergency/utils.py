@@ -1,3 +1,4 @@
+from apps.ambulance.utils import AmbulanceTypeEnum
 from utils.main import BaseStrEnum
 
 
@@ -7,3 +8,71 @@ class SeverityLevel(BaseStrEnum):
     HIGH = "high"
     CRITICAL = "critical"
 
+    @property
+    def priority(self) -> int:
+        """Dispatch priority, lower is more urgent."""
+        return SEVERITY_PRIORITY[self]
+
+
+class DispatchStatus(BaseStrEnum):
+    PENDING = "pending"
+    ASSIGNED = "assigned"
+    WAITING = "waiting"
+
+
+class ResponseMetric(BaseStrEnum):
+    """Durations tracked by the rollups, all measured from request creation."""
+    DISPATCH = "dispatch"  # until an ambulance is assigned
+    RESPONSE = "response"  # until the ambulance arrives
+    RESOLUTION = "resolution"  # until the emergency is resolved
+
+
+class ExportFormat(BaseStrEnum):
+    NDJSON = "ndjson"
+    CSV = "csv"
+
+
+class DispatchJobStatus(BaseStrEnum):
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+
+SEVERITY_PRIORITY = {
+    SeverityLevel.CRITICAL: 0,
+    SeverityLevel.HIGH: 1,
+    SeverityLevel.MEDIUM: 2,
+    SeverityLevel.LOW: 3,
+}
+
+# Ambulance types to try for each severity, best-suited tier first. Later
+# tiers are only searched when no unit of an earlier tier is free.
+_PREFERRED_TIERS = {
+    SeverityLevel.CRITICAL: [
+        (AmbulanceTypeEnum.ICU, AmbulanceTypeEnum.ALS),
+        (AmbulanceTypeEnum.BLS,),
+    ],
+    SeverityLevel.HIGH: [
+        (AmbulanceTypeEnum.ALS, AmbulanceTypeEnum.ICU),
+        (AmbulanceTypeEnum.BLS,),
+    ],
+    SeverityLevel.MEDIUM: [
+        (AmbulanceTypeEnum.BLS,),
+        (AmbulanceTypeEnum.ALS, AmbulanceTypeEnum.ICU),
+    ],
+    SeverityLevel.LOW: [
+        (AmbulanceTypeEnum.BLS, AmbulanceTypeEnum.PTA),
+        (AmbulanceTypeEnum.ALS,),
+    ],
+}
+
+
+def _with_catch_all(tiers):
+    # A last tier of every type not listed yet (PTA, air and water units),
+    # so a request is never left waiting while any unit is free
+    listed = {t for tier in tiers for t in tier}
+    return tiers + [tuple(t for t in AmbulanceTypeEnum if t not in listed)]
+
+
+DISPATCH_TIERS = {severity: _with_catch_all(tiers) for severity, tiers in _PREFERRED_TIERS.items()}
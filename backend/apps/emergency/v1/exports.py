@@ -0,0 +1,92 @@
+"""
+Streaming NDJSON and CSV encoding of exported emergency history.
+
+Rows arrive from a chunked database iterator and are encoded one chunk
+at a time, each chunk written to the client before the next is fetched,
+so an export holds one chunk in memory however long it is.
+"""
+import csv
+import datetime
+import io
+from typing import Iterable, Iterator, List, Sequence
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+
+from apps.emergency.utils import ExportFormat
+from utils.renderers import dumps
+
+CONTENT_TYPES = {
+    ExportFormat.NDJSON: "application/x-ndjson",
+    ExportFormat.CSV: "text/csv; charset=utf-8",
+}
+
+
+def _chunks(rows: Iterable[tuple], size: int) -> Iterator[List[tuple]]:
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def ndjson_chunks(columns: Sequence[str], rows: Iterable[tuple], size: int) -> Iterator[bytes]:
+    """One JSON object per line, encoded like the API's responses."""
+    for chunk in _chunks(rows, size):
+        yield b"".join([dumps(dict(zip(columns, row))) + b"\n" for row in chunk])
+
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, datetime.datetime):
+        # ISO 8601 with a `Z` suffix, as in the NDJSON export
+        text = value.isoformat()
+        return text[:-6] + "Z" if text.endswith("+00:00") else text
+    return value
+
+
+def csv_chunks(columns: Sequence[str], rows: Iterable[tuple], size: int) -> Iterator[bytes]:
+    """A header line, then one line per row; empty cells are nulls."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for chunk in _chunks(rows, size):
+        writer.writerows([_csv_value(value) for value in row] for row in chunk)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+async def _async_chunks(chunks: Iterator[bytes]):
+    # Each chunk is fetched on the request's sync thread, where its
+    # database connection and cursor live
+    fetch = sync_to_async(next, thread_sensitive=True)
+    while (chunk := await fetch(chunks, None)) is not None:
+        yield chunk
+
+
+def export_response(
+    request, columns: Sequence[str], rows: Iterable[tuple], export_format: str, filename: str
+) -> StreamingHttpResponse:
+    """
+    Stream `rows` as an `export_format` attachment. Under ASGI the body is
+    an async iterator; Django would otherwise read a sync one to the end
+    before sending the first byte.
+    """
+    encode = csv_chunks if export_format == ExportFormat.CSV else ndjson_chunks
+    chunks = encode(columns, rows, settings.EMERGENCY_EXPORT_CHUNK_SIZE)
+    if isinstance(request, ASGIRequest):
+        chunks = _async_chunks(chunks)
+    response = StreamingHttpResponse(chunks, content_type=CONTENT_TYPES[export_format])
+    response["Content-Disposition"] = f'attachment; filename="{filename}.{export_format}"'
+    return response
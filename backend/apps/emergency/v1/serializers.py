@@ -4,12 +4,13 @@ from rest_framework import serializers
 from apps.emergency.models import EmergencyRequest, EmergencyRequestLocation
 from apps.ambulance.models import Ambulance
 from apps.hospital.models import Hospital
-from apps.emergency.utils import SeverityLevel
+from apps.emergency.utils import ExportFormat, SeverityLevel
+from utils.fields import LatitudeField, LongitudeField
 
 
 class EmergencyRequestLocationSerializer(serializers.ModelSerializer):
-    latitude = serializers.CharField()
-    longitude = serializers.CharField()
+    latitude = LatitudeField()
+    longitude = LongitudeField()
 
     class Meta:
         model = EmergencyRequestLocation
@@ -21,10 +22,48 @@ class EmergencyRequestSerializer(serializers.ModelSerializer):
     ambulance = serializers.PrimaryKeyRelatedField(read_only=True)
     severity = serializers.ChoiceField(choices=SeverityLevel.options_list())
     isResolved = serializers.BooleanField(required=False, source="is_resolved")
-    responseTimeSeconds = serializers.DateTimeField(required=False, source="response_time_seconds")
-    
+    responseTimeSeconds = serializers.IntegerField(read_only=True, source="response_time_seconds")
+    assignedAt = serializers.DateTimeField(read_only=True, source="assigned_at")
+    arrivedAt = serializers.DateTimeField(read_only=True, source="arrived_at")
+    resolvedAt = serializers.DateTimeField(read_only=True, source="resolved_at")
+    dispatchStatus = serializers.CharField(read_only=True, source="dispatch_status")
+    destinationHospital = serializers.PrimaryKeyRelatedField(read_only=True, source="destination_hospital")
+
 
     class Meta:
         model = EmergencyRequest
-        fields = ['id', 'severity', 'ambulance', 'location', 'isResolved', 'responseTimeSeconds']
+        fields = [
+            'id', 'severity', 'ambulance', 'location', 'isResolved', 'responseTimeSeconds',
+            'dispatchStatus', 'destinationHospital', 'assignedAt', 'arrivedAt', 'resolvedAt',
+        ]
         read_only_fields = ['ambulance', 'isResolved', 'responseTimeSeconds']
+
+
+class ResponseAnalyticsQuerySerializer(serializers.Serializer):
+    start = serializers.DateTimeField()
+    end = serializers.DateTimeField()
+    severity = serializers.ChoiceField(choices=SeverityLevel.options_list(), required=False)
+    hospital = serializers.UUIDField(required=False)
+    groupBy = serializers.ChoiceField(
+        choices=["severity", "hospital", "hour", "day"], default="severity", source="group_by"
+    )
+
+    def validate(self, attrs):
+        if attrs["start"] > attrs["end"]:
+            raise serializers.ValidationError("start must not be after end.")
+        return attrs
+
+
+class EmergencyExportQuerySerializer(serializers.Serializer):
+    start = serializers.DateTimeField(required=False)
+    end = serializers.DateTimeField(required=False)
+    severity = serializers.ChoiceField(choices=SeverityLevel.options_list(), required=False)
+    # Not `format`, which DRF reserves for picking a renderer
+    exportFormat = serializers.ChoiceField(
+        choices=ExportFormat.options_list(), default=ExportFormat.NDJSON, source="export_format"
+    )
+
+    def validate(self, attrs):
+        if attrs.get("start") and attrs.get("end") and attrs["start"] > attrs["end"]:
+            raise serializers.ValidationError("start must not be after end.")
+        return attrs
@@ -1,68 +1,848 @@
-from math import radians, cos, sin, asin, sqrt
-from apps.ambulance.models import Ambulance, AmbulanceLocation
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from apps.ambulance.index import ambulance_index
+from apps.ambulance.models import Ambulance
 from apps.ambulance.utils import StatusEnum
-from apps.emergency.models import EmergencyRequest, EmergencyRequestLocation
+from apps.ambulance.v1.services import claim_ambulance, claim_ambulances, release_ambulance
+from apps.emergency.models import DispatchJob, EmergencyRequest, EmergencyRequestLocation, EmergencyRollup
+from apps.emergency.signals import emergency_assigned
+from apps.emergency.v1.streams import emergency_state, publish_emergency_states
+from apps.hospital.models import Hospital
+from apps.hospital.v1.services import select_destination
+from apps.emergency.utils import (
+    DISPATCH_TIERS,
+    SEVERITY_PRIORITY,
+    DispatchJobStatus,
+    DispatchStatus,
+    ResponseMetric,
+    SeverityLevel,
+)
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import (
+    Avg, Case, Count, DurationField, ExpressionWrapper, F, IntegerField, Max, Min, Q, Subquery, Value, When,
+)
 from django.utils import timezone
-from datetime import timedelta
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+from utils.assignment import min_cost_assignment
+from utils.regions import ShardPlan, region_of
+from utils.geo import distance_matrix, haversine_distance, haversine_many
+from utils.routing import get_eta_engine
+from utils.sketch import QuantileSketch
 
+# How long an assigned ambulance stays busy
+BUSY_DURATION = timedelta(minutes=30)
 
-def haversine_distance(lat1, lon1, lat2, lon2):
-    lat1, lon1, lat2, lon2 = map(float, (lat1, lon1, lat2, lon2))
+# Candidates fetched from the index per claim round
+CLAIM_CANDIDATES = 8
 
-    # Earth radius in km
-    R = 6371.0
+# Upper bound on candidates gathered per request for batch matching
+BATCH_CANDIDATES = 64
 
-    dlat = radians(lat2 - lat1)
-    dlon = radians(lon2 - lon1)
+# Waiting requests tried per re-dispatch before giving up
+WAITING_SCAN = 50
 
-    a = sin(dlat / 2) ** 2 + cos(radians(lat1)) * cos(radians(lat2)) * sin(dlon / 2) ** 2
-    c = 2 * asin(sqrt(a))
 
-    return R * c
+class NoAmbulanceAvailable(Exception):
+    def __init__(self, message="No available ambulances"):
+        super().__init__(message)
 
 
+class AlreadyAssigned(Exception):
+    """Another worker assigned the emergency while we were claiming a unit."""
+
+
+def severity_priority(field: str = "severity"):
+    """Expression ranking rows by the severity in `field`, most urgent lowest."""
+    return Case(
+        *[When(**{field: s}, then=Value(p)) for s, p in SEVERITY_PRIORITY.items()],
+        output_field=IntegerField(),
+    )
+
+
+def dispatch_tiers(severity: str):
+    """Ambulance type groups to search for a severity, best-suited first."""
+    return DISPATCH_TIERS.get(SeverityLevel(severity), [None])
+
+
+def rank_by_eta(lat, lon, nearest: List) -> List:
+    """
+    Re-order the top `DISPATCH_ETA_TOP_K` straight-line candidates by road
+    travel time when a road graph is configured. Candidates without a
+    route keep their place behind those that have one.
+    """
+    engine = get_eta_engine()
+    if engine is None or len(nearest) < 2:
+        return nearest
+
+    top, rest = nearest[: settings.DISPATCH_ETA_TOP_K], nearest[settings.DISPATCH_ETA_TOP_K :]
+    timed = []
+    for distance, pk in top:
+        position = ambulance_index.position(pk)
+        eta = engine.eta(*position, lat, lon) if position else None
+        timed.append((eta is None, eta or 0.0, distance, pk))
+    timed.sort(key=lambda row: row[:3])
+    return [(distance, pk) for _, _, distance, pk in timed] + rest
+
+
+def assign_nearest_ambulance(emergency: EmergencyRequest) -> Optional[Ambulance]:
+    # Assignment is idempotent: workers may see the same request twice. A
+    # request resolved before a unit was attached gets none (None is returned)
+    if emergency.ambulance_id is not None:
+        return emergency.ambulance
 
-def assign_nearest_ambulance(emergency: EmergencyRequest) -> Ambulance:
     # Get patient coordinates
     patient_location = emergency.location
     patient_lat = patient_location.latitude
     patient_lon = patient_location.longitude
 
-    # Step 1: Refresh all busy ambulances (expire if 30 mins passed)
-    for ambulance in Ambulance.objects.filter(status="busy", busy_until__isnull=False):
-        if timezone.now() > ambulance.busy_until:
-            ambulance.status = StatusEnum.AVAILABLE
-            ambulance.busy_until = None
-            ambulance.save()
-
-    # Step 2: Get available ambulances with valid locations
-    ambulances = Ambulance.objects.filter(status=StatusEnum.AVAILABLE, location__isnull=False)
-
-    if not ambulances.exists():
-        raise Exception("No available ambulances") # TODO: RETURN A BETTER ERROR HERE
-
-    # Step 3: Calculate distance to each available ambulance
-    distances = []
-    for amb in ambulances:
-        amb_loc = amb.location
-        distance = haversine_distance(
-            patient_lat, patient_lon, amb_loc.latitude, amb_loc.longitude
+    # Step 1: Walk the closest capable candidates from the spatial index (by
+    # road ETA when a road graph is loaded) and claim the first one still
+    # free, widening to the next tier of ambulance types only when a tier
+    # has nothing left. Units whose busy_until has passed count as
+    # available; persisting their release is left to `release_ambulances`.
+    # Lost claims drop out of the index, so each round sees fresh units.
+    # With no unit free, take one still on its way to a less urgent request.
+    ambulance_id = preempted_id = None
+    try:
+        with transaction.atomic():
+            ambulance_id = _claim_nearest(emergency.severity, patient_lat, patient_lon)
+            if ambulance_id is None and settings.DISPATCH_PREEMPTION:
+                ambulance_id, preempted_id = _preempt_nearest(emergency.severity, patient_lat, patient_lon)
+            if ambulance_id is None:
+                raise NoAmbulanceAvailable()
+
+            # Step 2: Attach ambulance and destination hospital to emergency,
+            # unless another worker got there first or the request has been
+            # resolved meanwhile, in which case our claim is rolled back
+            destination_id = select_destination(patient_lat, patient_lon)
+            now = timezone.now()
+            attached = EmergencyRequest.objects.filter(
+                pk=emergency.pk, ambulance__isnull=True, is_resolved=False
+            ).update(
+                ambulance_id=ambulance_id,
+                # Through a subquery, so a hospital deleted since the index
+                # was loaded leaves the destination empty instead of failing
+                destination_hospital_id=Subquery(Hospital.objects.filter(pk=destination_id).values("pk")),
+                dispatch_status=DispatchStatus.ASSIGNED,
+                assigned_at=now,
+                last_updated=now,
+            )
+            if not attached:
+                raise AlreadyAssigned()
+            emergency.assigned_at = now
+            record_transitions(ResponseMetric.DISPATCH, [emergency], {emergency.pk: ambulance_id})
+            emergency_assigned.send(sender=EmergencyRequest, assignments={emergency.pk: ambulance_id})
+            if preempted_id is not None:
+                state = emergency_state(preempted_id, DispatchStatus.WAITING, None, False)
+                transaction.on_commit(lambda: publish_emergency_states([state]))
+    except AlreadyAssigned:
+        # Rolled back: the unit was never marked busy in the index, and a
+        # pre-empted one goes back to its request
+        emergency.refresh_from_db(
+            fields=["ambulance", "destination_hospital", "dispatch_status", "assigned_at", "is_resolved"]
+        )
+        return emergency.ambulance
+
+    emergency.ambulance_id = ambulance_id
+    emergency.refresh_from_db(fields=["destination_hospital"])
+    emergency.dispatch_status = DispatchStatus.ASSIGNED
+    return emergency.ambulance
+
+
+def _claim_nearest(severity: str, patient_lat, patient_lon):
+    """Claim the best free unit for a patient, or return None if there is none."""
+    ambulance_id = None
+    for types in dispatch_tiers(severity):
+        for _ in range(settings.DISPATCH_CLAIM_ROUNDS):
+            nearest = ambulance_index.nearest(
+                patient_lat, patient_lon, k=CLAIM_CANDIDATES, types=types
+            )
+            if not nearest:
+                break
+            nearest = rank_by_eta(patient_lat, patient_lon, nearest)
+            ambulance_id = next(
+                (pk for _, pk in nearest if claim_ambulance(pk, BUSY_DURATION)), None
+            )
+            if ambulance_id is not None:
+                return ambulance_id
+
+    # A sharded dispatcher only indexes its own area; look further afield
+    if ambulance_index.restricted:
+        return _claim_from_database(severity, patient_lat, patient_lon)
+    return None
+
+
+def _claim_from_database(severity: str, patient_lat, patient_lon):
+    """Claim the closest free unit anywhere in the fleet, tier by tier."""
+    dispatchable = Ambulance.objects.dispatchable().filter(latitude__isnull=False)
+    for types in dispatch_tiers(severity):
+        candidates = dispatchable.filter(ambulance_type__in=types) if types else dispatchable
+        rows = list(candidates.values_list("id", "latitude", "longitude"))
+        if not rows:
+            continue
+        ids, lats, lons = zip(*rows)
+        order = np.argsort(haversine_many(patient_lat, patient_lon, lats, lons))
+        for i in order[: CLAIM_CANDIDATES * settings.DISPATCH_CLAIM_ROUNDS]:
+            if claim_ambulance(ids[i], BUSY_DURATION):
+                return ids[i]
+    return None
+
+
+def _preempt_nearest(severity: str, patient_lat, patient_lon):
+    """
+    Take the closest capable unit that is still on its way to a less urgent
+    request, tier by tier, and put that request back to waiting. Returns
+    `(ambulance_id, emergency_id)` of the unit and the request it was taken
+    from, or `(None, None)`. Must run in the caller's transaction, so the
+    request keeps its unit if the caller's assignment is rolled back.
+    """
+    priority = SeverityLevel(severity).priority
+    less_urgent = [s for s in SeverityLevel if s.priority > priority]
+    if not less_urgent:
+        return None, None
+
+    en_route = EmergencyRequest.objects.filter(
+        severity__in=less_urgent,
+        is_resolved=False,
+        arrived_at__isnull=True,
+        ambulance__status=StatusEnum.BUSY,
+        ambulance__latitude__isnull=False,
+    )
+    for types in dispatch_tiers(severity):
+        candidates = en_route.filter(ambulance__ambulance_type__in=types) if types else en_route
+        rows = list(
+            candidates.values_list("pk", "ambulance_id", "ambulance__latitude", "ambulance__longitude")
+        )
+        if not rows:
+            continue
+        ids, ambulance_ids, lats, lons = zip(*rows)
+        order = np.argsort(haversine_many(patient_lat, patient_lon, lats, lons))
+        for i in order[:CLAIM_CANDIDATES]:
+            now = timezone.now()
+            # Conditional, so two pre-emptions never take the same unit
+            taken = EmergencyRequest.objects.filter(
+                pk=ids[i], ambulance_id=ambulance_ids[i], arrived_at__isnull=True
+            ).update(
+                ambulance=None,
+                destination_hospital=None,
+                dispatch_status=DispatchStatus.WAITING,
+                assigned_at=None,
+                last_updated=now,
+            )
+            if taken:
+                # A new claim, so a late resolve of the old request keeps it busy
+                Ambulance.objects.filter(pk=ambulance_ids[i]).update(
+                    last_assigned=now, busy_until=now + BUSY_DURATION, last_updated=now
+                )
+                return ambulance_ids[i], ids[i]
+    return None, None
+
+
+def _match_requests(requests, locations, types, taken) -> List:
+    """
+    Min-cost matching of `requests` against the nearest free units of the
+    given types, ignoring units already in `taken`. Returns
+    `(emergency, ambulance_id)` pairs.
+    """
+    per_request = min(len(requests) + CLAIM_CANDIDATES, BATCH_CANDIDATES)
+    candidates = {}
+    for emergency in requests:
+        lat, lon = locations[emergency.pk]
+        for _, pk in ambulance_index.nearest(lat, lon, k=per_request, types=types, exclude=taken):
+            candidates.setdefault(pk, ambulance_index.position(pk))
+    candidates = {pk: position for pk, position in candidates.items() if position}
+    if not candidates:
+        return []
+
+    ids = list(candidates)
+    cost = distance_matrix(
+        [locations[e.pk][0] for e in requests],
+        [locations[e.pk][1] for e in requests],
+        [candidates[pk][0] for pk in ids],
+        [candidates[pk][1] for pk in ids],
+    )
+    return [(requests[row], ids[col]) for row, col in min_cost_assignment(cost)]
+
+
+def assign_ambulances_in_batch(emergencies: List[EmergencyRequest]) -> Dict:
+    """
+    Assign a burst of emergencies together so that total travel distance is
+    minimised, instead of letting each request greedily take its nearest
+    unit. Severity classes are matched in priority order, so under
+    contention critical calls take the units they need before lower ones
+    are considered. Returns a mapping of emergency id to ambulance id (or
+    None).
+    """
+    if not emergencies:
+        return {}
+
+    # Step 1: Load every patient location in one query
+    locations = {
+        pk: (lat, lon)
+        for pk, lat, lon in EmergencyRequestLocation.objects.filter(
+            emergency__in=emergencies
+        ).values_list("emergency_id", "latitude", "longitude")
+    }
+    requests = [e for e in emergencies if e.pk in locations]
+
+    # Step 2: Match each severity class, most urgent first, tier by tier
+    pairs = []
+    taken = set()
+    for severity in sorted(SeverityLevel, key=lambda s: s.priority):
+        group = [e for e in requests if e.severity == severity]
+        for types in dispatch_tiers(severity):
+            if not group:
+                break
+            matched = _match_requests(group, locations, types, taken)
+            pairs.extend(matched)
+            taken.update(pk for _, pk in matched)
+            matched_requests = {e.pk for e, _ in matched}
+            group = [e for e in group if e.pk not in matched_requests]
+
+    # Step 3: Commit every claim and assignment in one transaction, skipping
+    # requests another worker has assigned, or that were resolved, in the
+    # meantime
+    results = {e.pk: None for e in emergencies}
+    resolved = {e.pk for e in requests if e.is_resolved}
+    if pairs:
+        with transaction.atomic():
+            rows = (
+                EmergencyRequest.objects.select_for_update()
+                .filter(pk__in=[e.pk for e, _ in pairs])
+                .values_list("pk", "ambulance_id", "is_resolved")
+            )
+            current = {}
+            for pk, ambulance_id, is_resolved in rows:
+                current[pk] = ambulance_id
+                if is_resolved:
+                    resolved.add(pk)
+            results.update({pk: ambulance_id for pk, ambulance_id in current.items() if ambulance_id})
+            pairs = [
+                (e, pk) for e, pk in pairs if e.pk in current and not current[e.pk] and e.pk not in resolved
+            ]
+
+            claimed = claim_ambulances([pk for _, pk in pairs], BUSY_DURATION)
+            destinations = {e.pk: select_destination(*locations[e.pk]) for e, pk in pairs if pk in claimed}
+            hospitals = set(
+                Hospital.objects.filter(pk__in=set(destinations.values())).values_list("pk", flat=True)
+            )
+            now = timezone.now()
+            assigned = []
+            for emergency, ambulance_id in pairs:
+                if ambulance_id in claimed:
+                    emergency.ambulance_id = ambulance_id
+                    destination_id = destinations[emergency.pk]
+                    emergency.destination_hospital_id = destination_id if destination_id in hospitals else None
+                    emergency.dispatch_status = DispatchStatus.ASSIGNED
+                    emergency.assigned_at = now
+                    emergency.last_updated = now
+                    assigned.append(emergency)
+            attached = EmergencyRequest.objects.filter(ambulance__isnull=True, is_resolved=False).bulk_update(
+                assigned,
+                ["ambulance", "destination_hospital", "dispatch_status", "assigned_at", "last_updated"],
+            )
+            if attached < len(assigned):
+                # Where the row lock is not enforced a request can still be
+                # assigned or resolved after it was read; free those units
+                current = dict(
+                    EmergencyRequest.objects.filter(pk__in=[e.pk for e in assigned])
+                    .values_list("pk", "ambulance_id")
+                )
+                lost = [e for e in assigned if current[e.pk] != e.ambulance_id]
+                assigned = [e for e in assigned if current[e.pk] == e.ambulance_id]
+                for emergency in lost:
+                    release_ambulance(emergency.ambulance_id)
+                    emergency.refresh_from_db(fields=[
+                        "ambulance", "destination_hospital", "dispatch_status", "assigned_at", "is_resolved"
+                    ])
+                    results[emergency.pk] = emergency.ambulance_id
+                    if emergency.is_resolved:
+                        resolved.add(emergency.pk)
+            record_transitions(
+                ResponseMetric.DISPATCH, assigned, {e.pk: e.ambulance_id for e in assigned}
+            )
+            if assigned:
+                emergency_assigned.send(
+                    sender=EmergencyRequest,
+                    assignments={e.pk: e.ambulance_id for e in assigned},
+                )
+        results.update({e.pk: e.ambulance_id for e in assigned})
+
+    # Step 4: Requests whose unit was taken by another dispatcher in the
+    # meantime fall back to the greedy path
+    for emergency in requests:
+        if results[emergency.pk] is None and emergency.pk not in resolved:
+            try:
+                ambulance = assign_nearest_ambulance(emergency)
+            except NoAmbulanceAvailable:
+                continue
+            results[emergency.pk] = ambulance.pk if ambulance else None
+
+    return results
+
+
+def dispatch_emergency(emergency: EmergencyRequest) -> Ambulance:
+    """
+    Assign an ambulance to a new emergency, through the batch dispatcher
+    when `DISPATCH_BATCH_WINDOW_MS` is set and greedily otherwise.
+    """
+    try:
+        if settings.DISPATCH_BATCH_WINDOW_MS:
+            from apps.emergency.batch import batch_dispatcher
+
+            batch_dispatcher.submit(emergency).result()
+            return emergency.ambulance
+
+        ambulance = assign_nearest_ambulance(emergency)
+    except NoAmbulanceAvailable:
+        EmergencyRequest.objects.filter(pk=emergency.pk, ambulance__isnull=True, is_resolved=False).update(
+            dispatch_status=DispatchStatus.WAITING, last_updated=timezone.now()
+        )
+        emergency.dispatch_status = DispatchStatus.WAITING
+        raise
+    return ambulance
+
+
+def waiting_requests():
+    """Unassigned emergencies waiting for a unit, most urgent and oldest first."""
+    return EmergencyRequest.objects.filter(
+        dispatch_status=DispatchStatus.WAITING, ambulance__isnull=True, is_resolved=False
+    ).order_by(severity_priority(), "date_created")
+
+
+def dispatch_queue_stats() -> Dict[str, Dict]:
+    """
+    Per severity, most urgent first: the unassigned requests (`depth`, of
+    which `waiting` found no free unit) and how long requests made in the
+    last `DISPATCH_QUEUE_STATS_MINUTES` waited for a unit. Read from the
+    database, so every process reports the same figures.
+    """
+    now = timezone.now()
+    queued = {
+        row["severity"]: row
+        for row in EmergencyRequest.objects.filter(ambulance__isnull=True, is_resolved=False)
+        .values("severity")
+        .annotate(
+            depth=Count("id"),
+            waiting=Count("id", filter=Q(dispatch_status=DispatchStatus.WAITING)),
+            oldest=Min("date_created"),
+        )
+        .order_by()
+    }
+    wait = ExpressionWrapper(F("assigned_at") - F("date_created"), output_field=DurationField())
+    since = now - timedelta(minutes=settings.DISPATCH_QUEUE_STATS_MINUTES)
+    dispatched = {
+        row["severity"]: row
+        for row in EmergencyRequest.objects.filter(date_created__gte=since, assigned_at__isnull=False)
+        .values("severity")
+        .annotate(dispatched=Count("id"), mean=Avg(wait), longest=Max(wait))
+        .order_by()
+    }
+
+    stats = {}
+    for severity in sorted(SeverityLevel, key=lambda s: s.priority):
+        waiting, done = queued.get(severity), dispatched.get(severity)
+        stats[str(severity)] = {
+            "depth": waiting["depth"] if waiting else 0,
+            "waiting": waiting["waiting"] if waiting else 0,
+            "oldestWaitSeconds": round((now - waiting["oldest"]).total_seconds(), 3) if waiting else 0.0,
+            "dispatched": done["dispatched"] if done else 0,
+            "meanWaitSeconds": round(done["mean"].total_seconds(), 3) if done else 0.0,
+            "maxWaitSeconds": round(done["longest"].total_seconds(), 3) if done else 0.0,
+        }
+    return stats
+
+
+def dispatch_waiting_requests(limit: int = 1) -> int:
+    """
+    Hand freed units to the most urgent waiting requests, each taking the
+    best-suited type that is free. Requests that cannot be served are
+    skipped, so one does not stall the rest. Returns the number assigned.
+    """
+    assigned = 0
+    for emergency in waiting_requests().select_related("location")[:WAITING_SCAN]:
+        if assigned >= limit:
+            break
+        try:
+            if assign_nearest_ambulance(emergency) is None:
+                continue
+        except NoAmbulanceAvailable:
+            continue
+        assigned += 1
+    return assigned
+
+
+def record_arrival(emergency: EmergencyRequest) -> bool:
+    """
+    Record that the assigned ambulance has reached the patient, which fixes
+    the request's response time. Returns False if it has no ambulance or
+    its arrival was already recorded.
+    """
+    if emergency.ambulance_id is None:
+        return False
+    now = timezone.now()
+    response_time = int((now - emergency.date_created).total_seconds())
+    with transaction.atomic():
+        arrived = EmergencyRequest.objects.filter(
+            pk=emergency.pk, ambulance__isnull=False, arrived_at__isnull=True
+        ).update(arrived_at=now, response_time_seconds=response_time, last_updated=now)
+        if arrived:
+            emergency.arrived_at = now
+            emergency.response_time_seconds = response_time
+            record_transitions(ResponseMetric.RESPONSE, [emergency], {emergency.pk: emergency.ambulance_id})
+    return bool(arrived)
+
+
+def resolve_emergency(emergency: EmergencyRequest) -> None:
+    """
+    Stamp a newly resolved emergency and free its unit so waiting requests
+    can take it, unless the unit has been claimed for another request since.
+    A dispatch job still open for it is settled, as there is nothing left
+    to dispatch.
+    """
+    now = timezone.now()
+    resolved = EmergencyRequest.objects.filter(pk=emergency.pk, resolved_at__isnull=True).update(
+        resolved_at=now, last_updated=now
+    )
+    DispatchJob.objects.filter(
+        emergency_id=emergency.pk, status__in=[DispatchJobStatus.PENDING, DispatchJobStatus.RUNNING]
+    ).update(status=DispatchJobStatus.DONE, locked_until=None, last_updated=now)
+    if resolved:
+        emergency.resolved_at = now
+        if emergency.ambulance_id is not None:
+            record_transitions(ResponseMetric.RESOLUTION, [emergency], {emergency.pk: emergency.ambulance_id})
+    # Without an assignment time the unit cannot be told apart from a later
+    # claim; its `busy_until` frees it instead
+    if emergency.ambulance_id is not None and emergency.assigned_at is not None:
+        release_ambulance(emergency.ambulance_id, claimed_by=emergency.assigned_at)
+    state = emergency_state(
+        emergency.pk, emergency.dispatch_status, emergency.ambulance_id, emergency.is_resolved
+    )
+    transaction.on_commit(lambda: publish_emergency_states([state]))
+
+
+def enqueue_dispatch(emergency: EmergencyRequest) -> DispatchJob:
+    """
+    Queue an emergency for the dispatch workers (`run_dispatch_workers`),
+    tagged with the region of the patient so the owning shard picks it up.
+    """
+    location = emergency.location
+    return DispatchJob.objects.create(
+        emergency=emergency, region=region_of(location.latitude, location.longitude)
+    )
+
+
+def _claimable_jobs(now):
+    # Pending jobs that are due, plus running jobs whose worker let the lease lapse
+    return DispatchJob.objects.filter(
+        Q(status=DispatchJobStatus.PENDING, available_at__lte=now)
+        | Q(status=DispatchJobStatus.RUNNING, locked_until__lte=now)
+    )
+
+
+def claim_dispatch_jobs(
+    worker: str, limit: int, shard: Optional[Tuple[int, ShardPlan]] = None
+) -> List[DispatchJob]:
+    """
+    Lease up to `limit` due jobs to `worker`, most urgent first. The lease is
+    taken with a conditional UPDATE, so concurrent workers never hold the
+    same job; a job whose lease expires is handed out again.
+
+    `shard` is `(index, plan)`; when given, only jobs in regions the plan
+    gives that shard are leased. Shard 0 also takes jobs without a region
+    or outside the plan.
+    """
+    now = timezone.now()
+    jobs = _claimable_jobs(now)
+    if shard is not None:
+        index, plan = shard
+        owned = Q(region__in=plan.regions(index))
+        if index == 0:
+            owned |= Q(region__isnull=True) | ~Q(region__in=list(plan.owners))
+        jobs = jobs.filter(owned)
+    ids = list(
+        jobs
+        .order_by(severity_priority("emergency__severity"), "available_at")
+        .values_list("pk", flat=True)[:limit]
+    )
+    if not ids:
+        return []
+
+    locked_until = now + timedelta(seconds=settings.DISPATCH_JOB_LEASE_SECONDS)
+    _claimable_jobs(now).filter(pk__in=ids).update(
+        status=DispatchJobStatus.RUNNING,
+        locked_by=worker,
+        locked_until=locked_until,
+        attempts=F("attempts") + 1,
+        last_updated=now,
+    )
+    return list(
+        DispatchJob.objects.filter(
+            pk__in=ids, locked_by=worker, locked_until=locked_until
+        ).select_related("emergency")
+    )
+
+
+def run_dispatch_jobs(jobs: List[DispatchJob]) -> Dict:
+    """
+    Assign ambulances for a set of leased jobs as one batch and settle each
+    job. Emergencies that are already assigned (a job re-delivered after a
+    lost lease) are left as they are. Returns a mapping of emergency id to
+    ambulance id (or None).
+    """
+    if not jobs:
+        return {}
+
+    pending = [
+        job.emergency for job in jobs if job.emergency.ambulance_id is None and not job.emergency.is_resolved
+    ]
+    try:
+        results = assign_ambulances_in_batch(pending)
+    except Exception as e:
+        for job in jobs:
+            _retry_dispatch_job(job, e)
+        raise
+
+    now = timezone.now()
+    results.update({job.emergency_id: job.emergency.ambulance_id for job in jobs if job.emergency.ambulance_id})
+    unassigned = [pk for pk, ambulance_id in results.items() if ambulance_id is None]
+    EmergencyRequest.objects.filter(pk__in=unassigned, ambulance__isnull=True, is_resolved=False).update(
+        dispatch_status=DispatchStatus.WAITING, last_updated=now
+    )
+    # Only settle jobs this worker still holds
+    for worker in {job.locked_by for job in jobs}:
+        DispatchJob.objects.filter(
+            pk__in=[job.pk for job in jobs if job.locked_by == worker],
+            status=DispatchJobStatus.RUNNING,
+            locked_by=worker,
+        ).update(status=DispatchJobStatus.DONE, locked_until=None, last_updated=now)
+    return results
+
+
+def _retry_dispatch_job(job: DispatchJob, error: Exception) -> None:
+    """Put a job back with exponential backoff, or fail it after too many attempts."""
+    now = timezone.now()
+    jobs = DispatchJob.objects.filter(
+        pk=job.pk, status=DispatchJobStatus.RUNNING, locked_by=job.locked_by
+    )
+    if job.attempts >= settings.DISPATCH_JOB_MAX_ATTEMPTS:
+        jobs.update(
+            status=DispatchJobStatus.FAILED, locked_until=None, last_error=str(error), last_updated=now
         )
-        distances.append((distance, amb))
+        EmergencyRequest.objects.filter(pk=job.emergency_id, ambulance__isnull=True, is_resolved=False).update(
+            dispatch_status=DispatchStatus.WAITING, last_updated=now
+        )
+        return
+    jobs.update(
+        status=DispatchJobStatus.PENDING,
+        available_at=now + timedelta(seconds=2 ** job.attempts),
+        locked_by=None,
+        locked_until=None,
+        last_error=str(error),
+        last_updated=now,
+    )
+
+
+def _bucket_start(moment: datetime) -> datetime:
+    return moment.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+def _transition_time(emergency: EmergencyRequest, metric: str) -> Optional[datetime]:
+    return {
+        ResponseMetric.DISPATCH: emergency.assigned_at,
+        ResponseMetric.RESPONSE: emergency.arrived_at,
+        ResponseMetric.RESOLUTION: emergency.resolved_at,
+    }[metric]
+
+
+def record_transitions(metric: str, emergencies: List[EmergencyRequest], ambulances: Dict) -> None:
+    """
+    Add the durations of one kind of transition to the hourly rollups.
+    `ambulances` maps each emergency id to its ambulance id, whose hospital
+    the emergency is counted under. Run inside the transaction making the
+    transition, so rollups and requests never disagree.
+    """
+    hospitals = dict(
+        Ambulance.objects.filter(pk__in=set(ambulances.values())).values_list("pk", "hospital_id")
+    )
+    samples = defaultdict(list)
+    for emergency in emergencies:
+        hospital_id = hospitals.get(ambulances.get(emergency.pk))
+        if hospital_id is None:
+            continue
+        seconds = (_transition_time(emergency, metric) - emergency.date_created).total_seconds()
+        key = (_bucket_start(emergency.date_created), emergency.severity, hospital_id)
+        samples[key].append(max(seconds, 0.0))
+    if samples:
+        update_rollups(metric, samples)
+
+
+def _add_samples(rollup: EmergencyRollup, metric: str, values: List[float]) -> None:
+    sketch = QuantileSketch.from_bytes(getattr(rollup, f"{metric}_sketch"))
+    sketch.add_many(values)
+    setattr(rollup, f"{metric}_sketch", sketch.to_bytes())
+    setattr(rollup, f"{metric}_count", getattr(rollup, f"{metric}_count") + len(values))
+    setattr(rollup, f"{metric}_seconds", getattr(rollup, f"{metric}_seconds") + sum(values))
+
+
+def update_rollups(metric: str, samples: Dict[Tuple, List[float]]) -> None:
+    """
+    Merge duration samples, keyed by `(bucket_start, severity, hospital_id)`,
+    into the rollup rows with one locking read and one write per table.
+    """
+    fields = [f"{metric}_count", f"{metric}_seconds", f"{metric}_sketch", "last_updated"]
+    for attempt in range(2):
+        try:
+            with transaction.atomic():
+                existing = {
+                    (r.bucket_start, r.severity, r.hospital_id): r
+                    for r in EmergencyRollup.objects.select_for_update().filter(
+                        bucket_start__in={key[0] for key in samples},
+                        hospital_id__in={key[2] for key in samples},
+                    )
+                }
+                changed, created = [], []
+                for key, values in samples.items():
+                    rollup = existing.get(key)
+                    if rollup is None:
+                        rollup = EmergencyRollup(bucket_start=key[0], severity=key[1], hospital_id=key[2])
+                        created.append(rollup)
+                    else:
+                        rollup.last_updated = timezone.now()
+                        changed.append(rollup)
+                    _add_samples(rollup, metric, values)
+                EmergencyRollup.objects.bulk_create(created)
+                EmergencyRollup.objects.bulk_update(changed, fields)
+            return
+        except IntegrityError:
+            # Another transaction created one of the buckets first; merge into it
+            if attempt:
+                raise
+
+
+def rebuild_rollups(batch_size: int = 10_000) -> int:
+    """
+    Recompute every rollup from `EmergencyRequest`, e.g. after importing
+    data that bypassed the state transitions. Returns the number of rows.
+    """
+    rollups: Dict[Tuple, EmergencyRollup] = {}
+    samples = {metric: defaultdict(list) for metric in ResponseMetric}
+    rows = EmergencyRequest.objects.filter(ambulance__isnull=False).values_list(
+        "date_created", "severity", "ambulance__hospital_id", "assigned_at", "arrived_at", "resolved_at"
+    )
+    for created, severity, hospital_id, *moments in rows.iterator(chunk_size=batch_size):
+        key = (_bucket_start(created), severity, hospital_id)
+        for metric, moment in zip(ResponseMetric, moments):
+            if moment is not None:
+                samples[metric][key].append(max((moment - created).total_seconds(), 0.0))
+
+    for metric, grouped in samples.items():
+        for key, values in grouped.items():
+            rollup = rollups.get(key)
+            if rollup is None:
+                rollup = rollups[key] = EmergencyRollup(bucket_start=key[0], severity=key[1], hospital_id=key[2])
+            _add_samples(rollup, metric, values)
+
+    with transaction.atomic():
+        EmergencyRollup.objects.all().delete()
+        EmergencyRollup.objects.bulk_create(rollups.values(), batch_size=batch_size)
+    return len(rollups)
+
+
+def response_analytics(
+    start: datetime,
+    end: datetime,
+    severity: Optional[str] = None,
+    hospital_id=None,
+    group_by: str = "severity",
+) -> List[Dict]:
+    """
+    Response-time statistics for emergencies requested between `start` and
+    `end`, read from the hourly rollups and merged per group (`severity`,
+    `hospital`, `hour` or `day`): counts, means and percentiles of each
+    `ResponseMetric`.
+    """
+    rollups = EmergencyRollup.objects.filter(bucket_start__gte=_bucket_start(start), bucket_start__lt=end)
+    if severity:
+        rollups = rollups.filter(severity=severity)
+    if hospital_id:
+        rollups = rollups.filter(hospital_id=hospital_id)
+
+    group_of = {
+        "severity": lambda row: row["severity"],
+        "hospital": lambda row: str(row["hospital_id"]),
+        "hour": lambda row: row["bucket_start"],
+        "day": lambda row: row["bucket_start"].date(),
+    }[group_by]
+
+    metric_fields = [f"{metric}_{part}" for metric in ResponseMetric for part in ("count", "seconds", "sketch")]
+    groups: Dict = {}
+    for row in rollups.values("bucket_start", "severity", "hospital_id", *metric_fields):
+        group = groups.setdefault(
+            group_of(row),
+            {metric: [0, 0.0, QuantileSketch()] for metric in ResponseMetric},
+        )
+        for metric in ResponseMetric:
+            totals = group[metric]
+            totals[0] += row[f"{metric}_count"]
+            totals[1] += row[f"{metric}_seconds"]
+            totals[2].merge(QuantileSketch.from_bytes(row[f"{metric}_sketch"]))
+
+    results = []
+    for key in sorted(groups):
+        item = {"group": key}
+        for metric, (count, seconds, sketch) in groups[key].items():
+            item[metric] = {
+                "count": count,
+                "meanSeconds": round(seconds / count, 1) if count else None,
+                **{
+                    f"p{round(q * 100)}Seconds": None if not count else round(sketch.quantile(q), 1)
+                    for q in (0.5, 0.9, 0.99)
+                },
+            }
+        results.append(item)
+    return results
 
-    # Step 4: Select closest ambulance
-    distances.sort(key=lambda x: x[0])
-    selected_amb = distances[0][1]
 
-    # Step 5: Assign & update ambulance status
-    selected_amb.status = StatusEnum.BUSY
-    selected_amb.busy_until = timezone.now() + timedelta(minutes=30)
-    selected_amb.last_assigned = timezone.now()
-    selected_amb.save()
+# Export column name -> lookup; location and ambulance are joined in SQL
+EXPORT_COLUMNS = {
+    "id": "id",
+    "createdAt": "date_created",
+    "severity": "severity",
+    "dispatchStatus": "dispatch_status",
+    "isResolved": "is_resolved",
+    "latitude": "location__latitude",
+    "longitude": "location__longitude",
+    "ambulance": "ambulance_id",
+    "ambulanceType": "ambulance__ambulance_type",
+    "ambulanceHospital": "ambulance__hospital_id",
+    "destinationHospital": "destination_hospital_id",
+    "assignedAt": "assigned_at",
+    "arrivedAt": "arrived_at",
+    "resolvedAt": "resolved_at",
+    "responseTimeSeconds": "response_time_seconds",
+}
 
-    # Step 6: Attach ambulance to emergency
-    emergency.ambulance = selected_amb
-    emergency.response_time_seconds = 0 
-    emergency.save()
 
-    return selected_amb
+def export_emergency_rows(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    severity: Optional[str] = None,
+    chunk_size: Optional[int] = None,
+):
+    """
+    Rows of `EXPORT_COLUMNS` for the emergencies requested in `[start, end)`,
+    oldest first. Tuples are read through a chunked server-side cursor, so
+    memory stays flat however many rows match.
+    """
+    emergencies = EmergencyRequest.objects.all()
+    if start:
+        emergencies = emergencies.filter(date_created__gte=start)
+    if end:
+        emergencies = emergencies.filter(date_created__lt=end)
+    if severity:
+        emergencies = emergencies.filter(severity=severity)
+    rows = emergencies.order_by("date_created", "id").values_list(*EXPORT_COLUMNS.values())
+    return rows.iterator(chunk_size=chunk_size or settings.EMERGENCY_EXPORT_CHUNK_SIZE)
@@ -0,0 +1,106 @@
+import threading
+from typing import Dict, Iterable, Optional
+
+from apps.ambulance.v1.streams import ambulance_topic, unit_state
+from apps.emergency.models import EmergencyRequest
+from apps.user.utils import UserTypesEnum
+from utils.events import Subscription, event_bus, event_stream, stream_error, stream_user
+
+
+def emergency_topic(emergency_id) -> str:
+    return f"emergency:{emergency_id}"
+
+
+def emergency_state(emergency_id, dispatch_status: str, ambulance_id, is_resolved: bool) -> Dict:
+    return {
+        "emergencyId": str(emergency_id),
+        "dispatchStatus": dispatch_status,
+        "ambulanceId": str(ambulance_id) if ambulance_id else None,
+        "isResolved": is_resolved,
+        "ambulance": unit_state(ambulance_id) if ambulance_id else None,
+    }
+
+
+def publish_emergency_states(states: Iterable[Dict]) -> None:
+    """Push the new state of some emergencies to their subscribers."""
+    for state in states:
+        topic = emergency_topic(state["emergencyId"])
+        if event_bus.has_subscribers(topic):
+            event_bus.publish(topic, "emergency", state)
+
+
+class AssignedUnitFollower:
+    """
+    Subscriber filter for one emergency's stream. It passes the
+    emergency's own events and those of the unit assigned to it, and moves
+    the subscription to the new unit's topic whenever the assignment
+    changes. Publisher threads and the event loop both call it, so its
+    state only changes under a lock.
+    """
+
+    def __init__(self, state: Dict):
+        self._lock = threading.Lock()
+        self._subscription: Optional[Subscription] = None
+        self.state = state
+
+    def topics(self):
+        topics = [emergency_topic(self.state["emergencyId"])]
+        if self.state["ambulanceId"]:
+            topics.append(ambulance_topic(self.state["ambulanceId"]))
+        return topics
+
+    def attach(self, subscription: Subscription) -> None:
+        # Catches up with any assignment seen before the subscription existed
+        with self._lock:
+            self._subscription = subscription
+            event_bus.resubscribe(subscription, self.topics())
+
+    def follow(self, state: Dict) -> None:
+        with self._lock:
+            self.state = state
+            if self._subscription is not None:
+                event_bus.resubscribe(self._subscription, self.topics())
+
+    def __call__(self, data: Dict) -> bool:
+        if "emergencyId" in data:
+            self.follow(data)
+            return True
+        # Drops a late event from the previously assigned unit
+        with self._lock:
+            return data["id"] == self.state["ambulanceId"]
+
+
+async def emergency_stream(request, pk):
+    """
+    Server-sent events for one emergency, for the patient who made it or
+    an admin: its current state, then an `emergency` event on every
+    assignment or resolution and an `ambulance` event whenever the
+    assigned unit moves. Changes made by dispatch workers in other
+    processes are caught at each heartbeat.
+    """
+    user = await stream_user(request)
+    if user is None:
+        return stream_error(401, "Authentication credentials were not provided.")
+    fields = ("pk", "dispatch_status", "ambulance_id", "is_resolved")
+    queryset = EmergencyRequest.objects.filter(pk=pk)
+    if user.role != UserTypesEnum.ADMIN:
+        queryset = queryset.filter(user=user)
+    row = await queryset.values_list(*fields).afirst()
+    if row is None:
+        return stream_error(404, "No EmergencyRequest matches the given query.")
+
+    follower = AssignedUnitFollower(emergency_state(*row))
+
+    async def on_idle():
+        row = await EmergencyRequest.objects.filter(pk=pk).values_list(*fields).afirst()
+        state = follower.state
+        if row is None or (row[1], row[2] and str(row[2]), row[3]) == (
+            state["dispatchStatus"], state["ambulanceId"], state["isResolved"]
+        ):
+            return []
+        follower.follow(emergency_state(*row))
+        return [("emergency", follower.state)]
+
+    subscription = event_bus.subscribe(follower.topics(), accept=follower)
+    follower.attach(subscription)
+    return event_stream(subscription, initial=[("emergency", follower.state)], on_idle=on_idle)
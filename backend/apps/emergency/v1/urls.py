@@ -15,9 +15,21 @@
 # apps/emergency/urls.py
 
 from django.urls import path
-from apps.emergency.v1.views import EmergencyRequestView
+from apps.emergency.v1.streams import emergency_stream
+from apps.emergency.v1.views import (
+    DispatchQueueView,
+    EmergencyArrivalView,
+    EmergencyExportView,
+    EmergencyRequestView,
+    ResponseAnalyticsView,
+)
 
 urlpatterns = [
     path("emergency-requests/", EmergencyRequestView.as_view(), name="emergency-request-list-create"),
-    path("emergency-requests/<int:pk>/", EmergencyRequestView.as_view(), name="emergency-request-detail"),
+    path("emergency-requests/queue/", DispatchQueueView.as_view(), name="emergency-dispatch-queue"),
+    path("emergency-requests/analytics/", ResponseAnalyticsView.as_view(), name="emergency-response-analytics"),
+    path("emergency-requests/export/", EmergencyExportView.as_view(), name="emergency-request-export"),
+    path("emergency-requests/<uuid:pk>/", EmergencyRequestView.as_view(), name="emergency-request-detail"),
+    path("emergency-requests/<uuid:pk>/events/", emergency_stream, name="emergency-request-events"),
+    path("emergency-requests/<uuid:pk>/arrival/", EmergencyArrivalView.as_view(), name="emergency-request-arrival"),
 ]
@@ -1,9 +1,28 @@
 from rest_framework.views import APIView
 from rest_framework import status, permissions
+from django.conf import settings
+from django.db import transaction
 from django.shortcuts import get_object_or_404
 from apps.emergency.models import EmergencyRequest, EmergencyRequestLocation
-from apps.emergency.v1.serializers import EmergencyRequestSerializer
-from apps.emergency.v1.services import assign_nearest_ambulance
+from apps.emergency.v1.exports import export_response
+from apps.emergency.v1.serializers import (
+    EmergencyExportQuerySerializer,
+    EmergencyRequestSerializer,
+    ResponseAnalyticsQuerySerializer,
+)
+from apps.emergency.v1.services import (
+    EXPORT_COLUMNS,
+    NoAmbulanceAvailable,
+    dispatch_emergency,
+    dispatch_queue_stats,
+    enqueue_dispatch,
+    export_emergency_rows,
+    record_arrival,
+    resolve_emergency,
+    response_analytics,
+)
+from apps.user.utils import UserTypesEnum
+from utils.pagination import CustomPagination
 from utils.responses import api_response
 from utils.permissions import IsAdmin, IsPatient
 
@@ -12,9 +31,12 @@ class EmergencyRequestView(APIView):
     """
     Handles:
     - POST for users to create emergency requests
+    - GET detail for the patient who made the request, to poll its dispatch status
     - GET (list & detail), PUT, PATCH for admins
     """
     def get_permissions(self):
+        if self.request.method == "GET" and self.kwargs.get("pk"):
+            return [permissions.IsAuthenticated()]
         if self.request.method in ["GET", "PUT", "PATCH"]:
             return [IsAdmin()]
         return [IsPatient()]
@@ -25,23 +47,38 @@ class EmergencyRequestView(APIView):
             user = request.user
             location_data = serializer.validated_data.pop('location')
 
-            # Step 1: Create emergency request without ambulance
-            emergency = EmergencyRequest.objects.create(user=user, **serializer.validated_data)
+            with transaction.atomic():
+                # Step 1: Create emergency request without ambulance
+                emergency = EmergencyRequest.objects.create(user=user, **serializer.validated_data)
 
-            # Step 2: Save patient location
-            EmergencyRequestLocation.objects.create(
-                emergency=emergency,
-                latitude=location_data['latitude'],
-                longitude=location_data['longitude']
-            )
+                # Step 2: Save patient location
+                EmergencyRequestLocation.objects.create(
+                    emergency=emergency,
+                    latitude=location_data['latitude'],
+                    longitude=location_data['longitude']
+                )
+
+                # Step 3: In async mode, hand the request to the dispatch workers;
+                # the patient polls the detail endpoint for the assignment
+                if settings.DISPATCH_ASYNC:
+                    enqueue_dispatch(emergency)
+
+            if settings.DISPATCH_ASYNC:
+                return api_response(
+                    status=status.HTTP_202_ACCEPTED,
+                    message="Emergency request received and queued for dispatch.",
+                    data=EmergencyRequestSerializer(emergency).data
+                )
 
-            # Step 3: Assign nearest ambulance
+            # Step 3: Assign nearest ambulance, or leave the request waiting for
+            # the next unit to free up
             try:
-                assign_nearest_ambulance(emergency)
-            except Exception as e:
+                dispatch_emergency(emergency)
+            except NoAmbulanceAvailable:
                 return api_response(
-                    status=status.HTTP_400_BAD_REQUEST,
-                    message=str(e)
+                    status=status.HTTP_202_ACCEPTED,
+                    message="No ambulance is free right now. The request is queued and will be dispatched as soon as one is.",
+                    data=EmergencyRequestSerializer(emergency).data
                 )
 
             # Step 4: Serialize and return
@@ -61,28 +98,34 @@ class EmergencyRequestView(APIView):
     def get(self, request, pk=None):
         if pk:
             emergency = get_object_or_404(EmergencyRequest, pk=pk)
+            if request.user.role != UserTypesEnum.ADMIN and emergency.user_id != request.user.pk:
+                return api_response(
+                    status=status.HTTP_404_NOT_FOUND,
+                    message="Emergency request not found."
+                )
             serializer = EmergencyRequestSerializer(emergency)
             return api_response(
                 status=status.HTTP_200_OK,
                 message="Emergency request retrieved successfully.",
                 data=serializer.data
             )
-        queryset = EmergencyRequest.objects.all().order_by('-date_created')
-        serializer = EmergencyRequestSerializer(queryset, many=True) 
-        
-        message = "No emergency request" if len(queryset) < 1 else "All emergency requests retrieved successfully."
-        return api_response(
-            status=status.HTTP_200_OK,
-            message=message,
-            data=serializer.data or None,
-        )
+        paginator = CustomPagination()
+        page = paginator.paginate_queryset(EmergencyRequest.objects.all(), request, view=self)
+        serializer = EmergencyRequestSerializer(page, many=True)
+
+        message = "No emergency request" if not page else "All emergency requests retrieved successfully."
+        return paginator.get_paginated_response(serializer.data or None, message=message)
         
 
     def put(self, request, pk):
         emergency = get_object_or_404(EmergencyRequest, pk=pk)
+        was_resolved = emergency.is_resolved
         serializer = EmergencyRequestSerializer(emergency, data=request.data)
         if serializer.is_valid():
-            serializer.save()
+            with transaction.atomic():
+                serializer.save()
+                if emergency.is_resolved and not was_resolved:
+                    resolve_emergency(emergency)
             return api_response(
                 status=status.HTTP_200_OK,
                 message="Emergency request updated successfully.",
@@ -96,9 +139,13 @@ class EmergencyRequestView(APIView):
 
     def patch(self, request, pk):
         emergency = get_object_or_404(EmergencyRequest, pk=pk)
+        was_resolved = emergency.is_resolved
         serializer = EmergencyRequestSerializer(emergency, data=request.data, partial=True)
         if serializer.is_valid():
-            serializer.save()
+            with transaction.atomic():
+                serializer.save()
+                if emergency.is_resolved and not was_resolved:
+                    resolve_emergency(emergency)
             return api_response(
                 status=status.HTTP_200_OK,
                 message="Emergency request partially updated successfully.",
@@ -109,3 +156,105 @@ class EmergencyRequestView(APIView):
             message="Validation error",
             data=serializer.errors
         )
+
+
+class DispatchQueueView(APIView):
+    """
+    Handles:
+    - GET for admins to inspect dispatch queue depth, wait times and requests
+      waiting for a free unit per severity
+    """
+    permission_classes = [IsAdmin]
+
+    def get(self, request):
+        return api_response(
+            status=status.HTTP_200_OK,
+            message="Dispatch queue statistics retrieved successfully.",
+            data=dispatch_queue_stats(),
+        )
+
+
+class EmergencyArrivalView(APIView):
+    """
+    Handles:
+    - POST for admins to record that the assigned ambulance reached the
+      patient, which sets the request's response time
+    """
+    permission_classes = [IsAdmin]
+
+    def post(self, request, pk):
+        emergency = get_object_or_404(EmergencyRequest, pk=pk)
+        if emergency.ambulance_id is None:
+            return api_response(
+                status=status.HTTP_400_BAD_REQUEST,
+                message="No ambulance has been assigned to this emergency request."
+            )
+        if not record_arrival(emergency):
+            return api_response(
+                status=status.HTTP_409_CONFLICT,
+                message="Arrival was already recorded for this emergency request."
+            )
+        return api_response(
+            status=status.HTTP_200_OK,
+            message="Ambulance arrival recorded successfully.",
+            data=EmergencyRequestSerializer(emergency).data
+        )
+
+
+class ResponseAnalyticsView(APIView):
+    """
+    Handles:
+    - GET for admins to read dispatch, response and resolution time
+      statistics, from the hourly rollups
+    """
+    permission_classes = [IsAdmin]
+
+    def get(self, request):
+        query = ResponseAnalyticsQuerySerializer(data=request.query_params)
+        if not query.is_valid():
+            return api_response(
+                status=status.HTTP_400_BAD_REQUEST,
+                message="Validation error",
+                data=query.errors
+            )
+        params = query.validated_data
+        results = response_analytics(
+            params["start"],
+            params["end"],
+            severity=params.get("severity"),
+            hospital_id=params.get("hospital"),
+            group_by=params["group_by"],
+        )
+        return api_response(
+            status=status.HTTP_200_OK,
+            message="Response analytics retrieved successfully.",
+            data=results,
+        )
+
+
+class EmergencyExportView(APIView):
+    """
+    Handles:
+    - GET for admins to download emergency history as NDJSON or CSV
+      (`exportFormat`), streamed in chunks, optionally filtered by
+      `start`, `end` and `severity`
+    """
+    permission_classes = [IsAdmin]
+
+    def get(self, request):
+        query = EmergencyExportQuerySerializer(data=request.query_params)
+        if not query.is_valid():
+            return api_response(
+                status=status.HTTP_400_BAD_REQUEST,
+                message="Validation error",
+                data=query.errors
+            )
+        params = query.validated_data
+        rows = export_emergency_rows(
+            start=params.get("start"),
+            end=params.get("end"),
+            severity=params.get("severity"),
+        )
+        return export_response(
+            request._request, list(EXPORT_COLUMNS), rows, params["export_format"], filename="emergencies"
+        )
@@ -0,0 +1,122 @@
+import logging
+import os
+import socket
+import threading
+import time
+from typing import Optional, Tuple
+
+from django.db import close_old_connections
+from django.db.models import Min
+from django.utils import timezone
+
+from apps.ambulance.index import ambulance_index
+from apps.ambulance.models import Ambulance
+from apps.ambulance.utils import StatusEnum
+from apps.ambulance.v1.services import release_expired_ambulances
+from apps.emergency.v1.services import (
+    WAITING_SCAN,
+    claim_dispatch_jobs,
+    dispatch_waiting_requests,
+    run_dispatch_jobs,
+)
+from utils.regions import ShardPlan
+
+logger = logging.getLogger(__name__)
+
+
+class DispatchWorker:
+    """
+    Polls the `DispatchJob` table and assigns ambulances for leased jobs in
+    batches. Any number of workers can run side by side, in one process or
+    many; leases keep them from working on the same job at once, and
+    assignment is idempotent, so a job re-delivered after a crash is safe.
+
+    With `shard=(index, plan)` the worker owns the dispatch regions the
+    `ShardPlan` gives it: it only leases their jobs, and its ambulance index
+    only holds units inside them or in the tiles bordering them, so requests
+    near a border still see the neighbouring shards' closest units.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = 32,
+        poll_interval: float = 0.2,
+        name: str = None,
+        shard: Optional[Tuple[int, ShardPlan]] = None,
+    ):
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.name = name or f"{socket.gethostname()}:{os.getpid()}"
+        self.shard = shard
+        self.running = False
+        if shard is not None:
+            index, plan = shard
+            ambulance_index.restrict(lambda lat, lon: plan.covers(lat, lon, index))
+
+    def run_once(self) -> int:
+        """Process one batch of jobs and return how many were leased."""
+        jobs = claim_dispatch_jobs(self.name, self.batch_size, shard=self.shard)
+        if jobs:
+            try:
+                run_dispatch_jobs(jobs)
+            except Exception:
+                logger.exception("Dispatch batch failed, jobs will be retried")
+        return len(jobs)
+
+    def run(self) -> None:
+        self.running = True
+        while self.running:
+            close_old_connections()
+            if not self.run_once():
+                time.sleep(self.poll_interval)
+
+    def stop(self) -> None:
+        self.running = False
+
+
+def shard_plan(shards: int) -> ShardPlan:
+    """Split the dispatch regions between `shards` workers by where the fleet is."""
+    positions = Ambulance.objects.filter(latitude__isnull=False, longitude__isnull=False)
+    return ShardPlan.from_points(positions.values_list("latitude", "longitude"), shards)
+
+
+class ReleaseTimer:
+    """
+    Releases busy ambulances the moment their `busy_until` passes, which in
+    turn re-dispatches waiting requests. Instead of polling it sleeps until
+    the earliest `busy_until` in the database (at most `max_sleep`, to pick
+    up units claimed by other processes). State lives in the database, so
+    on start-up it catches up on anything that expired while it was down.
+    """
+
+    def __init__(self, max_sleep: float = 60.0):
+        self.max_sleep = max_sleep
+        self.running = False
+        self._wakeup = threading.Event()
+
+    def next_expiry(self):
+        return Ambulance.objects.filter(
+            status=StatusEnum.BUSY, busy_until__isnull=False
+        ).aggregate(next=Min("busy_until"))["next"]
+
+    def run(self) -> None:
+        self.running = True
+        close_old_connections()
+        dispatch_waiting_requests(limit=WAITING_SCAN)
+        while self.running:
+            close_old_connections()
+            try:
+                release_expired_ambulances()
+                next_expiry = self.next_expiry()
+            except Exception:
+                logger.exception("Releasing expired ambulances failed")
+                next_expiry = None
+            delay = self.max_sleep
+            if next_expiry is not None:
+                delay = min(delay, max((next_expiry - timezone.now()).total_seconds(), 0))
+            self._wakeup.wait(delay)
+            self._wakeup.clear()
+
+    def stop(self) -> None:
+        self.running = False
+        self._wakeup.set()
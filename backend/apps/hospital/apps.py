@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class HospitalConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.hospital'
+
+    def ready(self):
+        from apps.hospital import signals  # noqa: F401
@@ -0,0 +1,68 @@
+import threading
+import time
+from typing import List, Optional, Tuple
+
+from django.conf import settings
+
+from utils.spatial import GridIndex
+
+
+class HospitalIndex:
+    """
+    Process-wide spatial index of hospital locations, used to pick where an
+    ambulance takes its patient.
+
+    Like the ambulance index, it is loaded lazily from the database, kept
+    current by the model signals in `apps.hospital.signals`, and reloaded
+    when older than `HOSPITAL_INDEX_TTL` seconds to pick up writes made by
+    other processes.
+    """
+
+    def __init__(self, cell_size: float = 0.05):
+        self._lock = threading.RLock()
+        self._grid = GridIndex(cell_size=cell_size)
+        self._loaded_at: Optional[float] = None
+
+    @property
+    def ttl(self) -> float:
+        return settings.HOSPITAL_INDEX_TTL
+
+    def _ensure_loaded(self) -> None:
+        if self._loaded_at is None or time.monotonic() - self._loaded_at > self.ttl:
+            self.rebuild()
+
+    def rebuild(self) -> None:
+        from apps.hospital.models import HospitalLocation
+
+        rows = HospitalLocation.objects.values_list("hospital_id", "latitude", "longitude")
+        with self._lock:
+            self._grid.clear()
+            for hospital_id, lat, lon in rows:
+                self._grid.insert(hospital_id, float(lat), float(lon))
+            self._loaded_at = time.monotonic()
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._loaded_at = None
+
+    def set_position(self, hospital_id, lat, lon) -> None:
+        with self._lock:
+            if self._loaded_at is not None:
+                self._grid.insert(hospital_id, float(lat), float(lon))
+
+    def remove(self, hospital_id) -> None:
+        with self._lock:
+            self._grid.remove(hospital_id)
+
+    def position(self, hospital_id) -> Optional[Tuple[float, float]]:
+        with self._lock:
+            return self._grid.get(hospital_id)
+
+    def nearest(self, lat, lon, k: int = 1) -> List[Tuple[float, object]]:
+        """Return up to `k` `(distance_km, hospital_id)` pairs, closest first."""
+        with self._lock:
+            self._ensure_loaded()
+            return self._grid.nearest(lat, lon, k=k)
+
+
+hospital_index: HospitalIndex = HospitalIndex()
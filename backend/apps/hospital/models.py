@@ -13,11 +13,22 @@ class Hospital(Audit):
         blank=True,
         related_name="hospitals_created"
     )
-    
-    
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["date_created", "id"]),
+            models.Index(fields=["last_updated"]),
+        ]
+
+
 class HospitalLocation(Audit):
     hospital = models.OneToOneField(
         Hospital, on_delete=models.CASCADE, related_name="location"
     )
-    latitude = models.CharField(max_length=255)
-    longitude = models.CharField(max_length=255)
\ No newline at end of file
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["latitude", "longitude"]),
+        ]
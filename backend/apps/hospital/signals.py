@@ -0,0 +1,26 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from apps.hospital.index import hospital_index
+from apps.hospital.models import Hospital, HospitalLocation
+from utils.cache import hospital_catalog
+
+
+@receiver(post_save, sender=HospitalLocation)
+def index_hospital_location(sender, instance, **kwargs):
+    transaction.on_commit(
+        lambda: hospital_index.set_position(instance.hospital_id, instance.latitude, instance.longitude)
+    )
+
+
+@receiver(post_delete, sender=Hospital)
+def unindex_hospital(sender, instance, **kwargs):
+    # Read now: delete() clears the instance's pk before the commit
+    hospital_id = instance.pk
+
+    def update():
+        hospital_index.remove(hospital_id)
+        hospital_catalog.invalidate([hospital_id], lists=True)
+
+    transaction.on_commit(update)
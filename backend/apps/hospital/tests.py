@@ -1,3 +1,204 @@
 from django.test import TestCase
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from apps.hospital.index import hospital_index
+from apps.hospital.models import Hospital, HospitalLocation
+from apps.hospital.v1.services import nearest_hospitals, select_destination
+from apps.user.models import User
+from apps.user.utils import UserTypesEnum
+from utils.cache import hospital_catalog
+from utils.synthetic import SyntheticCity, create_city
+from utils.testing import QueryBudgetMixin
+
+
+class HospitalQueryBudgetTests(QueryBudgetMixin, TestCase):
+    url = "/v1/hospitals/"
+    model = Hospital
+    list_queries = 2
+    detail_queries = 2
+    cached_queries = 1
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(
+            username="admin", email="admin@example.com", password="x", role=UserTypesEnum.ADMIN
+        )
+
+    def fill(self, total):
+        create_city(SyntheticCity(seed=total), total - Hospital.objects.count(), 0)
+        Hospital.objects.update(created_by=self.admin)
+        hospital_catalog.invalidate_all()
+
+    def check_detail(self, data):
+        self.assertEqual(data["createdBy"], str(self.admin))
+
+
+class HospitalCatalogCacheTests(TestCase):
+    def setUp(self):
+        admin = User.objects.create_user(
+            username="admin", email="admin@example.com", password="x", role=UserTypesEnum.ADMIN
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(admin)
+        hospital_catalog.invalidate_all()
+
+    def create(self, name, latitude):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                "/v1/hospitals/",
+                {"name": name, "contactNumber": "1", "address": "A", "location": {"latitude": latitude, "longitude": "3.3"}},
+                format="json",
+            )
+        self.assertEqual(response.status_code, 201)
+        return response.json()["data"]["id"]
+
+    def test_writes_invalidate_cached_payloads(self):
+        first = self.create("First", "6.5")
+        self.client.get("/v1/hospitals/")
+        self.client.get(f"/v1/hospitals/{first}/")
+
+        second = self.create("Second", "6.6")
+        self.assertEqual([h["id"] for h in self.client.get("/v1/hospitals/").json()["data"]], [second, first])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(f"/v1/hospitals/{first}/", {"name": "Renamed"}, format="json")
+        self.assertEqual(self.client.get(f"/v1/hospitals/{first}/").json()["data"]["name"], "Renamed")
+        self.assertEqual(self.client.get("/v1/hospitals/").json()["data"][1]["name"], "Renamed")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(f"/v1/hospitals/{second}/")
+        self.assertEqual(self.client.get(f"/v1/hospitals/{second}/").status_code, 404)
+        self.assertEqual([h["id"] for h in self.client.get("/v1/hospitals/").json()["data"]], [first])
+
+
+class HospitalConditionalGetTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.hospitals, _ = create_city(SyntheticCity(seed=0), 3, 0)
+        hospital_catalog.invalidate_all()
+
+    def test_unchanged_list_is_not_modified(self):
+        response = self.client.get("/v1/hospitals/")
+        etag = response["ETag"]
+        with self.assertNumQueries(1):
+            response = self.client.get("/v1/hospitals/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+        self.assertEqual(response["ETag"], etag)
+
+        self.hospitals[0].delete()
+        response = self.client.get("/v1/hospitals/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_detail_changes_with_the_row(self):
+        hospital = self.hospitals[0]
+        response = self.client.get(f"/v1/hospitals/{hospital.pk}/")
+        last_modified = response["Last-Modified"]
+        response = self.client.get(f"/v1/hospitals/{hospital.pk}/", HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+        etag = response["ETag"]
+        admin = User.objects.create_user(
+            username="admin", email="admin@example.com", password="x", role=UserTypesEnum.ADMIN
+        )
+        self.client.force_authenticate(admin)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(f"/v1/hospitals/{hospital.pk}/", {"name": "Renamed"}, format="json")
+        response = self.client.get(f"/v1/hospitals/{hospital.pk}/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["data"]["name"], "Renamed")
+
+
+class HospitalCoordinateTests(TestCase):
+    """Coordinates are validated strings on the API and floats in the database."""
+
+    def setUp(self):
+        admin = User.objects.create_user(
+            username="admin", email="admin@example.com", password="x", role=UserTypesEnum.ADMIN
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(admin)
+
+    def create(self, latitude, longitude="3.3794", name="General"):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(
+                "/v1/hospitals/",
+                {"name": name, "contactNumber": "1", "address": "A", "location": {"latitude": latitude, "longitude": longitude}},
+                format="json",
+            )
+
+    def test_strings_and_numbers_are_stored_as_floats(self):
+        for latitude in ("6.5244", 6.5244, " 6.5244 "):
+            Hospital.objects.all().delete()
+            with self.subTest(latitude=latitude):
+                response = self.create(latitude)
+                self.assertEqual(response.status_code, 201)
+                self.assertEqual(response.json()["data"]["location"], {"longitude": "3.3794", "latitude": "6.5244"})
+                location = HospitalLocation.objects.get()
+                self.assertEqual((location.latitude, location.longitude), (6.5244, 3.3794))
+
+    def test_invalid_and_out_of_range_values_are_rejected(self):
+        for latitude, longitude, message in (
+            ("north", "3.3", "A valid number is required."),
+            ("90.5", "3.3", "Ensure this value is between -90 and 90."),
+            ("6.5", "-180.01", "Ensure this value is between -180 and 180."),
+        ):
+            with self.subTest(latitude=latitude, longitude=longitude):
+                response = self.create(latitude, longitude)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn(message, str(response.json()))
+        self.assertFalse(Hospital.objects.exists())
+        self.assertEqual(self.create("-90", "180").status_code, 201)
+
+    def test_duplicates_compare_the_numeric_values(self):
+        self.assertEqual(self.create("6.5").status_code, 201)
+        self.assertEqual(self.create("6.50").status_code, 400)
+        self.assertEqual(self.create("6.5001").status_code, 201)
+
+
+class NearestHospitalTests(TestCase):
+    def setUp(self):
+        hospital_index.invalidate()
+        self.hospitals = [self.hospital(f"H{km}", km) for km in (3, 1, 2)]
+
+    def hospital(self, name, km):
+        # About `km` kilometres north of (6.50, 3.30)
+        with self.captureOnCommitCallbacks(execute=True):
+            hospital = Hospital.objects.create(name=name, contact_number="0", address="Lagos")
+            HospitalLocation.objects.create(hospital=hospital, latitude=6.50 + km / 111.2, longitude=3.30)
+        return hospital
+
+    def test_destination_is_the_nearest_hospital(self):
+        far, near, middle = self.hospitals
+        self.assertEqual(select_destination(6.50, 3.30), near.pk)
+        self.assertEqual([pk for _, _, pk in nearest_hospitals(6.50, 3.30, k=3)], [near.pk, middle.pk, far.pk])
+
+    def test_index_follows_writes(self):
+        far, near, _ = self.hospitals
+        with self.captureOnCommitCallbacks(execute=True):
+            HospitalLocation.objects.filter(hospital=far).get().delete()
+            HospitalLocation.objects.create(hospital=far, latitude=6.50, longitude=3.30)
+        self.assertEqual(select_destination(6.50, 3.30), far.pk)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            far.delete()
+        self.assertEqual(select_destination(6.50, 3.30), near.pk)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Hospital.objects.all().delete()
+        self.assertIsNone(select_destination(6.50, 3.30))
+
+    def test_endpoint(self):
+        far, near, middle = self.hospitals
+        response = APIClient().get(
+            "/v1/hospitals/nearest/", {"latitude": "6.50", "longitude": "3.30", "limit": 2, "rankBy": "distance"}
+        )
+        self.assertEqual(response.status_code, 200)
+        data = response.json()["data"]
+        self.assertEqual([h["id"] for h in data], [str(near.pk), str(middle.pk)])
+        self.assertAlmostEqual(data[0]["distanceKm"], 1, delta=0.01)
+        self.assertIsNone(data[0]["etaSeconds"])
+
+        response = APIClient().get("/v1/hospitals/nearest/", {"latitude": "91", "longitude": "3.30"})
+        self.assertEqual(response.status_code, 400)
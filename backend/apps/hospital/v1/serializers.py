@@ -2,6 +2,7 @@
 
 from rest_framework import serializers
 from apps.hospital.models import Hospital, HospitalLocation
+from utils.fields import LatitudeField, LongitudeField
 from apps.hospital.v1.services import (
     create_hospital,
     update_hospital,
@@ -9,10 +10,20 @@ from apps.hospital.v1.services import (
 
 
 class HospitalLocationSerializer(serializers.ModelSerializer):
+    longitude = LongitudeField()
+    latitude = LatitudeField()
+
     class Meta:
         model = HospitalLocation
         fields = ["longitude", "latitude"]
 
+class NearestHospitalQuerySerializer(serializers.Serializer):
+    latitude = LatitudeField()
+    longitude = LongitudeField()
+    limit = serializers.IntegerField(min_value=1, max_value=50, default=5)
+    rankBy = serializers.ChoiceField(choices=["eta", "distance"], default="eta", source="rank_by")
+
+
 class HospitalSerializer(serializers.ModelSerializer):
     contactNumber = serializers.CharField(source="contact_number")
     location = HospitalLocationSerializer()
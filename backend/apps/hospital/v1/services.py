@@ -1,7 +1,11 @@
+from apps.hospital.index import hospital_index
 from apps.hospital.models import Hospital, HospitalLocation
-from typing import Dict
+from typing import Dict, List, Optional, Tuple
+from django.conf import settings
 from django.db import transaction
 from django.core.exceptions import ValidationError
+from utils.cache import ambulance_catalog, hospital_catalog
+from utils.routing import get_eta_engine
 
 
 @transaction.atomic
@@ -11,8 +15,8 @@ def create_hospital(validated_data: Dict, created_by=None) -> Hospital:
     exists = Hospital.objects.filter(
         name__iexact=validated_data["name"].strip(),
         address__iexact=validated_data["address"].strip(),
-        location__latitude__iexact=location_data["latitude"].strip(),
-        location__longitude__iexact=location_data["longitude"].strip(),
+        location__latitude=location_data["latitude"],
+        location__longitude=location_data["longitude"],
     ).exists()
 
     if exists:
@@ -20,6 +24,7 @@ def create_hospital(validated_data: Dict, created_by=None) -> Hospital:
 
     hospital = Hospital.objects.create(created_by=created_by, **validated_data)
     HospitalLocation.objects.create(hospital=hospital, **location_data)
+    transaction.on_commit(lambda: hospital_catalog.invalidate([hospital.pk], lists=True))
     return hospital
 
 
@@ -29,16 +34,16 @@ def update_hospital(instance: Hospital, validated_data: Dict) -> Hospital:
 
     # Only run duplicate check if location is being updated
     if location_data:
-        latitude = location_data.get("latitude", "").strip()
-        longitude = location_data.get("longitude", "").strip()
+        latitude = location_data.get("latitude", instance.location.latitude)
+        longitude = location_data.get("longitude", instance.location.longitude)
         name = validated_data.get("name", instance.name).strip()
         address = validated_data.get("address", instance.address).strip()
 
         exists = Hospital.objects.exclude(id=instance.id).filter(
             name__iexact=name,
             address__iexact=address,
-            location__latitude__iexact=latitude,
-            location__longitude__iexact=longitude,
+            location__latitude=latitude,
+            location__longitude=longitude,
         ).exists()
 
         if exists:
@@ -53,4 +58,36 @@ def update_hospital(instance: Hospital, validated_data: Dict) -> Hospital:
             hospital=instance, defaults=location_data
         )
 
+    # Ambulance payloads embed their hospital
+    ambulance_ids = list(instance.ambulance.values_list("pk", flat=True))
+    transaction.on_commit(lambda: hospital_catalog.invalidate([instance.pk]))
+    transaction.on_commit(lambda: ambulance_catalog.invalidate(ambulance_ids))
     return instance
+
+
+def nearest_hospitals(lat, lon, k: int = 5, by_eta: bool = True) -> List[Tuple[float, Optional[float], object]]:
+    """
+    Return up to `k` `(distance_km, eta_seconds, hospital_id)` for the
+    hospitals closest to a point, from the in-memory index. When `by_eta`
+    is set and a road graph is configured, the `HOSPITAL_ETA_CANDIDATES`
+    closest in a straight line are re-ranked by road travel time; hospitals
+    without a route keep their place behind those that have one.
+    """
+    engine = get_eta_engine() if by_eta else None
+    if engine is None:
+        return [(distance, None, pk) for distance, pk in hospital_index.nearest(lat, lon, k=k)]
+
+    candidates = hospital_index.nearest(lat, lon, k=max(k, settings.HOSPITAL_ETA_CANDIDATES))
+    timed = []
+    for distance, pk in candidates:
+        position = hospital_index.position(pk)
+        eta = engine.eta(lat, lon, *position) if position else None
+        timed.append((eta is None, eta or 0.0, distance, eta, pk))
+    timed.sort(key=lambda row: row[:3])
+    return [(distance, eta, pk) for _, _, distance, eta, pk in timed[:k]]
+
+
+def select_destination(lat, lon) -> Optional[object]:
+    """Id of the hospital a patient at `(lat, lon)` should be taken to, if any."""
+    nearest = nearest_hospitals(lat, lon, k=1)
+    return nearest[0][2] if nearest else None
@@ -1,44 +1,59 @@
+import uuid
+
 from rest_framework import status, viewsets
+from rest_framework.decorators import action
 from rest_framework.permissions import AllowAny
 from rest_framework.exceptions import NotFound 
 from django.core.exceptions import ValidationError
 from apps.hospital.models import Hospital
-from apps.hospital.v1.serializers import HospitalSerializer
-from apps.hospital.v1.services import create_hospital, update_hospital
+from apps.hospital.v1.serializers import HospitalSerializer, NearestHospitalQuerySerializer
+from apps.hospital.v1.services import create_hospital, nearest_hospitals, update_hospital
+from utils.cache import hospital_catalog
+from utils.conditional import ConditionalGetMixin
 from utils.permissions import IsAdmin
 from utils.responses import api_response
 
 
-class HospitalViewSet(viewsets.ModelViewSet):
-    queryset = Hospital.objects.all()
+class HospitalViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
+    queryset = Hospital.objects.select_related("location", "created_by")
     serializer_class = HospitalSerializer
 
     def get_permissions(self):
-        if self.request.method == "GET":
+        if self.request.method == "GET" and self.action != "cache_stats":
             return [AllowAny()]
         return [IsAdmin()]
 
+    def serialize(self, hospitals):
+        return self.get_serializer(hospitals, many=True).data
+
+    def load(self, ids):
+        return {item["id"]: item for item in self.serialize(self.get_queryset().filter(pk__in=ids))}
+
     def list(self, request, *args, **kwargs):
         queryset = self.filter_queryset(self.get_queryset())
-        serializer = self.get_serializer(queryset, many=True)
-        message = "No Hospital record" if not queryset else "Hospitals retrieved successfully."
-        return api_response(
-            status=status.HTTP_200_OK,
-            message=message,
-            data=serializer.data,
-        )
+        not_modified = self.not_modified(request, queryset)
+        if not_modified is not None:
+            return not_modified
+        page = hospital_catalog.page(request, queryset, self.paginator, self, self.serialize)
+        message = "No Hospital record" if not page else "Hospitals retrieved successfully."
+        return self.paginator.get_paginated_response(page, message=message)
 
     def retrieve(self, request, *args, **kwargs):
         try:
-            instance = self.get_object()
-        except Hospital.DoesNotExist:
+            pk = uuid.UUID(str(kwargs["pk"]))
+        except ValueError:
+            raise NotFound("Hospital not found.")
+        not_modified = self.not_modified(request, self.get_queryset().filter(pk=pk))
+        if not_modified is not None:
+            return not_modified
+        hospital = hospital_catalog.get_many([pk], self.load).get(str(pk))
+        if hospital is None:
             raise NotFound("Hospital not found.")
 
-        serializer = self.get_serializer(instance)
         return api_response(
             status=status.HTTP_200_OK,
             message="Hospital retrieved successfully.",
-            data=serializer.data,
+            data=hospital,
         )
 
     def create(self, request, *args, **kwargs):
@@ -84,3 +99,40 @@ class HospitalViewSet(viewsets.ModelViewSet):
             message="Hospital deleted successfully.",
             data=None,
         )
+
+    @action(detail=False, methods=["get"], url_path="nearest")
+    def nearest(self, request):
+        """
+        The hospitals closest to a point, by road travel time when a road
+        graph is configured (`rankBy=eta`, the default) or straight-line
+        distance.
+        """
+        query = NearestHospitalQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+        ranked = nearest_hospitals(
+            params["latitude"], params["longitude"], k=params["limit"], by_eta=params["rank_by"] == "eta"
+        )
+        hospitals = hospital_catalog.get_many([pk for _, _, pk in ranked], self.load)
+        data = []
+        for distance, eta, pk in ranked:
+            if str(pk) in hospitals:
+                # Copy, as cached payloads are shared between requests
+                item = dict(hospitals[str(pk)])
+                item["distanceKm"] = round(distance, 3)
+                item["etaSeconds"] = None if eta is None else round(eta)
+                data.append(item)
+        return api_response(
+            status=status.HTTP_200_OK,
+            message="Nearest hospitals retrieved successfully." if data else "No Hospital record",
+            data=data,
+        )
+
+    @action(detail=False, methods=["get"], url_path="cache-stats")
+    def cache_stats(self, request):
+        """Hit and miss counters of this process's hospital payload cache."""
+        return api_response(
+            status=status.HTTP_200_OK,
+            message="Hospital cache statistics retrieved successfully.",
+            data=hospital_catalog.stats(),
+        )
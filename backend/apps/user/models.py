@@ -23,6 +23,9 @@ class User(AbstractUser, Audit):
     class Meta:
         db_table = DB_NAMES.User
         ordering = ["-date_created"]
+        indexes = [
+            models.Index(fields=["date_created", "id"]),
+        ]
 
 
 class Profile(Audit):
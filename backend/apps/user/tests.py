@@ -1,3 +1,88 @@
+import base64
+from datetime import timedelta
+
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from apps.user.models import User
+from utils.testing import QueryBudgetMixin
+
+
+class UserQueryBudgetTests(QueryBudgetMixin, TestCase):
+    url = "/v1/users/"
+    list_queries = 1
+
+    def fill(self, total):
+        start = User.objects.count()
+        User.objects.bulk_create(
+            [
+                User(username=f"user{i}", email=f"user{i}@example.com", first_name="User", last_name=str(i))
+                for i in range(start, total)
+            ]
+        )
+
+
+class KeysetPaginationTests(TestCase):
+    """Pages follow `(date_created, id)` newest first, ties broken by id."""
+
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.bulk_create(
+            [User(username=f"user{i}", email=f"user{i}@example.com") for i in range(25)]
+        )
+        # Three creation times shared by many rows, so pages split inside ties
+        now = timezone.now()
+        for i, user in enumerate(User.objects.order_by("username")):
+            User.objects.filter(pk=user.pk).update(date_created=now - timedelta(minutes=i % 3))
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def page(self, cursor=None, limit=10):
+        params = {"limit": limit}
+        if cursor:
+            params["cursor"] = cursor
+        return self.client.get("/v1/users/", params)
+
+    def walk(self, limit):
+        emails, cursor, pages = [], None, 0
+        while True:
+            body = self.page(cursor, limit).json()
+            emails += [user["email"] for user in body["data"]]
+            pages += 1
+            cursor = body["pagination"]["next"]
+            if cursor is None:
+                return emails, pages
+
+    def test_walking_every_page_returns_each_row_once_in_order(self):
+        expected = list(User.objects.order_by("-date_created", "-id").values_list("email", flat=True))
+        for limit in (1, 7, 10, 25, 100):
+            with self.subTest(limit=limit):
+                emails, pages = self.walk(limit)
+                self.assertEqual(emails, expected)
+                self.assertEqual(pages, max(-(-25 // limit), 1))
+
+    def test_rows_created_while_paging_do_not_shift_later_pages(self):
+        first = self.page().json()
+        User.objects.create(username="newcomer", email="newcomer@example.com")
+        second = self.page(first["pagination"]["next"]).json()
+        seen = [user["email"] for user in first["data"] + second["data"]]
+        self.assertEqual(len(set(seen)), 20)
+        self.assertNotIn("newcomer@example.com", seen)
 
-# Create your tests here.
+    def test_tampered_cursors_are_rejected(self):
+        cursor = self.page().json()["pagination"]["next"]
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        forged = [
+            "not-a-cursor!",
+            cursor[:-3],
+            base64.urlsafe_b64encode(raw.replace(b'"]', b'x"]')).decode(),
+            base64.urlsafe_b64encode(b'["yesterday","00000000-0000-0000-0000-000000000000"]').decode(),
+            base64.urlsafe_b64encode(b'{"id": 1}').decode(),
+        ]
+        for value in forged:
+            with self.subTest(cursor=value):
+                response = self.page(value)
+                self.assertEqual(response.status_code, 404)
+                self.assertEqual(response.json()["message"], "Invalid cursor.")
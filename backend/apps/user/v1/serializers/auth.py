@@ -47,7 +47,7 @@ class UserSerializer(serializers.ModelSerializer):
     isActive = serializers.BooleanField(source="is_active", read_only=True)
     dateCreated = serializers.DateTimeField(source="date_created")
     lastUpdated = serializers.DateTimeField(source="last_updated")
-    uniqueId = serializers.CharField(source="unique_id", read_only=True)
+    uniqueId = serializers.CharField(source="pk", read_only=True)
 
     class Meta:
         model = User
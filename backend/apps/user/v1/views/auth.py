@@ -288,11 +288,6 @@ class GetUsersView(generics.ListAPIView):
         return qs
     
     def list(self, request, *args, **kwargs):
-        queryset = self.get_queryset()
-        serializer = self.get_serializer(queryset, many=True)
-
-        return api_response(
-            status=status.HTTP_200_OK,
-            message="Users retrieved successfully.",
-            data=serializer.data,
-        )
+        page = self.paginate_queryset(self.get_queryset())
+        serializer = self.get_serializer(page, many=True)
+        return self.paginator.get_paginated_response(serializer.data, message="Users retrieved successfully.")
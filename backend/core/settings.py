@@ -73,6 +73,12 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        # Take the write lock up front so concurrent dispatches queue on the
+        # busy timeout instead of failing with "database is locked".
+        "OPTIONS": {"transaction_mode": "IMMEDIATE", "timeout": 20},
+        # A file-backed test database keeps SQLite's normal locking; the
+        # shared-cache in-memory default rejects concurrent writers outright.
+        "TEST": {"NAME": BASE_DIR / "test_db.sqlite3"},
     }
 }
 
@@ -168,9 +174,10 @@ REST_FRAMEWORK = {
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.AllowAny",
     ],
+    # The browsable API renders its own HTML page per request; development only
     "DEFAULT_RENDERER_CLASSES": [
         "utils.renderers.CustomResponseRenderer",
-        "rest_framework.renderers.BrowsableAPIRenderer",
+        *(["rest_framework.renderers.BrowsableAPIRenderer"] if DEBUG else []),
     ],
     "DEFAULT_PAGINATION_CLASS": "utils.pagination.CustomPagination",
 }
@@ -192,4 +199,47 @@ EMAIL_HOST_USER = env("EMAIL_HOST_USER")
 EMAIL_HOST_PASSWORD = env("EMAIL_HOST_PASSWORD")
 DEFAULT_FROM_EMAIL = env("DEFAULT_FROM_EMAIL")
 
-AUTH_USER_MODEL = "user.User"
\ No newline at end of file
+AUTH_USER_MODEL = "user.User"
+
+# CACHE
+# Use a cache shared by every process in production, e.g. CACHE_URL=redis://127.0.0.1:6379/1
+CACHES = {"default": env.cache("CACHE_URL", default="locmemcache://?max_entries=100000")}
+
+# DISPATCH
+AMBULANCE_INDEX_TTL = env.int("AMBULANCE_INDEX_TTL", default=60)
+HOSPITAL_INDEX_TTL = env.int("HOSPITAL_INDEX_TTL", default=300)
+DISPATCH_CLAIM_ROUNDS = env.int("DISPATCH_CLAIM_ROUNDS", default=5)
+# With no unit free, take one still on its way to a less urgent request
+DISPATCH_PREEMPTION = env.bool("DISPATCH_PREEMPTION", default=True)
+# Requests made this many minutes back count towards the queue endpoint's wait times
+DISPATCH_QUEUE_STATS_MINUTES = env.int("DISPATCH_QUEUE_STATS_MINUTES", default=60)
+# Collect emergencies for this many milliseconds and assign them together (0 disables)
+DISPATCH_BATCH_WINDOW_MS = env.int("DISPATCH_BATCH_WINDOW_MS", default=0)
+# Local road graph (.npz from `build_road_graph`) used to rank candidates by ETA
+ROAD_GRAPH_PATH = env("ROAD_GRAPH_PATH", default=None)
+ROUTING_CACHE_SIZE = env.int("ROUTING_CACHE_SIZE", default=100_000)
+DISPATCH_ETA_TOP_K = env.int("DISPATCH_ETA_TOP_K", default=5)
+# Closest hospitals (straight line) re-ranked by road ETA when choosing a destination
+HOSPITAL_ETA_CANDIDATES = env.int("HOSPITAL_ETA_CANDIDATES", default=5)
+# Queue new emergencies for `run_dispatch_workers` and answer 202 instead of assigning inline
+DISPATCH_ASYNC = env.bool("DISPATCH_ASYNC", default=False)
+DISPATCH_JOB_LEASE_SECONDS = env.int("DISPATCH_JOB_LEASE_SECONDS", default=30)
+DISPATCH_JOB_MAX_ATTEMPTS = env.int("DISPATCH_JOB_MAX_ATTEMPTS", default=5)
+# How often buffered GPS fixes are written to the database
+LOCATION_FLUSH_INTERVAL_MS = env.int("LOCATION_FLUSH_INTERVAL_MS", default=1000)
+# Shared key that lets trackers and gateways post GPS fixes without an admin account
+LOCATION_INGEST_KEY = env("LOCATION_INGEST_KEY", default=None)
+# Master secret from which each tracker's telemetry key is derived
+TELEMETRY_SECRET = env("TELEMETRY_SECRET", default=None)
+TELEMETRY_MAX_SKEW_SECONDS = env.int("TELEMETRY_MAX_SKEW_SECONDS", default=300)
+# Side in degrees of the tiles that partition dispatch between worker processes;
+# a worker also indexes units one tile beyond its own area
+DISPATCH_REGION_SIZE = env.float("DISPATCH_REGION_SIZE", default=0.02)
+# Server-sent event streams: keep-alive interval, and queued events per client before it is reset
+EVENT_STREAM_HEARTBEAT_SECONDS = env.int("EVENT_STREAM_HEARTBEAT_SECONDS", default=15)
+EVENT_STREAM_MAX_PENDING = env.int("EVENT_STREAM_MAX_PENDING", default=1000)
+# Hospital and ambulance payload cache: seconds kept in the shared cache, entries kept per process
+CATALOG_CACHE_TIMEOUT = env.int("CATALOG_CACHE_TIMEOUT", default=300)
+CATALOG_CACHE_LOCAL_SIZE = env.int("CATALOG_CACHE_LOCAL_SIZE", default=10_000)
+# Rows fetched from the database, and written to the response, per chunk of an export
+EMERGENCY_EXPORT_CHUNK_SIZE = env.int("EMERGENCY_EXPORT_CHUNK_SIZE", default=2000)
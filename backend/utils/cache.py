@@ -0,0 +1,167 @@
+"""
+Two-tier read-through cache for catalog payloads: the serialized hospitals
+and ambulances served by the list and detail endpoints.
+
+Lookups try a per-process LRU first, then the Django cache shared by all
+processes, then the database. Nothing is ever deleted to invalidate an
+entry; instead every key embeds version tokens kept in the shared cache:
+
+- each item has its own token, replaced by `invalidate(ids)`, so every copy
+  of the old payload, in any process's LRU or in the shared cache, is
+  simply never asked for again and ages out;
+- cached list pages only hold the ids on the page and are keyed by a
+  catalog-wide list token, replaced with `invalidate(ids, lists=True)`
+  whenever rows are added or removed (lists are ordered by creation, so
+  nothing else changes which ids a page holds);
+- `invalidate_all()` replaces a generation token that prefixes every key,
+  for bulk writes that cannot say which rows they touched.
+
+Tokens are read before the database, so a payload loaded while a write
+commits is stored under the token that write has just replaced.
+Invalidate from `transaction.on_commit`, so a reader cannot cache a
+payload from before the commit under the new token.
+"""
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+
+Loader = Callable[[List[str]], Dict[str, dict]]
+
+
+class CatalogCache:
+    def __init__(self, name: str, local_size: Optional[int] = None):
+        self.name = name
+        self._local_size = local_size
+        self._local: "OrderedDict[str, object]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.local_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+    @property
+    def local_size(self) -> int:
+        return self._local_size or settings.CATALOG_CACHE_LOCAL_SIZE
+
+    def _key(self, *parts) -> str:
+        return ":".join(("catalog", self.name, *map(str, parts)))
+
+    def _tokens(self, names: Iterable[str]) -> Dict[str, str]:
+        """Current version token of each name, creating missing ones."""
+        keys = {self._key("token", name): name for name in names}
+        found = cache.get_many(keys)
+        missing = [key for key in keys if key not in found]
+        if missing:
+            for key in missing:
+                cache.add(key, uuid.uuid4().hex, timeout=None)
+            # Another process may have added a token first; use whichever won
+            found.update(cache.get_many(missing))
+        return {keys[key]: token for key, token in found.items()}
+
+    def _get_local(self, key: str):
+        with self._lock:
+            value = self._local.get(key)
+            if value is not None:
+                self._local.move_to_end(key)
+                self.local_hits += 1
+            return value
+
+    def _set_local(self, items: Dict[str, object]) -> None:
+        with self._lock:
+            for key, value in items.items():
+                self._local[key] = value
+                self._local.move_to_end(key)
+            while len(self._local) > self.local_size:
+                self._local.popitem(last=False)
+
+    def _get(self, keys: Iterable[str]) -> Dict[str, object]:
+        """Look `keys` up in both tiers, promoting shared hits to the LRU."""
+        found, remote = {}, []
+        for key in keys:
+            value = self._get_local(key)
+            if value is None:
+                remote.append(key)
+            else:
+                found[key] = value
+        if remote:
+            shared = cache.get_many(remote)
+            self._set_local(shared)
+            with self._lock:
+                self.shared_hits += len(shared)
+                self.misses += len(remote) - len(shared)
+            found.update(shared)
+        return found
+
+    def _set(self, items: Dict[str, object]) -> None:
+        cache.set_many(items, timeout=settings.CATALOG_CACHE_TIMEOUT)
+        self._set_local(items)
+
+    def get_many(self, ids: Iterable, load: Loader) -> Dict[str, dict]:
+        """
+        Payloads of `ids`, keyed by id as a string. `load` is called once
+        with the ids found in neither tier and must return their payloads;
+        ids it omits (deleted rows) are left out of the result.
+        Treat the payloads as read-only: they are shared between requests.
+        """
+        ids = [str(pk) for pk in ids]
+        tokens = self._tokens(["generation", *ids])
+        keys = {self._key("item", tokens["generation"], pk, tokens[pk]): pk for pk in ids}
+        found = self._get(keys)
+        result = {keys[key]: value for key, value in found.items()}
+        missing = [pk for pk in ids if pk not in result]
+        if missing:
+            loaded = load(missing)
+            generation = tokens["generation"]
+            self._set({self._key("item", generation, pk, tokens[pk]): loaded[pk] for pk in missing if pk in loaded})
+            result.update(loaded)
+        return result
+
+    def page(self, request, queryset, paginator, view, serialize: Callable[[Iterable], List[dict]]) -> List[dict]:
+        """
+        One page of `queryset` through `paginator`, serialized. The ids on
+        the page and its next cursor are cached by query; the payloads come
+        from `get_many`. A cold page is one query, as without the cache.
+        """
+        tokens = self._tokens(["generation", "lists"])
+        cursor = request.query_params.get(paginator.cursor_query_param) or ""
+        limit = paginator.get_limit(request)
+        key = self._key("list", tokens["generation"], tokens["lists"], limit, cursor)
+
+        entry = self._get([key]).get(key)
+        if entry is None:
+            data = serialize(paginator.paginate_queryset(queryset, request, view))
+            self._set({key: {"ids": [item["id"] for item in data], "next": paginator.next_cursor}})
+            return data
+
+        paginator.limit, paginator.next_cursor = limit, entry["next"]
+        payloads = self.get_many(
+            entry["ids"],
+            lambda missing: {item["id"]: item for item in serialize(queryset.filter(pk__in=missing))},
+        )
+        return [payloads[pk] for pk in entry["ids"] if pk in payloads]
+
+    def invalidate(self, ids: Iterable = (), lists: bool = False) -> None:
+        tokens = {self._key("token", pk): uuid.uuid4().hex for pk in ids}
+        if lists:
+            tokens[self._key("token", "lists")] = uuid.uuid4().hex
+        if tokens:
+            cache.set_many(tokens, timeout=None)
+
+    def invalidate_all(self) -> None:
+        cache.set(self._key("token", "generation"), uuid.uuid4().hex, timeout=None)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "localHits": self.local_hits,
+                "sharedHits": self.shared_hits,
+                "misses": self.misses,
+                "localEntries": len(self._local),
+            }
+
+
+hospital_catalog: CatalogCache = CatalogCache("hospital")
+ambulance_catalog: CatalogCache = CatalogCache("ambulance")
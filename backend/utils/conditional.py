@@ -0,0 +1,61 @@
+import hashlib
+from typing import Optional, Tuple
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+
+class ConditionalGetMixin:
+    """
+    Strong `ETag` and `Last-Modified` validators for list and detail views,
+    so polling clients get a bodiless 304 when nothing has changed.
+
+    Validators come from one aggregate over the queryset, its newest
+    `last_updated` and its row count (so deletions change the ETag too),
+    plus the newest `last_updated` of each model in `etag_dependencies`
+    whose rows are embedded in the payload. A matching `If-None-Match` or
+    `If-Modified-Since` is answered before anything is serialized or
+    rendered. Last-Modified alone cannot reveal deletions; clients should
+    prefer the ETag.
+    """
+
+    etag_dependencies = ()
+
+    def validators(self, request, queryset) -> Optional[Tuple[str, object]]:
+        stats = queryset.order_by().aggregate(last_updated=Max("last_updated"), count=Count("pk"))
+        if not stats["count"]:
+            return None
+        moments = [stats["last_updated"]] + [
+            model.objects.aggregate(last_updated=Max("last_updated"))["last_updated"]
+            for model in self.etag_dependencies
+        ]
+        moments = [moment for moment in moments if moment is not None]
+        # Representations differ per media type, so it is part of the tag
+        key = repr((request.accepted_media_type, stats["count"], [m.isoformat() for m in moments]))
+        return f'"{hashlib.sha256(key.encode()).hexdigest()[:32]}"', max(moments)
+
+    def not_modified(self, request, queryset):
+        """
+        A 304 response if the client's copy of `queryset` is current, else
+        None. The validators are kept and added to the full response.
+        """
+        self._validators = self.validators(request, queryset)
+        if self._validators is None:
+            return None
+        etag, last_modified = self._validators
+        response = get_conditional_response(request, etag=etag, last_modified=int(last_modified.timestamp()))
+        if response is not None:
+            self._set_validators(response)
+        return response
+
+    def _set_validators(self, response) -> None:
+        etag, last_modified = self._validators
+        response["ETag"] = etag
+        response["Last-Modified"] = http_date(last_modified.timestamp())
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if getattr(self, "_validators", None) and response.status_code == 200:
+            self._set_validators(response)
+        return response
@@ -0,0 +1,201 @@
+"""
+In-process publish/subscribe bus behind the server-sent event streams.
+
+Publishers call `event_bus.publish` from any thread (request handlers,
+the location flush thread, on-commit hooks). Each subscriber is an SSE
+response being served on the ASGI event loop. Delivery never blocks a
+publisher; slow subscribers are handled in one of two ways:
+
+- keyed events (e.g. the state of one ambulance) are coalesced, so a
+  subscriber that falls behind only receives the latest value per key and
+  its memory is bounded by the number of keys;
+- other events are queued up to `EVENT_STREAM_MAX_PENDING`; a subscriber
+  that lets more pile up is sent a `reset` event and disconnected, so the
+  client reconnects and starts from a fresh snapshot.
+"""
+import asyncio
+import json
+import threading
+from collections import OrderedDict, deque
+from typing import AsyncIterator, Callable, Dict, Iterable, Optional, Set, Tuple
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, StreamingHttpResponse
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+
+Event = Tuple[str, dict]
+
+
+class Subscription:
+    def __init__(
+        self,
+        topics: Iterable[str],
+        accept: Optional[Callable[[dict], bool]] = None,
+        max_pending: Optional[int] = None,
+    ):
+        self.topics = set(topics)
+        self.accept = accept
+        self.max_pending = max_pending or settings.EVENT_STREAM_MAX_PENDING
+        self.overflowed = False
+        self._loop = asyncio.get_running_loop()
+        self._ready = asyncio.Event()
+        self._lock = threading.Lock()
+        self._queue: deque = deque()
+        self._latest: "OrderedDict[object, Event]" = OrderedDict()
+        self._signalled = False
+
+    def offer(self, event: str, data: dict, key=None) -> None:
+        """Hand an event to this subscriber. Safe to call from any thread."""
+        if self.accept is not None and not self.accept(data):
+            return
+        with self._lock:
+            if key is not None:
+                self._latest.pop(key, None)
+                self._latest[key] = (event, data)
+            elif len(self._queue) < self.max_pending:
+                self._queue.append((event, data))
+            else:
+                self.overflowed = True
+            if self._signalled:
+                return
+            self._signalled = True
+        try:
+            self._loop.call_soon_threadsafe(self._ready.set)
+        except RuntimeError:
+            # The loop serving this subscriber has already shut down
+            pass
+
+    def _drain(self):
+        with self._lock:
+            events = list(self._queue) + list(self._latest.values())
+            self._queue.clear()
+            self._latest.clear()
+            self._signalled = False
+            self._ready.clear()
+        return events
+
+    async def events(self, heartbeat: float) -> AsyncIterator[Optional[Event]]:
+        """
+        Yield events as they arrive, and None after `heartbeat` seconds
+        without any. Ends with a `reset` event if the subscriber overflowed.
+        """
+        while True:
+            try:
+                await asyncio.wait_for(self._ready.wait(), heartbeat)
+            except asyncio.TimeoutError:
+                yield None
+                continue
+            for event in self._drain():
+                yield event
+            if self.overflowed:
+                yield "reset", {"reason": "Too many pending events; reconnect to resync."}
+                return
+
+
+class EventBus:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._topics: Dict[str, Set[Subscription]] = {}
+
+    def subscribe(self, topics: Iterable[str], **kwargs) -> Subscription:
+        """Subscribe from the running event loop."""
+        subscription = Subscription(topics, **kwargs)
+        with self._lock:
+            for topic in subscription.topics:
+                self._topics.setdefault(topic, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            for topic in subscription.topics:
+                self._discard(topic, subscription)
+
+    def resubscribe(self, subscription: Subscription, topics: Iterable[str]) -> None:
+        """Move a subscription to another set of topics. Safe to call from any thread."""
+        topics = set(topics)
+        with self._lock:
+            for topic in subscription.topics - topics:
+                self._discard(topic, subscription)
+            for topic in topics - subscription.topics:
+                self._topics.setdefault(topic, set()).add(subscription)
+            subscription.topics = topics
+
+    def _discard(self, topic: str, subscription: Subscription) -> None:
+        subscribers = self._topics.get(topic)
+        if subscribers is not None:
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._topics[topic]
+
+    def has_subscribers(self, topic: str) -> bool:
+        return topic in self._topics
+
+    def publish(self, topic: str, event: str, data: dict, key=None) -> None:
+        with self._lock:
+            subscribers = list(self._topics.get(topic, ()))
+        for subscription in subscribers:
+            subscription.offer(event, data, key)
+
+
+event_bus: EventBus = EventBus()
+
+
+def format_sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n"
+
+
+async def stream_user(request):
+    """
+    Authenticate an SSE request by its JWT, from the `Authorization` header
+    or, since browsers' EventSource cannot set headers, a `token` query
+    parameter. Returns None when the token is missing or invalid.
+    """
+    authentication = JWTAuthentication()
+    header = authentication.get_header(request)
+    raw_token = authentication.get_raw_token(header) if header else request.GET.get("token")
+    if not raw_token:
+        return None
+    try:
+        token = authentication.get_validated_token(raw_token)
+        return await sync_to_async(authentication.get_user)(token)
+    except (InvalidToken, AuthenticationFailed):
+        return None
+
+
+def event_stream(
+    subscription: Subscription, initial: Iterable[Event] = (), on_idle=None
+) -> StreamingHttpResponse:
+    """
+    Serve a subscription as `text/event-stream`. `initial` events are sent
+    first; `on_idle` is awaited at each heartbeat and may return extra
+    events, to catch up with changes made in other processes.
+    """
+
+    async def body():
+        try:
+            for event, data in initial:
+                yield format_sse(event, data)
+            async for item in subscription.events(settings.EVENT_STREAM_HEARTBEAT_SECONDS):
+                if item is not None:
+                    yield format_sse(*item)
+                    continue
+                for event, data in (await on_idle() if on_idle else ()):
+                    yield format_sse(event, data)
+                yield ": keep-alive\n\n"
+        finally:
+            event_bus.unsubscribe(subscription)
+
+    response = StreamingHttpResponse(body(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+def stream_error(status: int, message: str) -> JsonResponse:
+    """Error response in the same envelope as the REST API."""
+    return JsonResponse(
+        {"status": status, "message": message, "data": None, "errors": None}, status=status
+    )
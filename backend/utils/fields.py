@@ -0,0 +1,37 @@
+from rest_framework import serializers
+
+
+class CoordinateField(serializers.CharField):
+    """
+    Latitude or longitude exchanged as a string on the API and stored as a
+    float in the database.
+    """
+
+    default_error_messages = {
+        "invalid": "A valid number is required.",
+        "out_of_range": "Ensure this value is between -{limit} and {limit}.",
+    }
+
+    def __init__(self, limit: float = 180, **kwargs):
+        self.limit = limit
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        value = super().to_internal_value(data)
+        try:
+            value = float(value)
+        except ValueError:
+            self.fail("invalid")
+        if not -self.limit <= value <= self.limit:
+            self.fail("out_of_range", limit=self.limit)
+        return value
+
+
+class LatitudeField(CoordinateField):
+    def __init__(self, **kwargs):
+        super().__init__(limit=90, **kwargs)
+
+
+class LongitudeField(CoordinateField):
+    def __init__(self, **kwargs):
+        super().__init__(limit=180, **kwargs)
@@ -0,0 +1,88 @@
+from math import radians, cos, sin, asin, sqrt
+
+import numpy as np
+
+# Earth radius in km
+EARTH_RADIUS_KM = 6371.0
+
+# Length of one degree of latitude in km
+KM_PER_DEGREE = 111.195
+
+
+def haversine_distance(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(float, (lat1, lon1, lat2, lon2))
+
+    dlat = radians(lat2 - lat1)
+    dlon = radians(lon2 - lon1)
+
+    a = sin(dlat / 2) ** 2 + cos(radians(lat1)) * cos(radians(lat2)) * sin(dlon / 2) ** 2
+    c = 2 * asin(sqrt(a))
+
+    return EARTH_RADIUS_KM * c
+
+
+def haversine_many(lat, lon, lats, lons) -> np.ndarray:
+    """
+    Great-circle distance in km from one point to every point in `lats`/`lons`.
+    """
+    lat_r = np.radians(float(lat))
+    lats_r = np.radians(np.asarray(lats, dtype=np.float64))
+    dlat = lats_r - lat_r
+    dlon = np.radians(np.asarray(lons, dtype=np.float64) - float(lon))
+
+    a = np.sin(dlat * 0.5) ** 2 + np.cos(lat_r) * np.cos(lats_r) * np.sin(dlon * 0.5) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def haversine_pairs(lats1, lons1, lats2, lons2) -> np.ndarray:
+    """
+    Element-wise great-circle distance in km between two equally sized
+    arrays of points.
+    """
+    lats1 = np.radians(np.asarray(lats1, dtype=np.float64))
+    lats2 = np.radians(np.asarray(lats2, dtype=np.float64))
+    dlon = np.radians(np.asarray(lons2, dtype=np.float64) - np.asarray(lons1, dtype=np.float64))
+
+    a = np.sin((lats2 - lats1) * 0.5) ** 2 + np.cos(lats1) * np.cos(lats2) * np.sin(dlon * 0.5) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def distance_matrix(query_lats, query_lons, lats, lons) -> np.ndarray:
+    """
+    Great-circle distances in km as a `(len(query_lats), len(lats))` matrix.
+    """
+    q_lats = np.radians(np.asarray(query_lats, dtype=np.float64))[:, None]
+    q_lons = np.radians(np.asarray(query_lons, dtype=np.float64))[:, None]
+    p_lats = np.radians(np.asarray(lats, dtype=np.float64))[None, :]
+    p_lons = np.radians(np.asarray(lons, dtype=np.float64))[None, :]
+
+    a = (
+        np.sin((p_lats - q_lats) * 0.5) ** 2
+        + np.cos(q_lats) * np.cos(p_lats) * np.sin((p_lons - q_lons) * 0.5) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def equirectangular_many(lat, lon, lats, lons) -> np.ndarray:
+    """
+    Flat-earth approximation of `haversine_many`, accurate to well under 1%
+    at city scale. Useful as a cheap pre-filter before the exact kernel.
+    """
+    lats = np.asarray(lats, dtype=np.float64)
+    x = (np.asarray(lons, dtype=np.float64) - float(lon)) * np.cos(
+        np.radians((lats + float(lat)) * 0.5)
+    )
+    y = lats - float(lat)
+    return KM_PER_DEGREE * np.sqrt(x * x + y * y)
+
+
+def bounding_box(lat, lon, radius_km):
+    """
+    `(min_lat, max_lat, min_lon, max_lon)` of the box enclosing a circle of
+    `radius_km` around the point, for index-backed range filters.
+    """
+    lat, lon = float(lat), float(lon)
+    lat_span = radius_km / KM_PER_DEGREE
+    reach = min(89.9, abs(lat) + lat_span)
+    lon_span = min(180.0, lat_span / cos(radians(reach)))
+    return lat - lat_span, lat + lat_span, lon - lon_span, lon + lon_span
@@ -1,11 +1,71 @@
-from rest_framework.pagination import LimitOffsetPagination
+import base64
+import json
+import uuid
+from datetime import datetime
 
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+
+from utils.responses import api_response
+
+
+class CustomPagination(BasePagination):
+    """
+    Keyset pagination on `(date_created, id)`, newest first.
+
+    The cursor is the sort key of the last row served, base64-encoded, so
+    each page is one index range scan that costs the same however deep it
+    is, and rows inserted while a client pages through are neither skipped
+    nor repeated. Pages are returned in the usual `api_response` envelope,
+    with `pagination.next` holding the cursor of the following page (None
+    on the last one).
+    """
 
-class CustomPagination(LimitOffsetPagination):
     default_limit = 10
     max_limit = 100
+    cursor_query_param = "cursor"
+    limit_query_param = "limit"
+    ordering = ("-date_created", "-id")
+
+    def get_limit(self, request) -> int:
+        try:
+            limit = int(request.query_params[self.limit_query_param])
+        except (KeyError, ValueError):
+            return self.default_limit
+        return min(max(limit, 1), self.max_limit)
+
+    @staticmethod
+    def encode_cursor(row) -> str:
+        key = json.dumps([row.date_created.isoformat(), str(row.pk)], separators=(",", ":"))
+        return base64.urlsafe_b64encode(key.encode()).decode().rstrip("=")
+
+    @staticmethod
+    def decode_cursor(cursor: str):
+        try:
+            padded = cursor + "=" * (-len(cursor) % 4)
+            created, pk = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            return datetime.fromisoformat(created), uuid.UUID(pk)
+        except (TypeError, ValueError):
+            raise NotFound("Invalid cursor.")
 
     def paginate_queryset(self, queryset, request, view=None):
-        if not queryset.exists():
-            return None
-        return super().paginate_queryset(queryset, request, view)
+        self.limit = self.get_limit(request)
+        queryset = queryset.order_by(*self.ordering)
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            created, pk = self.decode_cursor(cursor)
+            queryset = queryset.filter(Q(date_created__lt=created) | Q(date_created=created, pk__lt=pk))
+
+        # One row past the page tells whether there is a next one
+        rows = list(queryset[: self.limit + 1])
+        page = rows[: self.limit]
+        self.next_cursor = self.encode_cursor(page[-1]) if len(rows) > self.limit else None
+        return page
+
+    def get_paginated_response(self, data, message="Request completed successfully"):
+        return api_response(
+            message=message,
+            data=data,
+            pagination={"next": self.next_cursor, "limit": self.limit},
+        )
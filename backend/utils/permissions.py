@@ -1,3 +1,6 @@
+import hmac
+
+from django.conf import settings
 from rest_framework import permissions
 
 from apps.user.utils import UserTypesEnum
@@ -26,4 +29,19 @@ class IsPatient(permissions.BasePermission):
             request.user
             and request.user.is_authenticated
             and (request.user.role == UserTypesEnum.PATIENT)
-        )
\ No newline at end of file
+        )
+
+
+class IsLocationReporter(permissions.BasePermission):
+    """
+    Admins, or a tracker or gateway sending `LOCATION_INGEST_KEY` in the
+    `X-Location-Key` header. Devices need no user account, and the key
+    grants nothing beyond reporting positions.
+    """
+
+    def has_permission(self, request, view):
+        key = settings.LOCATION_INGEST_KEY
+        sent = request.headers.get("X-Location-Key")
+        if key and sent and hmac.compare_digest(sent.encode(), key.encode()):
+            return True
+        return IsAdmin().has_permission(request, view)
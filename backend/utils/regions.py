@@ -0,0 +1,104 @@
+"""
+Fixed tile grid used to split dispatch into geographic shards.
+
+A region is a `size` x `size` degree tile, identified by a single integer
+so it can be stored on a row and matched to a shard's regions in SQL.
+"""
+from collections import Counter
+from math import floor
+from typing import Dict, Iterable, List, Tuple
+
+from django.conf import settings
+
+# Tile indexes are offset to stay positive and packed as row * _STRIDE + column
+_OFFSET = 1 << 20
+_STRIDE = 1 << 21
+
+
+def region_size() -> float:
+    return settings.DISPATCH_REGION_SIZE
+
+
+def region_of(lat, lon, size: float = None) -> int:
+    size = size or region_size()
+    row = floor(float(lat) / size) + _OFFSET
+    column = floor(float(lon) / size) + _OFFSET
+    return row * _STRIDE + column
+
+
+def region_neighbours(region: int) -> List[int]:
+    """The region and the eight tiles around it."""
+    row, column = divmod(region, _STRIDE)
+    return [
+        (row + dr) * _STRIDE + column + dc
+        for dr in (-1, 0, 1)
+        for dc in (-1, 0, 1)
+    ]
+
+
+def _hilbert(row: int, column: int) -> int:
+    """Position of a tile along a Hilbert curve over the whole tile grid."""
+    x, y, d = column, row, 0
+    s = _STRIDE >> 1
+    while s:
+        rx, ry = int(x & s > 0), int(y & s > 0)
+        d += s * s * ((3 * rx) ^ ry)
+        if not ry:
+            if rx:
+                x, y = _STRIDE - 1 - x, _STRIDE - 1 - y
+            x, y = y, x
+        s >>= 1
+    return d
+
+
+class ShardPlan:
+    """
+    Which dispatch shard owns each region.
+
+    The regions covering the fleet's bounding box are put in Hilbert-curve
+    order and cut into `shards` contiguous runs holding about as many
+    ambulances each. Consecutive tiles on the curve are neighbours, so every
+    shard owns one compact area and the halo of bordering tiles it also
+    indexes is a thin ring around it. Regions outside the box belong to
+    shard 0. Every process must use the same plan, so it is computed once
+    and handed to all the workers.
+    """
+
+    def __init__(self, owners: Dict[int, int], shards: int, size: float = None):
+        self.owners = owners
+        self.shards = shards
+        self.size = size
+
+    @classmethod
+    def from_points(cls, points: Iterable[Tuple[float, float]], shards: int, size: float = None) -> "ShardPlan":
+        weights = Counter(region_of(lat, lon, size) for lat, lon in points)
+        if not weights:
+            return cls({}, shards, size)
+        tiles = [divmod(region, _STRIDE) for region in weights]
+        rows = range(min(t[0] for t in tiles), max(t[0] for t in tiles) + 1)
+        columns = range(min(t[1] for t in tiles), max(t[1] for t in tiles) + 1)
+        ordered = sorted(((r, c) for r in rows for c in columns), key=lambda t: _hilbert(*t))
+        total = sum(weights.values())
+
+        owners, shard, taken, seen = {}, 0, False, 0
+        for i, (row, column) in enumerate(ordered):
+            region = row * _STRIDE + column
+            weight = weights.get(region, 0)
+            wanted = min(int((seen + weight / 2) * shards / total), shards - 1)
+            # One shard further at most per tile, and soon enough that each gets a tile
+            if taken and shard < shards - 1 and (wanted > shard or len(ordered) - i <= shards - 1 - shard):
+                shard, taken = shard + 1, False
+            owners[region] = shard
+            taken = True
+            seen += weight
+        return cls(owners, shards, size)
+
+    def shard_of(self, region: int) -> int:
+        return self.owners.get(region, 0)
+
+    def regions(self, shard: int) -> List[int]:
+        return [region for region, owner in self.owners.items() if owner == shard]
+
+    def covers(self, lat, lon, shard: int) -> bool:
+        """Whether a point lies in a region of `shard` or in a tile bordering one."""
+        return any(self.shard_of(r) == shard for r in region_neighbours(region_of(lat, lon, self.size)))
@@ -1,30 +1,154 @@
+"""
+Renders every response in the `{status, message, data, errors}` envelope.
+
+Compact responses are written by `dumps`, which uses orjson when it is
+installed and the stdlib `json` module otherwise, and produces exactly the
+bytes DRF's `JSONRenderer` would. Successful envelopes are assembled from
+pre-encoded fragments around the encoded payload, so a large `data` list
+is encoded once and never copied into an intermediate dict. Indented
+output (`Accept: application/json; indent=4`, the browsable API) keeps
+DRF's own path.
+"""
+import json
+import math
+import re
+from functools import lru_cache
+
 from django.utils.encoding import force_str
 from rest_framework import status
 from rest_framework.renderers import JSONRenderer
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError:  # optional, falls back to the stdlib
+    orjson = None
+
+# DRF's encoder handles what orjson would format differently (datetimes,
+# dataclasses) or not at all (Decimal, lazy strings, querysets, ...)
+_default = encoders.JSONEncoder().default
+_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS if orjson is not None else 0
+
+# orjson writes non-zero floats below 1e-4 differently from `repr`
+# ("0.00001" and "2.5e-7" for "1e-05" and "2.5e-07"). Output that may hold
+# one is encoded again with the stdlib. The exponent pattern needs the
+# closing delimiter so the "e-" inside UUIDs does not match.
+_SMALL_FLOAT = re.compile(rb'e-[0-9][,}\]"]')
+
+_STATUS = b'{"status":'
+_MESSAGE = b',"message":'
+_DATA = b',"data":'
+_ERRORS = b',"errors":null'
+_PAGINATION = b',"pagination":'
+_END = b"}"
+
+
+def _stdlib_dumps(value) -> bytes:
+    text = json.dumps(value, cls=encoders.JSONEncoder, ensure_ascii=False, allow_nan=False, separators=(",", ":"))
+    return text.replace("\u2028", "\\u2028").replace("\u2029", "\\u2029").encode()
+
+
+def _has_non_finite(value) -> bool:
+    """Whether a NaN or an infinity is nested anywhere in `value`."""
+    stack = [value]
+    while stack:
+        item = stack.pop()
+        kind = type(item)
+        # Checked first, as nearly every leaf is one of these
+        if kind is str or item is None or kind is int or kind is bool:
+            continue
+        if isinstance(item, float):
+            if not math.isfinite(item):
+                return True
+        elif isinstance(item, dict):
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple)):
+            stack.extend(item)
+    return False
+
+
+def dumps(value) -> bytes:
+    """
+    `value` as compact UTF-8 JSON, byte for byte what DRF's `JSONRenderer`
+    writes with the default settings, NaN and infinities included: they
+    raise `ValueError` on either path.
+    """
+    if orjson is None:
+        return _stdlib_dumps(value)
+    try:
+        out = orjson.dumps(value, default=_default, option=_OPTIONS)
+    except orjson.JSONEncodeError:
+        # Non-string keys, integers beyond 64 bits, or an error the stdlib
+        # will raise as well
+        return _stdlib_dumps(value)
+    if b"0.0000" in out or _SMALL_FLOAT.search(out):
+        return _stdlib_dumps(value)
+    # orjson writes NaN and infinities as null where the stdlib raises.
+    # Only output holding a null can hide one, so other payloads skip the walk
+    if b"null" in out and _has_non_finite(value):
+        return _stdlib_dumps(value)
+    # Keep the output a strict JavaScript subset, as DRF does
+    if b"\xe2\x80" in out:
+        out = out.replace(b"\xe2\x80\xa8", b"\\u2028").replace(b"\xe2\x80\xa9", b"\\u2029")
+    return out
+
+
+@lru_cache(maxsize=1024)
+def _prefix(status_code: int, message: str) -> bytes:
+    """Everything before the payload, for a status and message pair."""
+    return b"".join((_STATUS, b"%d" % status_code, _MESSAGE, dumps(message), _DATA))
 
 
 class CustomResponseRenderer(JSONRenderer):
     def render(self, data, accepted_media_type=None, renderer_context=None):
         status_code = renderer_context.get("response").status_code
+        fast = (
+            self.compact
+            and self.strict
+            and not self.ensure_ascii
+            and self.get_indent(accepted_media_type, renderer_context) is None
+        )
 
         if status_code < status.HTTP_400_BAD_REQUEST:  # GOOD RESPONSE
+            if fast:
+                return self.render_envelope(data, status_code)
             response_data = self.good_response(data, status_code)
 
         else:  # BAD RESPONSE
             response_data = self.bad_response(data, status_code)
+            if fast:
+                return dumps(response_data)
 
         return super(CustomResponseRenderer, self).render(
             response_data, accepted_media_type, renderer_context
         )
 
+    @staticmethod
+    def render_envelope(data, status_code) -> bytes:
+        """The same bytes as rendering `good_response(data, status_code)`."""
+        message = data.pop("message", None)
+        payload = data.pop("data")
+        if type(message) is str:
+            parts = [_prefix(status_code, message)]
+        else:
+            parts = [_STATUS, b"%d" % status_code, _MESSAGE, dumps(message), _DATA]
+        parts += [dumps(payload), _ERRORS]
+        if "pagination" in data:
+            parts += [_PAGINATION, dumps(data.pop("pagination"))]
+        parts.append(_END)
+        return b"".join(parts)
+
     @staticmethod
     def good_response(data, status_code):
-        return {
+        response_data = {
             "status": status_code,
             "message": data.pop("message", None),
             "data": data.pop("data"),
             "errors": None,
         }
+        if "pagination" in data:
+            response_data["pagination"] = data.pop("pagination")
+        return response_data
 
     @staticmethod
     def bad_response(data, status_code):
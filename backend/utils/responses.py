@@ -9,11 +9,15 @@ def api_response(
     status=status.HTTP_200_OK,
     message="Request completed successfully",
     data=None,
+    pagination=None,
 ):
     """
     A utility function to standardize API responses.
     """
-    return Response({"status": status, "message": message, "data": data}, status=status)
+    body = {"status": status, "message": message, "data": data}
+    if pagination is not None:
+        body["pagination"] = pagination
+    return Response(body, status=status)
 
 
 class CustomRedirect(HttpResponsePermanentRedirect):
@@ -0,0 +1,170 @@
+import heapq
+import threading
+from collections import OrderedDict
+from math import floor
+from typing import Optional, Tuple
+
+import numpy as np
+
+from utils.geo import haversine_distance
+from utils.spatial import GridIndex
+
+
+class RoadGraph:
+    """
+    Directed road network in compressed sparse row form.
+
+    Node coordinates live in `lats`/`lons`; the outgoing edges of node `i`
+    are `indices[indptr[i]:indptr[i + 1]]` with travel times in `seconds`.
+    Graphs are stored on disk as a single `.npz` file (see the
+    `build_road_graph` management command).
+    """
+
+    def __init__(self, lats, lons, indptr, indices, seconds, max_speed_mps: float):
+        self.lats = np.asarray(lats, dtype=np.float64)
+        self.lons = np.asarray(lons, dtype=np.float64)
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int32)
+        self.seconds = np.asarray(seconds, dtype=np.float32)
+        self.max_speed_mps = float(max_speed_mps)
+        self._nodes: Optional[GridIndex] = None
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.lats)
+
+    @classmethod
+    def load(cls, path) -> "RoadGraph":
+        with np.load(path) as data:
+            return cls(
+                data["lats"],
+                data["lons"],
+                data["indptr"],
+                data["indices"],
+                data["seconds"],
+                float(data["max_speed_mps"]),
+            )
+
+    def save(self, path) -> None:
+        np.savez_compressed(
+            path,
+            lats=self.lats,
+            lons=self.lons,
+            indptr=self.indptr,
+            indices=self.indices,
+            seconds=self.seconds,
+            max_speed_mps=np.float64(self.max_speed_mps),
+        )
+
+    def nearest_node(self, lat: float, lon: float) -> Optional[int]:
+        with self._lock:
+            if self._nodes is None:
+                self._nodes = GridIndex(cell_size=0.005)
+                for node, (node_lat, node_lon) in enumerate(zip(self.lats, self.lons)):
+                    self._nodes.insert(node, node_lat, node_lon)
+        nearest = self._nodes.nearest(lat, lon, k=1)
+        return nearest[0][1] if nearest else None
+
+    def travel_time(self, source: int, target: int) -> Optional[float]:
+        """
+        Fastest travel time in seconds between two nodes, or None if the
+        target is unreachable. A* search with a straight-line heuristic at
+        the graph's top speed, which never overestimates.
+        """
+        if source == target:
+            return 0.0
+
+        lats, lons = self.lats, self.lons
+        indptr, indices, seconds = self.indptr, self.indices, self.seconds
+        target_lat, target_lon = lats[target], lons[target]
+        speed = self.max_speed_mps / 1000  # km per second
+
+        def heuristic(node):
+            return haversine_distance(lats[node], lons[node], target_lat, target_lon) / speed
+
+        best = {source: 0.0}
+        frontier = [(heuristic(source), 0.0, source)]
+        while frontier:
+            _, cost, node = heapq.heappop(frontier)
+            if node == target:
+                return cost
+            if cost > best.get(node, np.inf):
+                continue
+            for edge in range(indptr[node], indptr[node + 1]):
+                neighbour = int(indices[edge])
+                candidate = cost + float(seconds[edge])
+                if candidate < best.get(neighbour, np.inf):
+                    best[neighbour] = candidate
+                    heapq.heappush(frontier, (candidate + heuristic(neighbour), candidate, neighbour))
+        return None
+
+
+class EtaEngine:
+    """
+    Travel-time oracle on top of a `RoadGraph`.
+
+    Origins and destinations are snapped to square cells of `cell_size`
+    degrees, and cell-to-cell results are kept in an LRU table of at most
+    `cache_size` entries, so repeated dispatches from the same area cost a
+    dictionary lookup.
+    """
+
+    def __init__(self, graph: RoadGraph, cell_size: float = 0.005, cache_size: int = 100_000):
+        self.graph = graph
+        self.cell_size = cell_size
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[Tuple, Optional[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        return floor(float(lat) / self.cell_size), floor(float(lon) / self.cell_size)
+
+    def _centre(self, cell: Tuple[int, int]) -> Tuple[float, float]:
+        return (cell[0] + 0.5) * self.cell_size, (cell[1] + 0.5) * self.cell_size
+
+    def eta(self, from_lat, from_lon, to_lat, to_lon) -> Optional[float]:
+        """Travel time in seconds by road, or None if there is no route."""
+        key = (self._cell(from_lat, from_lon), self._cell(to_lat, to_lon))
+        with self._lock:
+            if key in self._cache:
+                self.hits += 1
+                self._cache.move_to_end(key)
+                return self._cache[key]
+            self.misses += 1
+
+        source = self.graph.nearest_node(*self._centre(key[0]))
+        target = self.graph.nearest_node(*self._centre(key[1]))
+        seconds = None
+        if source is not None and target is not None:
+            seconds = self.graph.travel_time(source, target)
+
+        with self._lock:
+            self._cache[key] = seconds
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return seconds
+
+
+_engine: Optional[EtaEngine] = None
+_engine_lock = threading.Lock()
+
+
+def get_eta_engine() -> Optional[EtaEngine]:
+    """
+    Process-wide `EtaEngine` for the graph at `ROAD_GRAPH_PATH`, loaded on
+    first use. Returns None when no road graph is configured.
+    """
+    global _engine
+    from django.conf import settings
+
+    if not settings.ROAD_GRAPH_PATH:
+        return None
+    with _engine_lock:
+        if _engine is None:
+            _engine = EtaEngine(
+                RoadGraph.load(settings.ROAD_GRAPH_PATH),
+                cache_size=settings.ROUTING_CACHE_SIZE,
+            )
+    return _engine
@@ -0,0 +1,87 @@
+"""
+Mergeable quantile sketch for non-negative durations.
+
+Values are counted in logarithmic bins (as in DDSketch): bin `i` holds
+values in `(gamma**(i-1), gamma**i]`, with `gamma = (1 + a) / (1 - a)`, so
+any quantile is answered within relative error `a` of the true value.
+Two sketches merge by adding their bin counts, which is what lets hourly
+rollups be combined into any larger range without touching raw rows.
+"""
+import math
+from typing import Dict, Iterable, Optional
+
+from utils.varint import read_varints, unzigzag, write_varint, zigzag
+
+# Fixed so every stored sketch can be merged with every other
+RELATIVE_ACCURACY = 0.01
+_GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+_LOG_GAMMA = math.log(_GAMMA)
+
+# Values at or below this are counted as zero
+_MIN_VALUE = 1e-3
+
+
+class QuantileSketch:
+    def __init__(self):
+        self.bins: Dict[int, int] = {}
+        self.zeros = 0
+
+    @property
+    def count(self) -> int:
+        return self.zeros + sum(self.bins.values())
+
+    def add(self, value: float, count: int = 1) -> None:
+        if value <= _MIN_VALUE:
+            self.zeros += count
+            return
+        index = math.ceil(math.log(value) / _LOG_GAMMA)
+        self.bins[index] = self.bins.get(index, 0) + count
+
+    def add_many(self, values: Iterable[float]) -> None:
+        for value in values:
+            self.add(value)
+
+    def merge(self, other: "QuantileSketch") -> None:
+        self.zeros += other.zeros
+        for index, count in other.bins.items():
+            self.bins[index] = self.bins.get(index, 0) + count
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate of the `q`-quantile (0 <= q <= 1), or None if empty."""
+        total = self.count
+        if not total:
+            return None
+        rank = q * (total - 1)
+        seen = self.zeros
+        if rank < seen:
+            return 0.0
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if rank < seen:
+                # Midpoint of the bin in relative terms
+                return 2 * _GAMMA ** index / (_GAMMA + 1)
+        return 2 * _GAMMA ** max(self.bins) / (_GAMMA + 1)
+
+    def to_bytes(self) -> bytes:
+        """Zero count, then `(index delta, count)` pairs as varints."""
+        out = bytearray()
+        write_varint(out, self.zeros)
+        previous = 0
+        for index in sorted(self.bins):
+            write_varint(out, zigzag(index - previous))
+            write_varint(out, self.bins[index])
+            previous = index
+        return bytes(out)
+
+    @classmethod
+    def from_bytes(cls, data: Optional[bytes]) -> "QuantileSketch":
+        sketch = cls()
+        if not data:
+            return sketch
+        values = read_varints(bytes(data))
+        sketch.zeros = values[0]
+        index = 0
+        for i in range(1, len(values) - 1, 2):
+            index += unzigzag(values[i])
+            sketch.bins[index] = values[i + 1]
+        return sketch
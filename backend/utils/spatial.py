@@ -0,0 +1,285 @@
+from math import cos, floor, inf, radians
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from utils.geo import KM_PER_DEGREE, equirectangular_many, haversine_many
+
+Cell = Tuple[int, int]
+
+
+class PointSet:
+    """
+    Keyed coordinates held in contiguous float64 arrays so that distances to
+    every point can be computed with a single vectorized call.
+    """
+
+    def __init__(self, capacity: int = 64):
+        self._lats = np.empty(capacity, dtype=np.float64)
+        self._lons = np.empty(capacity, dtype=np.float64)
+        self._keys: List[Hashable] = []
+        self._slots: Dict[Hashable, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._slots
+
+    @property
+    def keys(self) -> List[Hashable]:
+        return self._keys
+
+    @property
+    def lats(self) -> np.ndarray:
+        return self._lats[: len(self._keys)]
+
+    @property
+    def lons(self) -> np.ndarray:
+        return self._lons[: len(self._keys)]
+
+    def get(self, key: Hashable) -> Optional[Tuple[float, float]]:
+        slot = self._slots.get(key)
+        if slot is None:
+            return None
+        return float(self._lats[slot]), float(self._lons[slot])
+
+    def add(self, key: Hashable, lat: float, lon: float) -> None:
+        slot = self._slots.get(key)
+        if slot is None:
+            slot = len(self._keys)
+            if slot == len(self._lats):
+                self._lats = np.resize(self._lats, 2 * slot)
+                self._lons = np.resize(self._lons, 2 * slot)
+            self._keys.append(key)
+            self._slots[key] = slot
+        self._lats[slot] = lat
+        self._lons[slot] = lon
+
+    def remove(self, key: Hashable) -> None:
+        slot = self._slots.pop(key, None)
+        if slot is None:
+            return
+        last = len(self._keys) - 1
+        if slot != last:
+            moved = self._keys[last]
+            self._keys[slot] = moved
+            self._slots[moved] = slot
+            self._lats[slot] = self._lats[last]
+            self._lons[slot] = self._lons[last]
+        self._keys.pop()
+
+    def clear(self) -> None:
+        self._keys.clear()
+        self._slots.clear()
+
+    def slots_of(self, keys: Iterable[Hashable]) -> np.ndarray:
+        return np.fromiter((self._slots[key] for key in keys), dtype=np.intp)
+
+    def distances(self, lat: float, lon: float, slots: Optional[np.ndarray] = None) -> np.ndarray:
+        if slots is None:
+            return haversine_many(lat, lon, self.lats, self.lons)
+        return haversine_many(lat, lon, self._lats[slots], self._lons[slots])
+
+    def nearest(
+        self, lat: float, lon: float, k: int = 1, prefilter: bool = False
+    ) -> List[Tuple[float, Hashable]]:
+        """
+        Return up to `k` `(distance_km, key)` pairs, closest first. With
+        `prefilter`, only the best few candidates under the equirectangular
+        approximation are measured exactly.
+        """
+        size = len(self._keys)
+        if not size or k < 1:
+            return []
+
+        slots = np.arange(size)
+        shortlist = max(4 * k, k + 16)
+        if prefilter and size > shortlist:
+            approx = equirectangular_many(lat, lon, self.lats, self.lons)
+            slots = np.argpartition(approx, shortlist - 1)[:shortlist]
+
+        distances = self.distances(lat, lon, slots)
+        return _top_k(distances, slots, k, self._keys)
+
+    def within(self, lat: float, lon: float, radius_km: float) -> List[Tuple[float, Hashable]]:
+        """Return `(distance_km, key)` pairs within `radius_km`, closest first."""
+        if not self._keys:
+            return []
+
+        # The flat-earth estimate is within 1% at this scale, so anything it
+        # puts well outside the radius can be dropped before the exact pass.
+        approx = equirectangular_many(lat, lon, self.lats, self.lons)
+        slots = np.flatnonzero(approx <= radius_km * 1.01 + 0.01)
+        distances = self.distances(lat, lon, slots)
+        keep = distances <= radius_km
+        return _top_k(distances[keep], slots[keep], int(keep.sum()), self._keys)
+
+
+def _top_k(distances: np.ndarray, slots: np.ndarray, k: int, keys: List[Hashable]):
+    if k < len(distances):
+        part = np.argpartition(distances, k - 1)[:k]
+        distances, slots = distances[part], slots[part]
+    order = np.argsort(distances, kind="stable")
+    return [(float(distances[i]), keys[slots[i]]) for i in order]
+
+
+class GridIndex:
+    """
+    Bucketed point index over (latitude, longitude).
+
+    Points are hashed into square cells of `cell_size` degrees. Nearest
+    neighbour queries walk outwards ring by ring from the query cell and stop
+    as soon as no unvisited ring can hold a closer point, so the cost depends
+    on local density rather than on the total number of points. Distances for
+    each ring are computed in one vectorized call against a `PointSet`.
+    """
+
+    def __init__(self, cell_size: float = 0.02):
+        self.cell_size = cell_size
+        self._points = PointSet()
+        self._cells: Dict[Cell, Set[Hashable]] = {}
+
+    def __len__(self) -> int:
+        return len(self._points)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._points
+
+    def _cell(self, lat: float, lon: float) -> Cell:
+        return floor(lat / self.cell_size), floor(lon / self.cell_size)
+
+    def get(self, key: Hashable) -> Optional[Tuple[float, float]]:
+        return self._points.get(key)
+
+    def insert(self, key: Hashable, lat: float, lon: float) -> None:
+        lat, lon = float(lat), float(lon)
+        if key in self._points:
+            self.remove(key)
+        self._points.add(key, lat, lon)
+        self._cells.setdefault(self._cell(lat, lon), set()).add(key)
+
+    def remove(self, key: Hashable) -> None:
+        point = self._points.get(key)
+        if point is None:
+            return
+        self._points.remove(key)
+        cell = self._cell(*point)
+        bucket = self._cells.get(cell)
+        if bucket is not None:
+            bucket.discard(key)
+            if not bucket:
+                del self._cells[cell]
+
+    def clear(self) -> None:
+        self._points.clear()
+        self._cells.clear()
+
+    def _ring(self, ci: int, cj: int, r: int):
+        if r == 0:
+            yield ci, cj
+            return
+        for dj in range(-r, r + 1):
+            yield ci - r, cj + dj
+            yield ci + r, cj + dj
+        for di in range(-r + 1, r):
+            yield ci + di, cj - r
+            yield ci + di, cj + r
+
+    def _ring_min_km(self, lat: float, r: int) -> float:
+        """Lower bound on the distance from the query point to any cell of ring `r`."""
+        if r <= 0:
+            return 0.0
+        reach = min(90.0, abs(lat) + (r + 1) * self.cell_size)
+        return (r - 1) * self.cell_size * KM_PER_DEGREE * max(cos(radians(reach)), 0.0)
+
+    def nearest(
+        self,
+        lat: float,
+        lon: float,
+        k: int = 1,
+        predicate: Optional[Callable[[Hashable], bool]] = None,
+    ) -> List[Tuple[float, Hashable]]:
+        """
+        Return up to `k` `(distance_km, key)` pairs ordered by distance.
+        `predicate`, when given, filters keys before they are considered.
+        """
+        if not self._cells or k < 1:
+            return []
+
+        lat, lon = float(lat), float(lon)
+        ci, cj = self._cell(lat, lon)
+        found_slots: List[np.ndarray] = []
+        found_distances: List[np.ndarray] = []
+        found = 0
+        kth = inf
+
+        visited = 0
+        r = 0
+        while visited < len(self._cells):
+            if found >= k and self._ring_min_km(lat, r) > kth:
+                break
+
+            keys: List[Hashable] = []
+            # Once a ring is larger than the set of occupied cells it is
+            # cheaper to scan the remaining buckets directly.
+            exhaustive = 8 * r > len(self._cells)
+            if exhaustive:
+                for (i, j), bucket in self._cells.items():
+                    if max(abs(i - ci), abs(j - cj)) >= r:
+                        keys.extend(bucket)
+            else:
+                for cell in self._ring(ci, cj, r):
+                    bucket = self._cells.get(cell)
+                    if bucket:
+                        visited += 1
+                        keys.extend(bucket)
+
+            if predicate is not None:
+                keys = [key for key in keys if predicate(key)]
+            if keys:
+                slots = self._points.slots_of(keys)
+                distances = self._points.distances(lat, lon, slots)
+                found_slots.append(slots)
+                found_distances.append(distances)
+                found += len(keys)
+                if found >= k:
+                    kth = np.partition(np.concatenate(found_distances), k - 1)[k - 1]
+
+            if exhaustive:
+                break
+            r += 1
+
+        if not found:
+            return []
+        return _top_k(
+            np.concatenate(found_distances),
+            np.concatenate(found_slots),
+            k,
+            self._points.keys,
+        )
+
+    def within(self, lat: float, lon: float, radius_km: float) -> List[Tuple[float, Hashable]]:
+        """Return `(distance_km, key)` pairs within `radius_km`, closest first."""
+        lat, lon = float(lat), float(lon)
+        lat_span = radius_km / KM_PER_DEGREE
+        lon_span = lat_span / max(cos(radians(min(89.0, abs(lat) + lat_span))), 1e-6)
+        i0, j0 = self._cell(lat - lat_span, lon - lon_span)
+        i1, j1 = self._cell(lat + lat_span, lon + lon_span)
+
+        keys: List[Hashable] = []
+        if (i1 - i0 + 1) * (j1 - j0 + 1) > len(self._cells):
+            for (i, j), bucket in self._cells.items():
+                if i0 <= i <= i1 and j0 <= j <= j1:
+                    keys.extend(bucket)
+        else:
+            for i in range(i0, i1 + 1):
+                for j in range(j0, j1 + 1):
+                    keys.extend(self._cells.get((i, j), ()))
+        if not keys:
+            return []
+
+        slots = self._points.slots_of(keys)
+        distances = self._points.distances(lat, lon, slots)
+        keep = distances <= radius_km
+        return _top_k(distances[keep], slots[keep], int(keep.sum()), self._points.keys)
@@ -0,0 +1,137 @@
+"""
+Synthetic, seeded data for load tests and benchmarks.
+
+Points are drawn around a handful of population hotspots inside a city
+disk, so density looks like a real metro area rather than a uniform
+square: a few dense districts, sparser suburbs and some background noise.
+"""
+import uuid
+from typing import List, Tuple
+
+import numpy as np
+from django.db import transaction
+
+from apps.ambulance.models import Ambulance, AmbulanceLocation
+from apps.ambulance.utils import AmbulanceTypeEnum, StatusEnum
+from apps.hospital.models import Hospital, HospitalLocation
+from utils.geo import KM_PER_DEGREE
+
+# Lagos, Nigeria
+DEFAULT_CENTER = (6.5244, 3.3792)
+
+# Share of each ambulance type in a generated fleet
+FLEET_MIX = {
+    AmbulanceTypeEnum.BLS: 0.60,
+    AmbulanceTypeEnum.ALS: 0.25,
+    AmbulanceTypeEnum.PTA: 0.10,
+    AmbulanceTypeEnum.ICU: 0.05,
+}
+
+
+class SyntheticCity:
+    """
+    A deterministic synthetic metro area. Every draw comes from one seeded
+    generator, so the same seed and call sequence always give the same
+    data.
+    """
+
+    def __init__(
+        self,
+        seed: int = 0,
+        center: Tuple[float, float] = DEFAULT_CENTER,
+        radius_km: float = 25.0,
+        hotspots: int = 12,
+        background: float = 0.2,
+    ):
+        self.rng = np.random.default_rng(seed)
+        # Separate stream for row ids, so drawing ids never shifts the data
+        self.id_rng = np.random.default_rng([seed, 1])
+        self.center = center
+        self.radius_km = radius_km
+        self.background = background
+
+        # Hotspot centres, sizes and weights (a few large districts, many small ones)
+        self.hotspot_xy = self._uniform_disk(hotspots) * 0.8
+        self.hotspot_sigma = self.rng.uniform(0.04, 0.12, hotspots) * radius_km
+        weights = 1.0 / np.arange(1, hotspots + 1)
+        self.hotspot_weights = weights / weights.sum()
+
+    def _uniform_disk(self, n: int) -> np.ndarray:
+        r = self.radius_km * np.sqrt(self.rng.random(n))
+        theta = self.rng.uniform(0, 2 * np.pi, n)
+        return np.column_stack((r * np.cos(theta), r * np.sin(theta)))
+
+    def points(self, n: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Draw `n` locations, returned as arrays of latitudes and longitudes."""
+        xy = np.empty((n, 2))
+        noise = self.rng.random(n) < self.background
+        xy[noise] = self._uniform_disk(int(noise.sum()))
+
+        clustered = ~noise
+        picks = self.rng.choice(len(self.hotspot_weights), int(clustered.sum()), p=self.hotspot_weights)
+        offsets = self.rng.normal(size=(len(picks), 2)) * self.hotspot_sigma[picks, None]
+        xy[clustered] = self.hotspot_xy[picks] + offsets
+
+        lat0, lon0 = self.center
+        lats = lat0 + xy[:, 1] / KM_PER_DEGREE
+        lons = lon0 + xy[:, 0] / (KM_PER_DEGREE * np.cos(np.radians(lat0)))
+        return lats, lons
+
+    def uuids(self, n: int) -> List[uuid.UUID]:
+        """Draw `n` reproducible version-4 UUIDs for primary keys."""
+        raw = self.id_rng.integers(0, 256, size=(n, 16), dtype=np.uint8)
+        return [uuid.UUID(bytes=row.tobytes(), version=4) for row in raw]
+
+    def ambulance_types(self, n: int) -> List[str]:
+        types = list(FLEET_MIX)
+        picks = self.rng.choice(len(types), n, p=list(FLEET_MIX.values()))
+        return [types[i] for i in picks]
+
+
+def create_city(
+    city: SyntheticCity, hospitals: int, ambulances: int, batch_size: int = 5000
+) -> Tuple[List[Hospital], List[Ambulance]]:
+    """
+    Bulk-create hospitals and an available fleet spread over `city`, with
+    their location rows and the denormalized ambulance coordinates.
+    """
+    lats, lons = city.points(hospitals)
+    hospital_rows = [
+        Hospital(id=pk, name=f"Hospital {i + 1}", contact_number=f"+234{i:09d}", address=f"{i + 1} Synthetic Road")
+        for i, pk in enumerate(city.uuids(hospitals))
+    ]
+    with transaction.atomic():
+        Hospital.objects.bulk_create(hospital_rows, batch_size=batch_size)
+        HospitalLocation.objects.bulk_create(
+            [
+                HospitalLocation(id=pk, hospital=h, latitude=float(lat), longitude=float(lon))
+                for pk, h, lat, lon in zip(city.uuids(hospitals), hospital_rows, lats, lons)
+            ],
+            batch_size=batch_size,
+        )
+
+    lats, lons = city.points(ambulances)
+    owners = city.rng.integers(0, hospitals, ambulances)
+    ambulance_rows = [
+        Ambulance(
+            id=pk,
+            hospital=hospital_rows[owner],
+            ambulance_type=ambulance_type,
+            status=StatusEnum.AVAILABLE,
+            latitude=float(lat),
+            longitude=float(lon),
+        )
+        for pk, owner, ambulance_type, lat, lon in zip(
+            city.uuids(ambulances), owners, city.ambulance_types(ambulances), lats, lons
+        )
+    ]
+    with transaction.atomic():
+        Ambulance.objects.bulk_create(ambulance_rows, batch_size=batch_size)
+        AmbulanceLocation.objects.bulk_create(
+            [
+                AmbulanceLocation(id=pk, ambulance=a, latitude=a.latitude, longitude=a.longitude)
+                for pk, a in zip(city.uuids(ambulances), ambulance_rows)
+            ],
+            batch_size=batch_size,
+        )
+    return hospital_rows, ambulance_rows
@@ -0,0 +1,60 @@
+from rest_framework.test import APIClient
+
+
+class QueryBudgetMixin:
+    """
+    Each endpoint must fetch its whole serialized graph in a fixed number
+    of queries, however many rows the table holds. Once the payloads are
+    cached, only the conditional-GET validators are queried.
+
+    Mix into a `TestCase` and set `url` (the list endpoint), `model` and
+    the budgets, and define `fill(total)`, which tops the table up to
+    `total` rows with every relation populated. A `detail_queries` of None
+    skips the detail endpoint, and a `cached_queries` of None skips the
+    cached reads, for endpoints without a payload cache.
+    """
+
+    # Up to ten pages of 100. A 10,000-row size was dropped: it only made
+    # the suite slower, as the counts are already flat from 100 rows
+    sizes = (1, 100, 1_000)
+    url = None
+    model = None
+    list_queries = None
+    detail_queries = None
+    cached_queries = None
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def check_detail(self, data):
+        """Extra assertions on a detail payload."""
+
+    def test_list_and_detail(self):
+        for size in self.sizes:
+            self.fill(size)
+            with self.subTest(rows=size):
+                if self.detail_queries is not None:
+                    self.assertDetailBudget(self.model.objects.first())
+                self.assertListBudget(size)
+
+    def assertDetailBudget(self, instance):
+        url = f"{self.url}{instance.pk}/"
+        with self.assertNumQueries(self.detail_queries):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.check_detail(response.json()["data"])
+        if self.cached_queries is not None:
+            with self.assertNumQueries(self.cached_queries):
+                self.client.get(url)
+
+    def assertListBudget(self, size):
+        with self.assertNumQueries(self.list_queries):
+            response = self.client.get(self.url, {"limit": 100})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["data"]), min(size, 100))
+        if self.cached_queries is not None:
+            # The cached page's payloads are loaded on its second read
+            self.client.get(self.url, {"limit": 100})
+            with self.assertNumQueries(self.cached_queries):
+                cached = self.client.get(self.url, {"limit": 100})
+            self.assertEqual(cached.json(), response.json())
@@ -0,0 +1,60 @@
+"""
+Delta + zigzag varint encoding for GPS tracks.
+
+A track is a sequence of `(timestamp_ms, lat, lon)` points with the
+coordinates in millionths of a degree (about 11 cm). Each point is stored
+as the difference from the one before it: the time step as an unsigned
+varint and the coordinate steps as zigzag varints. A unit reporting every
+few seconds at road speed costs five or six bytes per point.
+"""
+from typing import Iterable, List, Tuple
+
+from utils.varint import read_varints, unzigzag, write_varint, zigzag
+
+COORDINATE_SCALE = 1_000_000
+
+Point = Tuple[int, int, int]
+
+
+def to_point(timestamp: float, lat: float, lon: float) -> Point:
+    """Quantize `(unix seconds, degrees, degrees)` to an encodable point."""
+    return int(timestamp * 1000), round(lat * COORDINATE_SCALE), round(lon * COORDINATE_SCALE)
+
+
+def from_point(point: Point) -> Tuple[float, float, float]:
+    timestamp, lat, lon = point
+    return timestamp / 1000, lat / COORDINATE_SCALE, lon / COORDINATE_SCALE
+
+
+def encode_points(points: Iterable[Point], previous: Point) -> Tuple[bytes, Point, int]:
+    """
+    Encode `points` as deltas from `previous`, the last point already
+    stored (or the segment origin). Points not strictly after `previous`
+    in time are skipped, so the stream stays ordered. Returns the encoded
+    bytes, the new last point and the number of points written.
+    """
+    out = bytearray()
+    last_t, last_lat, last_lon = previous
+    written = 0
+    for t, lat, lon in points:
+        if t <= last_t:
+            continue
+        write_varint(out, t - last_t)
+        write_varint(out, zigzag(lat - last_lat))
+        write_varint(out, zigzag(lon - last_lon))
+        last_t, last_lat, last_lon = t, lat, lon
+        written += 1
+    return bytes(out), (last_t, last_lat, last_lon), written
+
+
+def decode_points(data: bytes, origin: Point) -> List[Point]:
+    """Decode a stream written by `encode_points` starting from `origin`."""
+    values = read_varints(data)
+    points = []
+    t, lat, lon = origin
+    for i in range(0, len(values) - 2, 3):
+        t += values[i]
+        lat += unzigzag(values[i + 1])
+        lon += unzigzag(values[i + 2])
+        points.append((t, lat, lon))
+    return points